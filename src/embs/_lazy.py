@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import importlib
+from collections.abc import Callable
+
+
+def attach(
+    package: str, attributes: dict[str, str]
+) -> tuple[Callable[[str], object], Callable[[], list[str]], list[str]]:
+    """パッケージの公開名を、最初に参照されたときに定義元のモジュールから読み込む
+
+    attributesは {公開名: 定義元のモジュール}。パッケージの__init__で
+    ``__getattr__, __dir__, __all__ = attach(__name__, {...})`` のように使う。
+    読み込んだ値はパッケージの名前空間に保存し、2回目以降は通常の属性参照になる。
+    """
+    namespace = importlib.import_module(package).__dict__
+
+    def __getattr__(name: str) -> object:
+        module = attributes.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module), name)
+        namespace[name] = value
+        return value
+
+    def __dir__() -> list[str]:
+        return sorted(set(namespace) | set(attributes))
+
+    return __getattr__, __dir__, list(attributes)
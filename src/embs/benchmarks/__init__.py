@@ -0,0 +1,18 @@
+from embs.benchmarks.corpus import generate_corpus, generate_queries
+from embs.benchmarks.evaluate import LabelledQuery, SearchConfig, evaluate, load_queries
+from embs.benchmarks.runner import BenchConfig, compare_results, run_benchmark
+from embs.benchmarks.stubs import StubEmbedder, StubReranker
+
+__all__ = [
+    "BenchConfig",
+    "LabelledQuery",
+    "SearchConfig",
+    "StubEmbedder",
+    "StubReranker",
+    "compare_results",
+    "evaluate",
+    "generate_corpus",
+    "generate_queries",
+    "load_queries",
+    "run_benchmark",
+]
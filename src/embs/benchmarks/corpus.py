@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import random
+
+from embs.fetchers.base import Document
+
+_TOPICS = [
+    "デプロイ", "認証", "監視", "バックアップ", "ログ収集", "キャッシュ",
+    "データベース移行", "負荷試験", "障害対応", "権限管理", "コスト削減", "検索基盤",
+]
+_SUBJECTS = [
+    "本番環境", "ステージング環境", "バッチ処理", "APIサーバー", "ジョブキュー",
+    "管理画面", "モバイルアプリ", "社内ツール", "データ基盤", "CI パイプライン",
+]
+_ACTIONS = [
+    "設定を見直す", "手順を自動化する", "閾値を調整する", "依存関係を更新する",
+    "ロールバックする", "アラートを追加する", "権限を絞る", "ドキュメントを整備する",
+    "リトライを入れる", "タイムアウトを延ばす",
+]
+_REASONS = [
+    "障害の再発を防ぐため", "リリースを速くするため", "運用負荷を下げるため",
+    "セキュリティ監査に対応するため", "レイテンシを改善するため", "費用を抑えるため",
+]
+_NOTES = [
+    "作業前に必ず関係者へ連絡すること。",
+    "詳細は運用手順書を参照する。",
+    "問題があればオンコール担当に相談する。",
+    "変更内容はチケットに記録しておく。",
+    "",
+]
+
+
+def generate_corpus(
+    n_docs: int, *, seed: int = 0, sections: int = 4, paragraphs: int = 3
+) -> list[Document]:
+    """ベンチマーク用の日本語Markdown文書を決定的に生成する
+
+    同じseedなら常に同じ文書列になる。文書ごとに見出しつきのセクションを持ち、
+    チャンク数はおよそ n_docs * sections * (paragraphs + 1) になる。
+    """
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n_docs):
+        topic = rng.choice(_TOPICS)
+        lines = [f"# {topic}ガイド {i}", ""]
+        for s in range(sections):
+            subject = rng.choice(_SUBJECTS)
+            lines += [f"## {subject}の{topic} ({s + 1})", ""]
+            for _ in range(paragraphs):
+                lines += [_sentence(rng, topic, subject), ""]
+            lines += [f"- {rng.choice(_ACTIONS)}", f"- {rng.choice(_ACTIONS)}", ""]
+        docs.append(Document(id=str(i), name=f"bench-{i:05d}.md", text="\n".join(lines)))
+    return docs
+
+
+def generate_queries(n: int, *, seed: int = 0) -> list[str]:
+    """コーパスと同じ語彙から検索クエリを決定的に生成する"""
+    rng = random.Random(seed + 1)
+    return [
+        f"{rng.choice(_SUBJECTS)}で{rng.choice(_TOPICS)}の{rng.choice(_ACTIONS)}方法"
+        for _ in range(n)
+    ]
+
+
+def _sentence(rng: random.Random, topic: str, subject: str) -> str:
+    return (
+        f"{subject}では{rng.choice(_REASONS)}、{topic}の{rng.choice(_ACTIONS)}。"
+        f"{rng.choice(_SUBJECTS)}への影響を確認してから{rng.choice(_ACTIONS)}。"
+        f"{rng.choice(_NOTES)}"
+    )
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import json
+import math
+import time
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+
+from embs.benchmarks.runner import latency_stats
+from embs.indexer.store import VectorStore
+
+
+@dataclass
+class LabelledQuery:
+    """評価用のクエリと正解
+
+    relevantの各要素は ``"deploy.md"``（そのファイルのどのチャンクでもよい）か
+    ``"deploy.md#3"``（chunk_indexが3のチャンク）。
+    """
+
+    query: str
+    relevant: list[str]
+
+
+@dataclass
+class SearchConfig:
+    """評価する検索設定"""
+
+    name: str = "default"
+    initial_k: int = 20
+    exact: bool = False
+    ef_search: int | None = None
+    rerank: bool = True
+    space: str | None = None
+
+    @classmethod
+    def parse(cls, spec: str) -> SearchConfig:
+        """``"initial_k=50,rerank=false"`` 形式の文字列から設定を作る"""
+        types = {f.name: f.type for f in fields(cls)}
+        values: dict = {"name": spec}
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            key, sep, raw = item.partition("=")
+            key = key.strip()
+            if not sep or key not in types or key == "name":
+                raise ValueError(f"不正な検索設定です: {item}")
+            raw = raw.strip()
+            if "bool" in types[key]:
+                if raw.lower() not in ("true", "false"):
+                    raise ValueError(f"{key} には true / false を指定してください: {raw}")
+                values[key] = raw.lower() == "true"
+            elif "int" in types[key]:
+                values[key] = int(raw)
+            else:
+                values[key] = raw
+        return cls(**values)
+
+
+@dataclass
+class EvalResult:
+    """1つの検索設定の評価結果"""
+
+    config: str
+    k: int
+    recall: float
+    mrr: float
+    ndcg: float
+    latency: dict = field(default_factory=dict)
+    pareto: bool = False
+
+
+def load_queries(path: Path) -> list[LabelledQuery]:
+    """JSONL（1行に {"query": ..., "relevant": [...]}）からクエリセットを読み込む"""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if not item.get("query") or not item.get("relevant"):
+                raise ValueError(f"{path}:{lineno}: query と relevant が必要です")
+            queries.append(LabelledQuery(query=item["query"], relevant=list(item["relevant"])))
+    return queries
+
+
+def relevance(results: list[dict], relevant: list[str]) -> list[int]:
+    """検索結果の各順位が、まだ見つかっていない正解に当たるかを0/1で返す
+
+    ファイル単位の正解は最初に当たったチャンクだけを数える。重複として
+    まとめられた出現位置 (duplicates) も、その結果の位置として扱う。
+    """
+    remaining = set(relevant)
+    gains = []
+    for r in results:
+        locations = [(r["source_file"], r["chunk_index"]), *r.get("duplicates", ())]
+        hit = set()
+        for source_file, chunk_index in locations:
+            hit |= remaining & {source_file, f"{source_file}#{chunk_index}"}
+        remaining -= hit
+        gains.append(1 if hit else 0)
+    return gains
+
+
+def recall_at_k(gains: list[int], n_relevant: int, k: int) -> float:
+    return sum(gains[:k]) / n_relevant if n_relevant else 0.0
+
+
+def reciprocal_rank(gains: list[int], k: int) -> float:
+    for rank, gain in enumerate(gains[:k], 1):
+        if gain:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(gains: list[int], n_relevant: int, k: int) -> float:
+    dcg = sum(gain / math.log2(rank + 1) for rank, gain in enumerate(gains[:k], 1))
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(k, n_relevant) + 1))
+    return dcg / ideal if ideal else 0.0
+
+
+def evaluate(
+    store: VectorStore,
+    queries: list[LabelledQuery],
+    configs: list[SearchConfig],
+    *,
+    embedders: dict,
+    reranker=None,
+    k: int = 5,
+) -> list[EvalResult]:
+    """検索設定ごとにrecall@k・MRR・nDCG@kとクエリあたりのレイテンシを求める
+
+    embeddersは空間名（主モデルはNone）からEmbedderへの対応。各設定の最初に
+    1クエリを計測せずに流し、キャッシュの温まり具合による差を減らす。
+    """
+    results = []
+    for config in configs:
+        if config.rerank and reranker is None:
+            raise ValueError(f"rerankerが必要です: {config.name}")
+        if queries:
+            _run_query(store, queries[0].query, config, embedders, reranker, k)
+
+        recalls, rrs, ndcgs, seconds = [], [], [], []
+        for q in queries:
+            t = time.perf_counter()
+            hits = _run_query(store, q.query, config, embedders, reranker, k)
+            seconds.append(time.perf_counter() - t)
+
+            gains = relevance(hits, q.relevant)
+            recalls.append(recall_at_k(gains, len(q.relevant), k))
+            rrs.append(reciprocal_rank(gains, k))
+            ndcgs.append(ndcg_at_k(gains, len(q.relevant), k))
+
+        n = max(len(queries), 1)
+        results.append(
+            EvalResult(
+                config=config.name,
+                k=k,
+                recall=sum(recalls) / n,
+                mrr=sum(rrs) / n,
+                ndcg=sum(ndcgs) / n,
+                latency=latency_stats(seconds),
+            )
+        )
+
+    for r, on_front in zip(results, pareto_front(results)):
+        r.pareto = on_front
+    return results
+
+
+def pareto_front(results: list[EvalResult]) -> list[bool]:
+    """品質（recall・MRR・nDCG）とp95レイテンシで他の設定に劣らないものを選ぶ"""
+
+    def dominates(a: EvalResult, b: EvalResult) -> bool:
+        a_vals = (a.recall, a.mrr, a.ndcg, -a.latency.get("p95_ms", 0.0))
+        b_vals = (b.recall, b.mrr, b.ndcg, -b.latency.get("p95_ms", 0.0))
+        return all(x >= y for x, y in zip(a_vals, b_vals)) and a_vals != b_vals
+
+    return [not any(dominates(other, r) for other in results) for r in results]
+
+
+def format_table(results: list[EvalResult]) -> str:
+    """評価結果をレイテンシ順の表にする（*はパレート最適）"""
+    if not results:
+        return ""
+    k = results[0].k
+    width = max(len("設定"), *(len(r.config) for r in results)) + 2
+    lines = [
+        f"  {'設定':<{width}}{f'recall@{k}':>10}{'MRR':>8}{f'nDCG@{k}':>9}"
+        f"{'p50(ms)':>10}{'p95(ms)':>10}"
+    ]
+    for r in sorted(results, key=lambda r: r.latency.get("p50_ms", 0.0)):
+        lines.append(
+            f"{'*' if r.pareto else ' '} {r.config:<{width}}{r.recall:>10.3f}{r.mrr:>8.3f}"
+            f"{r.ndcg:>9.3f}{r.latency.get('p50_ms', 0.0):>10.2f}"
+            f"{r.latency.get('p95_ms', 0.0):>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def _run_query(
+    store: VectorStore, query: str, config: SearchConfig, embedders: dict, reranker, k: int
+) -> list[dict]:
+    query_embedding = embedders[config.space].embed([query])[0]
+    candidates = store.search(
+        query_embedding,
+        top_k=max(config.initial_k, k),
+        exact=config.exact,
+        ef_search=config.ef_search,
+        space=config.space,
+    )
+    if not config.rerank:
+        return candidates[:k]
+    return reranker.rerank(query, candidates, top_k=k)
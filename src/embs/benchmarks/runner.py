@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import platform
+import resource
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from embs.benchmarks.corpus import generate_corpus, generate_queries
+from embs.benchmarks.stubs import StubEmbedder, StubReranker
+from embs.indexer.chunker import chunk_text
+from embs.indexer.store import SIDECAR_SUFFIXES, VectorStore
+
+RESULT_VERSION = 1
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class BenchConfig:
+    """ベンチマークの条件"""
+
+    documents: int = 200
+    queries: int = 100
+    backend: str = "sqlite-vec"
+    ann: bool = False
+    batch_size: int = 32
+    top_k: int = 5
+    initial_k: int = 20
+    seed: int = 0
+    real_models: bool = False
+
+
+def run_benchmark(config: BenchConfig, work_dir: Path) -> dict:
+    """合成コーパスでインデックス作成と検索を計測し、結果をdictで返す
+
+    インデックスはwork_dir/bench.dbに作る。既定ではスタブモデルを使うため
+    ネットワークやGPUなしで動き、同じ条件なら同じデータで計測できる。
+    """
+    embedder, reranker = _load_models(config.real_models)
+    docs = generate_corpus(config.documents, seed=config.seed)
+    queries = generate_queries(config.queries, seed=config.seed)
+
+    db_path = Path(work_dir) / "bench.db"
+    for path in [db_path, *(db_path.with_name(db_path.name + s) for s in SIDECAR_SUFFIXES)]:
+        path.unlink(missing_ok=True)
+
+    store = VectorStore(db_path, backend=config.backend)
+    store.create_tables(model_name=embedder.model_name, dim=embedder.dim)
+    try:
+        indexing = _bench_indexing(store, embedder, docs, config)
+        search = _bench_search(store, embedder, reranker, queries, config)
+    finally:
+        store.close()
+
+    return {
+        "version": RESULT_VERSION,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": asdict(config),
+        "corpus": {
+            "documents": len(docs),
+            "bytes": sum(len(d.text.encode("utf-8")) for d in docs),
+            "chunks": indexing.pop("chunks"),
+        },
+        "indexing": indexing,
+        "search": search,
+        "db_size_bytes": _db_size(store.data_path),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def compare_results(baseline: dict, current: dict) -> list[tuple[str, float, float]]:
+    """2つの結果から共通の数値指標を (名前, 基準値, 今回値) で並べる"""
+    before = _flatten_metrics(baseline)
+    after = _flatten_metrics(current)
+    return [(name, before[name], after[name]) for name in before if name in after]
+
+
+def _load_models(real_models: bool):
+    if not real_models:
+        return StubEmbedder(), StubReranker()
+
+    from embs.indexer.embedder import Embedder
+    from embs.searcher.reranker import Reranker
+
+    return Embedder(), Reranker()
+
+
+def _bench_indexing(store: VectorStore, embedder, docs, config: BenchConfig) -> dict:
+    seconds = {"chunk": 0.0, "embed": 0.0, "store": 0.0}
+    total_chunks = 0
+    pending = []
+
+    def flush() -> None:
+        t = time.perf_counter()
+        embeddings = embedder.embed([c.text for c in pending])
+        seconds["embed"] += time.perf_counter() - t
+        t = time.perf_counter()
+        store.insert_many(
+            (c.source_file, c.chunk_index, c.text, emb)
+            for c, emb in zip(pending, embeddings)
+        )
+        seconds["store"] += time.perf_counter() - t
+        pending.clear()
+
+    for doc in docs:
+        t = time.perf_counter()
+        chunks = chunk_text(doc.text, doc.name)
+        seconds["chunk"] += time.perf_counter() - t
+        total_chunks += len(chunks)
+        pending.extend(chunks)
+        if len(pending) >= config.batch_size:
+            flush()
+    if pending:
+        flush()
+
+    if config.ann:
+        t = time.perf_counter()
+        store.build_ann()
+        seconds["ann"] = time.perf_counter() - t
+
+    total = sum(seconds.values())
+    return {
+        "chunks": total_chunks,
+        "stages": {
+            name: {"seconds": s, "chunks_per_s": _rate(total_chunks, s)}
+            for name, s in seconds.items()
+        },
+        "total_seconds": total,
+        "chunks_per_s": _rate(total_chunks, total),
+    }
+
+
+def _bench_search(store: VectorStore, embedder, reranker, queries, config: BenchConfig) -> dict:
+    # search()と同じく、検索ごとに共有のストアを取り出すところから計る
+    from embs.searcher.query import release_models, shared_store
+
+    latencies: dict[str, list[float]] = {"embed": [], "open": [], "store": [], "rerank": []}
+    try:
+        for query in queries:
+            t = time.perf_counter()
+            query_embedding = embedder.embed([query])[0]
+            latencies["embed"].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            reader = shared_store(store.data_path)
+            latencies["open"].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            candidates = reader.search(query_embedding, top_k=config.initial_k)
+            latencies["store"].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            reranker.rerank(query, candidates, top_k=config.top_k)
+            latencies["rerank"].append(time.perf_counter() - t)
+    finally:
+        release_models()
+
+    total = [sum(parts) for parts in zip(*latencies.values())]
+    return {name: latency_stats(values) for name, values in {**latencies, "total": total}.items()}
+
+
+def latency_stats(seconds: list[float]) -> dict:
+    """秒単位のレイテンシ列からp50/p95/p99と平均 (ms) を求める"""
+    if not seconds:
+        return {}
+    ms = np.asarray(seconds) * 1000.0
+    stats = {f"p{p}_ms": float(np.percentile(ms, p)) for p in PERCENTILES}
+    stats["mean_ms"] = float(ms.mean())
+    return stats
+
+
+def _rate(count: int, seconds: float) -> float:
+    return count / seconds if seconds > 0 else 0.0
+
+
+def _db_size(db_path: Path) -> int:
+    paths = [db_path, *(db_path.with_name(db_path.name + s) for s in SIDECAR_SUFFIXES)]
+    return sum(p.stat().st_size for p in paths if p.exists())
+
+
+def _peak_rss_mb() -> float:
+    """プロセス開始からの最大常駐メモリ (MiB)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def _flatten_metrics(result: dict) -> dict[str, float]:
+    metrics = {
+        "indexing.chunks_per_s": result["indexing"]["chunks_per_s"],
+        "db_size_bytes": result["db_size_bytes"],
+        "peak_rss_mb": result["peak_rss_mb"],
+    }
+    for name, stage in result["indexing"]["stages"].items():
+        metrics[f"indexing.{name}.chunks_per_s"] = stage["chunks_per_s"]
+    for name, stats in result["search"].items():
+        for key, value in stats.items():
+            metrics[f"search.{name}.{key}"] = value
+    return metrics
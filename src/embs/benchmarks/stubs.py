@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import zlib
+
+import numpy as np
+
+from embs.indexer.chunker import approx_tokens
+
+STUB_EMBEDDER_NAME = "embs-bench/stub-embedder"
+STUB_DIM = 64
+STUB_MAX_SEQ_LENGTH = 512
+
+
+def _bigrams(text: str) -> set[str]:
+    text = "".join(text.split())
+    return {text[i : i + 2] for i in range(max(len(text) - 1, 1))}
+
+
+class StubEmbedder:
+    """文字bigramのハッシュによる軽量embedding（ネットワーク・GPU不要）
+
+    Embedderと同じインターフェースを持ち、ベンチマークで実モデルの代わりに使う。
+    bigramが重なるテキスト同士は内積が大きくなる。
+    """
+
+    def __init__(self, dim: int = STUB_DIM) -> None:
+        self.model_name = STUB_EMBEDDER_NAME
+        self._dim = dim
+
+    @property
+    def dim(self) -> int:
+        """embeddingの次元数"""
+        return self._dim
+
+    @property
+    def max_seq_length(self) -> int:
+        """モデルが受け付ける最大トークン数（実モデルに合わせた値）"""
+        return STUB_MAX_SEQ_LENGTH
+
+    def token_count(self, text: str) -> int:
+        """トークン数の概算"""
+        return approx_tokens(text)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """テキストのリストを正規化済みembeddingに変換する"""
+        out = np.zeros((len(texts), self._dim), dtype=np.float32)
+        for row, text in zip(out, texts):
+            for gram in _bigrams(text):
+                h = zlib.crc32(gram.encode("utf-8"))
+                row[h % self._dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+    def close(self) -> None:
+        """Embedderと同じインターフェースのため（解放するものはない）"""
+
+
+class StubReranker:
+    """クエリとの文字bigramの重なり率でスコアをつける軽量reranker"""
+
+    def rerank(
+        self, query: str, candidates: list[dict], top_k: int = 5
+    ) -> list[dict]:
+        """候補をクエリとの関連度で並び替え、上位k件を返す"""
+        if not candidates:
+            return []
+
+        query_grams = _bigrams(query)
+        for candidate in candidates:
+            grams = _bigrams(candidate["text"])
+            candidate["rerank_score"] = len(query_grams & grams) / len(query_grams | grams)
+
+        ranked = sorted(candidates, key=lambda c: c["rerank_score"], reverse=True)
+        return ranked[:top_k]
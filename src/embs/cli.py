@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import sqlite3
+import time
 from pathlib import Path
 
 import typer
@@ -7,6 +9,12 @@ import typer
 app = typer.Typer(help="日本語テキストのセマンティック検索CLIツール")
 fetch_app = typer.Typer(help="ドキュメントソースからMarkdownを取得")
 app.add_typer(fetch_app, name="fetch")
+sync_app = typer.Typer(help="ドキュメントソースから直接インデックスを更新")
+app.add_typer(sync_app, name="sync")
+space_app = typer.Typer(help="インデックスの名前付き埋め込み空間を管理")
+app.add_typer(space_app, name="space")
+models_app = typer.Typer(help="オフライン読み込み用のモデルスナップショットを管理")
+app.add_typer(models_app, name="models")
 
 
 @fetch_app.command("confluence")
@@ -27,52 +35,726 @@ def fetch_confluence(
 def fetch_markdown(
     source_dir: Path = typer.Argument(..., help="Markdownファイルのソースディレクトリ"),
     out: Path = typer.Option(..., "--out", help="出力ディレクトリ"),
+    strategy: str = typer.Option(
+        "copy", "--strategy", help="配置方法 (copy / hardlink / reflink / symlink)"
+    ),
+    prune: bool = typer.Option(
+        False, "--prune", help="ソースから削除されたファイルを出力先からも削除する（前回の同期で配置したものに限る）"
+    ),
+    workers: int = typer.Option(4, "--workers", help="並列コピー数"),
 ) -> None:
-    """ローカルディレクトリからMarkdownファイルを収集する"""
+    """ローカルディレクトリからMarkdownファイルを収集する（変更分のみ反映）"""
     from embs.fetchers.markdown import MarkdownFetcher
 
-    fetcher = MarkdownFetcher(source_dir)
-    files = fetcher.fetch(out)
-    typer.echo(f"{len(files)} ファイルを取得しました → {out}")
+    try:
+        fetcher = MarkdownFetcher(source_dir, strategy=strategy, workers=workers)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    result = fetcher.sync(out, prune=prune)
+    typer.echo(
+        f"{len(result.files)} ファイルを取得しました → {out} "
+        f"(追加 {len(result.added)} / 変更 {len(result.changed)} / "
+        f"削除 {len(result.removed)} / 変更なし {len(result.unchanged)})"
+    )
 
 
 @app.command("index")
 def index(
     docs_dir: Path = typer.Argument(..., help="Markdownファイルのディレクトリ"),
     out: Path = typer.Option("index.db", "--out", help="出力DBファイルパス"),
+    backend: str | None = typer.Option(
+        None,
+        "--backend",
+        help="ベクトル検索バックエンド (sqlite-vec / numpy)。省略時は既存DBの設定",
+    ),
+    ann: bool = typer.Option(
+        False, "--ann", help="HNSW近似最近傍インデックスを作成する (要hnswlib)"
+    ),
+    hnsw_m: int = typer.Option(16, "--hnsw-m", help="HNSWの各ノードの接続数 M"),
+    ef_construction: int = typer.Option(
+        200, "--ef-construction", help="HNSW構築時の探索幅"
+    ),
+    atomic: bool = typer.Option(
+        False,
+        "--atomic",
+        help="別ファイルに全件を構築してから差し替える（検索を止めずに再構築）",
+    ),
+    compress: bool = typer.Option(
+        False, "--compress", help="チャンクテキストをzstdで圧縮する (要zstandard)"
+    ),
+    dedup: bool = typer.Option(
+        False, "--dedup", help="重複・ほぼ重複のチャンクを1つにまとめて保存する"
+    ),
+    dedup_threshold: float = typer.Option(
+        0.9, "--dedup-threshold", help="ほぼ重複とみなす類似度（文字n-gramのJaccard係数）"
+    ),
+    batch_size: int = typer.Option(
+        32, "--batch-size", help="embeddingのバッチサイズ（--workers指定時はワーカーあたり）"
+    ),
+    workers: int = typer.Option(
+        0, "--workers", help="embeddingを計算するワーカープロセス数 (0/1で単一プロセス)"
+    ),
+    threads_per_worker: int | None = typer.Option(
+        None,
+        "--threads-per-worker",
+        help="ワーカーごとのスレッド数（固定するコア数）。省略時はコア数÷ワーカー数",
+    ),
+    chunk_tokens: int = typer.Option(
+        256,
+        "--chunk-tokens",
+        help="同じ見出しの小さなチャンクを結合する目安のトークン数（既定で有効。0でdoclingの1要素1チャンク）",
+    ),
+    max_chunk_tokens: int = typer.Option(
+        448, "--max-chunk-tokens", help="これを超えるチャンクは重なりをもたせて分割する"
+    ),
+    shard: str | None = typer.Option(
+        None,
+        "--shard",
+        help="i/N: ファイル名のハッシュでN分割したうちi番目 (0始まり) だけを処理する",
+    ),
+    model_dir: Path | None = typer.Option(
+        None,
+        "--model-dir",
+        help="モデルのスナップショットを読み込むディレクトリ（省略時はEMBS_MODEL_DIR・設定ファイル）",
+    ),
+    max_memory: str | None = typer.Option(
+        None,
+        "--max-memory",
+        help="メモリ上限 (例: 4G, 512M)。近づくとバッチサイズと先読み数を自動で縮める",
+    ),
+    profile: bool = typer.Option(False, "--profile", help="処理段階ごとの所要時間を表示する"),
+    trace: Path | None = typer.Option(
+        None, "--trace", help="Chrome trace形式のJSONを書き出す (chrome://tracing・Perfetto)"
+    ),
 ) -> None:
-    """MarkdownファイルからインデックスDBを作成する"""
-    from embs.indexer.chunker import chunk_markdown
-    from embs.indexer.embedder import Embedder
-    from embs.indexer.store import VectorStore
+    """MarkdownファイルからインデックスDBを作成する
+
+    --shardを指定すると入力ファイルの一部だけでシャードDBを作る。
+    全シャードを作ったあとembs mergeで1つのDBに結合する。
+    """
+    from embs.indexer.memory import MemoryBudget, parse_size
+    from embs.indexer.shard import parse_shard, shard_of
+
+    try:
+        limit = parse_size(max_memory) if max_memory is not None else None
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+
+    try:
+        shard_spec = parse_shard(shard) if shard is not None else None
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
 
     md_files = sorted(docs_dir.rglob("*.md"))
     if not md_files:
         typer.echo("Markdownファイルが見つかりませんでした", err=True)
         raise typer.Exit(1)
+    if shard_spec is not None:
+        # 該当ファイルがなくても、embs mergeに渡せるよう空のシャードDBを作る
+        md_files = [f for f in md_files if shard_of(f.name, shard_spec[1]) == shard_spec[0]]
+        typer.echo(f"シャード {shard_spec[0]}/{shard_spec[1]}")
+
+    # docling・torchを読み込むため、引数の検査が済んでからimportする
+    from embs.fetchers.markdown import MarkdownFetcher
+    from embs.indexer.dedup import Deduplicator
+    from embs.indexer.embedder import Embedder
+    from embs.indexer.pipeline import index_documents
+    from embs.indexer.store import VectorStore, staging_path, swap_in
 
     typer.echo(f"{len(md_files)} ファイルを処理します...")
+    _start_profiling(profile, trace)
+
+    target = staging_path(out) if atomic else out
+    if atomic and backend is None and out.exists():
+        # 差し替え前と同じバックエンドで構築する
+        current = VectorStore(out)
+        backend = current.backend
+        current.close()
+
+    # ワーカーごとにbatch_size件ずつ渡るよう、1回に流す件数をワーカー数倍にする
+    batch_size *= max(1, workers)
+    memory = MemoryBudget(limit, batch_size=batch_size)
+    try:
+        embedder = Embedder(
+            workers=workers, threads_per_worker=threads_per_worker, model_dir=model_dir
+        )
+    except FileNotFoundError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    memory.sample("model")
+    store = VectorStore(target, backend=backend)
+    store.create_tables(model_name=embedder.model_name, dim=embedder.dim)
+
+    documents = MarkdownFetcher(docs_dir).iter_documents()
+    if shard_spec is not None:
+        documents = (d for d in documents if shard_of(d.name, shard_spec[1]) == shard_spec[0])
+    try:
+        stats = index_documents(
+            documents,
+            store,
+            embedder,
+            batch_size=batch_size,
+            deduplicator=Deduplicator(threshold=dedup_threshold) if dedup else None,
+            memory=memory,
+            sizing=_chunk_sizing(embedder, chunk_tokens, max_chunk_tokens),
+            on_document=lambda doc: typer.echo(f"  {doc.name}"),
+        )
+    finally:
+        # 途中で失敗してもワーカープロセスを残さない
+        embedder.close()
+
+    # 空のシャードでは作るものがない（結合後にembs merge側で作り直される）
+    if ann and stats.chunks:
+        typer.echo("HNSWインデックスを作成しています...")
+        store.build_ann(m=hnsw_m, ef_construction=ef_construction)
+        memory.sample("ann")
+
+    if compress and stats.chunks:
+        before, after = store.compress_texts()
+        typer.echo(f"テキストを圧縮しました: {before:,} → {after:,} バイト")
+        memory.sample("compress")
+
+    store.close()
+    if atomic:
+        swap_in(out, target)
+    if dedup:
+        typer.echo(f"重複: {stats.duplicates} チャンクを代表チャンクにまとめました")
+    typer.echo(f"完了: {stats.chunks} チャンクをインデックス化 → {out}")
+    if limit is not None or profile:
+        typer.echo("\n" + memory.report())
+    if memory.over_limit:
+        typer.echo(
+            f"警告: バッチサイズ1でもメモリ上限を {memory.over_limit} 回超えました", err=True
+        )
+    _finish_profiling(profile, trace)
+
+
+def _chunk_sizing(embedder, target_tokens: int, max_tokens: int):
+    """embeddingモデルのトークナイザと最大長に合わせたチャンクサイズ調整（0なら調整しない）"""
+    from embs.indexer.chunker import ChunkSizing
+
+    if target_tokens <= 0:
+        return None
+    if embedder.max_seq_length:
+        # [CLS]・[SEP] の分を除く
+        max_tokens = min(max_tokens, embedder.max_seq_length - 2)
+    return ChunkSizing(
+        target_tokens=min(target_tokens, max_tokens),
+        max_tokens=max_tokens,
+        count_tokens=embedder.token_count,
+    )
+
+
+def _start_profiling(profile: bool, trace: Path | None) -> None:
+    """--profile・--traceが指定されていれば計測を有効にする"""
+    if profile or trace is not None:
+        from embs import profiling
+
+        profiling.enable()
+
+
+def _finish_profiling(profile: bool, trace: Path | None) -> None:
+    """計測を止め、集計表とtraceファイルを出力する"""
+    from embs import profiling
+
+    profiler = profiling.disable()
+    if profiler is None:
+        return
+    if profile:
+        typer.echo("\n" + profiler.format_summary(), err=True)
+    if trace is not None:
+        import json
+
+        trace.write_text(json.dumps(profiler.chrome_trace(), ensure_ascii=False), encoding="utf-8")
+        typer.echo(f"traceを書き出しました → {trace}", err=True)
+
+
+def _run_sync(
+    documents,
+    out: Path,
+    mirror: Path | None,
+    backend: str | None,
+    chunk_tokens: int,
+    max_chunk_tokens: int,
+    ann: bool = False,
+    hnsw_m: int = 16,
+    ef_construction: int = 200,
+) -> None:
+    """文書ストリームをインデックスDBへ流し込む"""
+    from embs.indexer.embedder import Embedder
+    from embs.indexer.pipeline import index_documents
+    from embs.indexer.store import VectorStore
 
     embedder = Embedder()
-    store = VectorStore(out)
-    store.create_tables(model_name=embedder.model_name)
-
-    total_chunks = 0
-    for md_file in md_files:
-        typer.echo(f"  {md_file.name}")
-        chunks = chunk_markdown(md_file)
-        for chunk in chunks:
-            embedding = embedder.embed([chunk.text])[0]
-            store.insert(
-                source_file=chunk.source_file,
-                chunk_index=chunk.chunk_index,
-                text=chunk.text,
-                embedding=embedding,
-            )
-            total_chunks += 1
+    store = VectorStore(out, backend=backend)
+    store.create_tables(model_name=embedder.model_name, dim=embedder.dim)
+    try:
+        stats = index_documents(
+            documents,
+            store,
+            embedder,
+            mirror_dir=mirror,
+            sizing=_chunk_sizing(embedder, chunk_tokens, max_chunk_tokens),
+        )
+        # 既存のHNSWインデックスは追加・削除のたびに更新されるので、作り直すのは指定時だけ
+        if ann:
+            typer.echo("HNSWインデックスを作成しています...")
+            try:
+                store.build_ann(m=hnsw_m, ef_construction=ef_construction)
+            except ValueError as e:
+                typer.echo(str(e), err=True)
+    finally:
+        store.close()
+
+    typer.echo(
+        f"完了: {stats.documents} ファイル / {stats.chunks} チャンクをインデックス化 → {out}"
+    )
+
+
+@sync_app.command("confluence")
+def sync_confluence(
+    config: Path = typer.Option(..., "--config", help="設定ファイルパス (JSON)"),
+    out: Path = typer.Option("index.db", "--out", help="出力DBファイルパス"),
+    mirror: Path | None = typer.Option(
+        None, "--mirror", help="取得したMarkdownの保存先ディレクトリ"
+    ),
+    backend: str | None = typer.Option(
+        None,
+        "--backend",
+        help="ベクトル検索バックエンド (sqlite-vec / numpy)。省略時は既存DBの設定",
+    ),
+    chunk_tokens: int = typer.Option(
+        256,
+        "--chunk-tokens",
+        help="同じ見出しの小さなチャンクを結合する目安のトークン数（既定で有効。0でdoclingの1要素1チャンク）",
+    ),
+    max_chunk_tokens: int = typer.Option(
+        448, "--max-chunk-tokens", help="これを超えるチャンクは重なりをもたせて分割する"
+    ),
+    ann: bool = typer.Option(
+        False, "--ann", help="HNSW近似最近傍インデックスを作成する (要hnswlib)"
+    ),
+    hnsw_m: int = typer.Option(16, "--hnsw-m", help="HNSWの各ノードの接続数 M"),
+    ef_construction: int = typer.Option(
+        200, "--ef-construction", help="HNSW構築時の探索幅"
+    ),
+) -> None:
+    """Confluenceから取得したページを中間ファイルなしでインデックス化する"""
+    from embs.fetchers.confluence import ConfluenceFetcher, load_config
 
+    cfg = load_config(config)
+    fetcher = ConfluenceFetcher()
+    _run_sync(
+        fetcher.iter_documents(cfg),
+        out,
+        mirror,
+        backend,
+        chunk_tokens,
+        max_chunk_tokens,
+        ann=ann,
+        hnsw_m=hnsw_m,
+        ef_construction=ef_construction,
+    )
+
+
+@sync_app.command("markdown")
+def sync_markdown(
+    source_dir: Path = typer.Argument(..., help="Markdownファイルのソースディレクトリ"),
+    out: Path = typer.Option("index.db", "--out", help="出力DBファイルパス"),
+    mirror: Path | None = typer.Option(
+        None, "--mirror", help="取得したMarkdownの保存先ディレクトリ"
+    ),
+    backend: str | None = typer.Option(
+        None,
+        "--backend",
+        help="ベクトル検索バックエンド (sqlite-vec / numpy)。省略時は既存DBの設定",
+    ),
+    chunk_tokens: int = typer.Option(
+        256,
+        "--chunk-tokens",
+        help="同じ見出しの小さなチャンクを結合する目安のトークン数（既定で有効。0でdoclingの1要素1チャンク）",
+    ),
+    max_chunk_tokens: int = typer.Option(
+        448, "--max-chunk-tokens", help="これを超えるチャンクは重なりをもたせて分割する"
+    ),
+    ann: bool = typer.Option(
+        False, "--ann", help="HNSW近似最近傍インデックスを作成する (要hnswlib)"
+    ),
+    hnsw_m: int = typer.Option(16, "--hnsw-m", help="HNSWの各ノードの接続数 M"),
+    ef_construction: int = typer.Option(
+        200, "--ef-construction", help="HNSW構築時の探索幅"
+    ),
+) -> None:
+    """ローカルのMarkdownファイルを中間ファイルなしでインデックス化する"""
+    from embs.fetchers.markdown import MarkdownFetcher
+
+    fetcher = MarkdownFetcher(source_dir)
+    _run_sync(
+        fetcher.iter_documents(),
+        out,
+        mirror,
+        backend,
+        chunk_tokens,
+        max_chunk_tokens,
+        ann=ann,
+        hnsw_m=hnsw_m,
+        ef_construction=ef_construction,
+    )
+
+
+@space_app.command("add")
+def space_add(
+    name: str = typer.Argument(..., help="空間名（英数字と_）"),
+    model: str = typer.Option(..., "--model", help="embeddingモデル名"),
+    db: Path = typer.Option("index.db", "--db", help="インデックスDBファイルパス"),
+) -> None:
+    """名前付き埋め込み空間を追加する（ベクトルは space backfill で作成）"""
+    from embs.indexer.embedder import Embedder
+    from embs.indexer.store import VectorStore
+
+    embedder = Embedder(model_name=model)
+    store = VectorStore(db)
+    try:
+        store.add_space(name, model_name=model, dim=embedder.dim)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    finally:
+        store.close()
+    typer.echo(f"埋め込み空間 {name} を追加しました ({model}, {embedder.dim}次元)")
+
+
+@space_app.command("backfill")
+def space_backfill(
+    name: str = typer.Argument(..., help="空間名"),
+    db: Path = typer.Option("index.db", "--db", help="インデックスDBファイルパス"),
+    batch_size: int = typer.Option(64, "--batch-size", help="1トランザクションあたりの件数"),
+    limit: int | None = typer.Option(None, "--limit", help="今回処理する最大件数"),
+) -> None:
+    """埋め込み空間のベクトルが未作成のチャンクを埋める（中断・再開可能）"""
+    from embs.indexer.embedder import Embedder
+    from embs.indexer.pipeline import backfill_space
+    from embs.indexer.store import VectorStore
+
+    store = VectorStore(db)
+    info = store.get_space(name)
+    if info is None:
+        store.close()
+        typer.echo(f"埋め込み空間が見つかりません: {name}", err=True)
+        raise typer.Exit(1)
+
+    embedder = Embedder(model_name=info["model_name"])
+    try:
+        done = backfill_space(store, name, embedder, batch_size=batch_size, limit=limit)
+        info = store.get_space(name)
+    finally:
+        store.close()
+    typer.echo(f"{done} チャンクを処理しました ({info['filled']}/{info['total']})")
+
+
+@space_app.command("list")
+def space_list(
+    db: Path = typer.Option("index.db", "--db", help="インデックスDBファイルパス"),
+) -> None:
+    """埋め込み空間の一覧と進捗を表示する"""
+    from embs.indexer.store import VectorStore
+
+    store = VectorStore(db)
+    typer.echo(f"(主) {store.get_model_name()}")
+    for info in store.list_spaces():
+        typer.echo(
+            f"{info['name']}: {info['model_name']} ({info['dim']}次元) "
+            f"{info['filled']}/{info['total']}"
+        )
     store.close()
-    typer.echo(f"完了: {total_chunks} チャンクをインデックス化 → {out}")
+
+
+def _snapshot_targets(models: list[str] | None) -> list[str]:
+    from embs.indexer.embedder import MODEL_NAME as EMBEDDER_MODEL
+    from embs.searcher.reranker import MODEL_NAME as RERANKER_MODEL
+
+    return models or [EMBEDDER_MODEL, RERANKER_MODEL]
+
+
+def _snapshot_root(model_dir: Path | None) -> Path:
+    from embs.models import model_dir as configured_model_dir
+
+    root = configured_model_dir(model_dir)
+    if root is None:
+        typer.echo(
+            "スナップショットの保存先を --dir・EMBS_MODEL_DIR・設定ファイルのいずれかで指定してください",
+            err=True,
+        )
+        raise typer.Exit(1)
+    return root
+
+
+@models_app.command("pull")
+def models_pull(
+    models: list[str] | None = typer.Argument(
+        None, help="モデルID（省略時はembeddingモデルとreranker）"
+    ),
+    model_dir: Path | None = typer.Option(None, "--dir", help="スナップショットの保存先"),
+    revision: str | None = typer.Option(
+        None, "--revision", help="取得するリビジョン（省略時は現在のコミットに固定）"
+    ),
+) -> None:
+    """Hugging Face Hubからモデルを取得し、オフラインで読み込めるスナップショットを作る"""
+    from embs.models import pull
+
+    root = _snapshot_root(model_dir)
+    for model in _snapshot_targets(models):
+        typer.echo(f"{model} を取得しています...")
+        path = pull(model, root, revision=revision)
+        typer.echo(f"  → {path}")
+
+
+@models_app.command("verify")
+def models_verify(
+    models: list[str] | None = typer.Argument(
+        None, help="モデルID（省略時はembeddingモデルとreranker）"
+    ),
+    model_dir: Path | None = typer.Option(None, "--dir", help="スナップショットの保存先"),
+    load: bool = typer.Option(
+        False, "--load", help="実際に読み込み、読み込みにかかった時間を表示する"
+    ),
+) -> None:
+    """スナップショットのファイルをマニフェストのハッシュと照合する"""
+    from embs.models import verify
+    from embs.searcher.reranker import MODEL_NAME as RERANKER_MODEL
+
+    root = _snapshot_root(model_dir)
+    failed = False
+    for model in _snapshot_targets(models):
+        problems = verify(model, root)
+        if problems:
+            failed = True
+            typer.echo(f"NG {model}")
+            for problem in problems:
+                typer.echo(f"  {problem}")
+            continue
+        if not load:
+            typer.echo(f"OK {model}")
+            continue
+
+        start = time.perf_counter()
+        # reranker以外は埋め込み空間のモデルを含めてembeddingモデルとして読み込む
+        if model == RERANKER_MODEL:
+            from embs.searcher.reranker import Reranker
+
+            Reranker(model_name=model, model_dir=root)
+        else:
+            from embs.indexer.embedder import Embedder
+
+            Embedder(model_name=model, model_dir=root)
+        typer.echo(f"OK {model} (読み込み {time.perf_counter() - start:.2f} 秒)")
+
+    if failed:
+        raise typer.Exit(1)
+
+
+@app.command("export")
+def export_cmd(
+    db: Path = typer.Option("index.db", "--db", help="インデックスDBファイルパス"),
+    out: Path = typer.Option(..., "--out", help="出力Parquetファイルパス"),
+) -> None:
+    """インデックスをParquetに書き出す (要pyarrow)"""
+    from embs.indexer.columnar import export_index
+    from embs.indexer.store import VectorStore
+
+    if not db.exists():
+        typer.echo(f"DBファイルが見つかりません: {db}", err=True)
+        raise typer.Exit(1)
+
+    store = VectorStore(db)
+    try:
+        total = export_index(store, out)
+    finally:
+        store.close()
+    typer.echo(f"{total} チャンクを書き出しました → {out}")
+
+
+@app.command("import")
+def import_cmd(
+    parquet: Path = typer.Argument(..., help="embs exportで書き出したParquetファイル"),
+    out: Path = typer.Option("index.db", "--out", help="出力DBファイルパス"),
+) -> None:
+    """Parquetからインデックスを復元する (要pyarrow)"""
+    from embs.indexer.columnar import import_index
+
+    try:
+        total = import_index(parquet, out)
+    except (FileExistsError, ValueError) as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    typer.echo(f"{total} チャンクを読み込みました → {out}")
+
+
+@app.command("watch")
+def watch_cmd(
+    docs_dir: Path = typer.Argument(..., help="監視するMarkdownファイルのディレクトリ"),
+    db: Path = typer.Option("index.db", "--db", help="更新するインデックスDB（embs indexで作成済み）"),
+    debounce: float = typer.Option(
+        1.0, "--debounce", help="この秒数だけ変更が途切れたら、まとめて反映する"
+    ),
+    polling: bool = typer.Option(
+        False, "--polling", help="inotifyを使わずにポーリングで監視する（ネットワークFSなど）"
+    ),
+    poll_interval: float = typer.Option(1.0, "--poll-interval", help="ポーリングの間隔（秒）"),
+    batch_size: int = typer.Option(32, "--batch-size", help="1トランザクションあたりのチャンク数"),
+    chunk_tokens: int = typer.Option(
+        256,
+        "--chunk-tokens",
+        help="同じ見出しの小さなチャンクを結合する目安のトークン数（既定で有効。0でdoclingの1要素1チャンク）",
+    ),
+    max_chunk_tokens: int = typer.Option(
+        448, "--max-chunk-tokens", help="これを超えるチャンクは重なりをもたせて分割する"
+    ),
+    dedup: bool = typer.Option(
+        False, "--dedup", help="重複・ほぼ重複のチャンクを1つにまとめて保存する"
+    ),
+    dedup_threshold: float = typer.Option(
+        0.9, "--dedup-threshold", help="ほぼ重複とみなす類似度（文字n-gramのJaccard係数）"
+    ),
+    model_dir: Path | None = typer.Option(
+        None,
+        "--model-dir",
+        help="モデルのスナップショットを読み込むディレクトリ（省略時はEMBS_MODEL_DIR・設定ファイル）",
+    ),
+) -> None:
+    """ディレクトリを監視し、変更されたMarkdownだけを継続的にインデックスへ反映する"""
+    if not db.exists():
+        typer.echo(f"DBファイルが見つかりません（先にembs indexを実行してください）: {db}", err=True)
+        raise typer.Exit(1)
+    if not docs_dir.is_dir():
+        typer.echo(f"ディレクトリが見つかりません: {docs_dir}", err=True)
+        raise typer.Exit(1)
+
+    from embs.indexer.dedup import Deduplicator
+    from embs.indexer.embedder import MODEL_NAME, Embedder
+    from embs.indexer.store import VectorStore
+    from embs.indexer.watch import IncrementalIndexer, collect_changes, open_watcher
+
+    store = VectorStore(db)
+    try:
+        embedder = Embedder(model_name=store.get_model_name() or MODEL_NAME, model_dir=model_dir)
+    except FileNotFoundError as e:
+        store.close()
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    indexer = IncrementalIndexer(
+        docs_dir,
+        store,
+        embedder,
+        batch_size=batch_size,
+        sizing=_chunk_sizing(embedder, chunk_tokens, max_chunk_tokens),
+        deduplicator=Deduplicator(threshold=dedup_threshold) if dedup else None,
+    )
+    watcher = open_watcher(docs_dir, polling=polling, interval=poll_interval)
+    method = "ポーリング" if watcher.interval else "inotify"
+    typer.echo(f"{docs_dir} を監視しています ({method}、Ctrl-Cで終了)...")
+    try:
+        while True:
+            changes = collect_changes(watcher, debounce)
+            started = time.perf_counter()
+            stats = indexer.apply(changes)
+            if stats.updated or stats.deleted:
+                typer.echo(
+                    f"更新 {stats.updated} ファイル ({stats.chunks} チャンク) / "
+                    f"削除 {stats.deleted} ファイル / {time.perf_counter() - started:.2f} 秒"
+                )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        embedder.close()
+        store.close()
+
+
+@app.command("merge")
+def merge_cmd(
+    shards: list[Path] = typer.Argument(..., help="embs index --shardで作ったシャードDB"),
+    out: Path = typer.Option("index.db", "--out", help="出力DBファイルパス"),
+    backend: str | None = typer.Option(
+        None, "--backend", help="出力のベクトル検索バックエンド。省略時はシャードと同じ"
+    ),
+    dedup: bool = typer.Option(
+        False, "--dedup", help="シャードをまたいだ重複・ほぼ重複のチャンクを1つにまとめる"
+    ),
+    dedup_threshold: float = typer.Option(
+        0.9, "--dedup-threshold", help="ほぼ重複とみなす類似度（文字n-gramのJaccard係数）"
+    ),
+) -> None:
+    """シャードDBを1つのインデックスに結合する（embeddingは再計算しない）"""
+    from embs.indexer.dedup import Deduplicator
+    from embs.indexer.shard import merge_stores
+
+    try:
+        stats = merge_stores(
+            shards,
+            out,
+            backend=backend,
+            deduplicator=Deduplicator(threshold=dedup_threshold) if dedup else None,
+        )
+    except (FileExistsError, FileNotFoundError, ValueError) as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    if dedup:
+        typer.echo(f"重複: {stats.deduplicated} チャンクを代表チャンクにまとめました")
+    typer.echo(f"{stats.shards} シャード・{stats.chunks} チャンクを結合しました → {out}")
+
+
+@app.command("optimize")
+def optimize_cmd(
+    db: Path = typer.Option("index.db", "--db", help="インデックスDBファイルパス"),
+    vec_chunk_size: int | None = typer.Option(
+        None,
+        "--vec-chunk-size",
+        help="vec0のchunk_size（8の倍数）。省略時はチャンク数から決める",
+    ),
+    queries: int = typer.Option(20, "--queries", help="前後の検索時間の計測に使うクエリ数"),
+    hnsw_m: int = typer.Option(16, "--hnsw-m", help="ANNインデックスを作り直すときのM"),
+    ef_construction: int = typer.Option(
+        200, "--ef-construction", help="ANNインデックスを作り直すときの構築時の探索幅"
+    ),
+) -> None:
+    """インデックスDBをファイル順に並べ直し、VACUUM・ANALYZEして前後を比べる
+
+    検索は止めずに差し替えるが、実行中の書き込み（embs watch等）は止めておくこと。
+    """
+    from embs.indexer.optimize import optimize
+
+    typer.echo(f"{db} を最適化しています...")
+    try:
+        report = optimize(
+            db,
+            vec_chunk_size=vec_chunk_size,
+            latency_queries=queries,
+            hnsw_m=hnsw_m,
+            ef_construction=ef_construction,
+        )
+    except (FileNotFoundError, ValueError) as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+
+    typer.echo(f"チャンク数: {report.chunks:,}")
+    typer.echo(
+        f"サイズ: {report.size_before:,} → {report.size_after:,} バイト"
+        f"（未使用ページ {report.free_bytes_before:,} バイトを解放）"
+    )
+    typer.echo(
+        f"ファイル内のチャンクの連続率: {report.locality_before:.1%} → {report.locality_after:.1%}"
+    )
+    typer.echo(
+        f"vec0 chunk_size: {report.vec_chunk_size_before} → {report.vec_chunk_size_after}"
+    )
+    typer.echo(
+        f"検索時間（中央値）: {report.latency_before * 1000:.2f} → "
+        f"{report.latency_after * 1000:.2f} ミリ秒"
+    )
 
 
 @app.command("search")
@@ -80,23 +762,304 @@ def search_cmd(
     query: str = typer.Argument(..., help="検索クエリ"),
     db: Path = typer.Option("index.db", "--db", help="インデックスDBファイルパス"),
     top_k: int = typer.Option(5, "--top-k", help="返す結果の数"),
+    exact: bool = typer.Option(
+        False, "--exact", help="HNSWインデックスを使わず全件を厳密に検索する"
+    ),
+    ef_search: int | None = typer.Option(
+        None, "--ef-search", help="HNSW検索時の探索幅（大きいほど高精度・低速）"
+    ),
+    candidate_space: str | None = typer.Option(
+        None, "--candidate-space", help="候補の収集に使う名前付き埋め込み空間"
+    ),
+    rerank_batch_size: int = typer.Option(
+        32, "--rerank-batch-size", help="rerankerの推論バッチサイズ"
+    ),
+    rerank_max_length: int = typer.Option(
+        512, "--rerank-max-length", help="rerankerに入力する最大トークン数（超える分は切り捨て）"
+    ),
+    context: int = typer.Option(
+        0, "--context", help="各結果の前後に表示する同じファイルのチャンク数"
+    ),
+    cache: bool = typer.Option(
+        False, "--cache", help="言い換えのクエリに結果を再利用するキャッシュ（<db>.qcache）を使う"
+    ),
+    cache_threshold: float = typer.Option(
+        0.95, "--cache-threshold", help="キャッシュを使うクエリ間のコサイン類似度の下限"
+    ),
+    cache_ttl: float = typer.Option(
+        24 * 60 * 60, "--cache-ttl", help="キャッシュした結果の有効期間（秒）"
+    ),
+    cache_size: int = typer.Option(1000, "--cache-size", help="キャッシュするクエリ数の上限"),
+    progressive: bool = typer.Option(
+        False, "--progressive", help="ベクトル検索の結果をすぐに表示し、リランキング後の順位を続けて表示する"
+    ),
+    rerank_step: int = typer.Option(
+        0, "--rerank-step", help="候補をこの件数ずつリランキングして途中の順位も表示する（--progressiveが必要）"
+    ),
+    model_dir: Path | None = typer.Option(
+        None,
+        "--model-dir",
+        help="モデルのスナップショットを読み込むディレクトリ（省略時はEMBS_MODEL_DIR・設定ファイル）",
+    ),
+    profile: bool = typer.Option(False, "--profile", help="処理段階ごとの所要時間を表示する"),
+    trace: Path | None = typer.Option(
+        None, "--trace", help="Chrome trace形式のJSONを書き出す (chrome://tracing・Perfetto)"
+    ),
+    metrics_out: Path | None = typer.Option(
+        None, "--metrics", help="検索後のメトリクスをPrometheusテキスト形式で書き出す"
+    ),
 ) -> None:
     """セマンティック検索を実行する"""
-    from embs.searcher.query import search
-
     if not db.exists():
         typer.echo(f"DBファイルが見つかりません: {db}", err=True)
         raise typer.Exit(1)
 
-    results = search(query, db, top_k=top_k)
+    if rerank_step and not progressive:
+        typer.echo("--rerank-step は --progressive と一緒に指定してください", err=True)
+        raise typer.Exit(1)
+
+    from embs.searcher.cache import QueryCache
+    from embs.searcher.query import search_progressive
+
+    query_cache = None
+    if cache:
+        try:
+            query_cache = QueryCache.for_index(
+                db, threshold=cache_threshold, max_entries=cache_size, ttl=cache_ttl
+            )
+        except ValueError as e:
+            typer.echo(str(e), err=True)
+            raise typer.Exit(1)
+        except sqlite3.Error as e:
+            typer.echo(f"警告: キャッシュを開けないため使わずに検索します: {e}", err=True)
+
+    _start_profiling(profile, trace)
+    results: list[dict] = []
+    try:
+        updates = search_progressive(
+            query,
+            db,
+            top_k=top_k,
+            exact=exact,
+            ef_search=ef_search,
+            candidate_space=candidate_space,
+            rerank_batch_size=rerank_batch_size,
+            rerank_max_length=rerank_max_length,
+            model_dir=model_dir,
+            context=context,
+            cache=query_cache,
+            rerank_step=rerank_step or None,
+            progressive=progressive,
+        )
+        for update in updates:
+            results = update.results
+            if progressive:
+                typer.echo(f"\n== {_STAGE_LABELS[update.stage]} ({update.elapsed:.2f}秒) ==")
+                _print_results(results)
+    except (FileNotFoundError, ValueError) as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    finally:
+        if query_cache is not None:
+            query_cache.close()
+    _finish_profiling(profile, trace)
+    if metrics_out is not None:
+        from embs.metrics import dump
+
+        dump(metrics_out)
+
+    if not progressive:
+        _print_results(results)
+
+
+_STAGE_LABELS = {
+    "vector": "ベクトル検索の上位",
+    "partial": "リランキング途中",
+    "reranked": "リランキング後",
+}
+
 
+def _print_results(results: list[dict]) -> None:
     if not results:
         typer.echo("結果が見つかりませんでした")
         return
 
     for i, r in enumerate(results, 1):
-        typer.echo(f"\n--- [{i}] {r['source_file']} (score: {r['rerank_score']:.4f}) ---")
-        typer.echo(r["text"])
+        if "rerank_score" in r:
+            score = f"score: {r['rerank_score']:.4f}"
+        else:
+            score = f"distance: {r['distance']:.4f}"
+        typer.echo(f"\n--- [{i}] {r['source_file']} ({score}) ---")
+        if r.get("duplicates"):
+            others = ", ".join(sorted({source for source, _ in r["duplicates"]}))
+            typer.echo(f"(同じ内容: {others})")
+        if r.get("context"):
+            typer.echo(_format_context(r))
+        else:
+            typer.echo(r["text"])
+
+
+def _format_context(result: dict) -> str:
+    """ヒットしたチャンクの前後を、前後のチャンクには行頭に "| " を付けて並べる"""
+    blocks = []
+    for chunk in result["context"]:
+        if chunk["chunk_index"] == result["chunk_index"]:
+            blocks.append(result["text"])
+        else:
+            blocks.append("\n".join(f"| {line}" for line in chunk["text"].splitlines()))
+    return "\n".join(blocks)
+
+
+@app.command("bench")
+def bench_cmd(
+    documents: int = typer.Option(200, "--documents", min=1, help="合成コーパスの文書数"),
+    queries: int = typer.Option(100, "--queries", min=1, help="計測するクエリ数"),
+    backend: str = typer.Option(
+        "sqlite-vec", "--backend", help="ベクトル検索バックエンド (sqlite-vec / numpy)"
+    ),
+    ann: bool = typer.Option(False, "--ann", help="HNSWインデックスも作成して計測する"),
+    batch_size: int = typer.Option(32, "--batch-size", help="embeddingのバッチサイズ"),
+    seed: int = typer.Option(0, "--seed", help="コーパス生成の乱数シード"),
+    real_models: bool = typer.Option(
+        False, "--real-models", help="スタブではなく実際のembedding・rerankerモデルを使う"
+    ),
+    out: Path | None = typer.Option(None, "--out", help="結果JSONの出力先"),
+    baseline: Path | None = typer.Option(
+        None, "--baseline", help="比較対象の結果JSON（以前のコミットで計測したもの）"
+    ),
+    work_dir: Path | None = typer.Option(
+        None, "--work-dir", help="ベンチマーク用DBの作成先（省略時は一時ディレクトリ）"
+    ),
+) -> None:
+    """合成コーパスでインデックス作成・検索の性能を計測する"""
+    import json
+    import tempfile
+
+    from embs.benchmarks.runner import BenchConfig, compare_results, run_benchmark
+
+    config = BenchConfig(
+        documents=documents,
+        queries=queries,
+        backend=backend,
+        ann=ann,
+        batch_size=batch_size,
+        seed=seed,
+        real_models=real_models,
+    )
+    if work_dir is not None:
+        work_dir.mkdir(parents=True, exist_ok=True)
+        result = run_benchmark(config, work_dir)
+    else:
+        with tempfile.TemporaryDirectory(prefix="embs-bench-") as tmp:
+            result = run_benchmark(config, Path(tmp))
+
+    typer.echo(
+        f"コーパス: {result['corpus']['documents']} 文書 / {result['corpus']['chunks']} チャンク"
+    )
+    typer.echo("インデックス作成:")
+    for name, stage in result["indexing"]["stages"].items():
+        typer.echo(f"  {name:<8} {stage['seconds']:8.3f} 秒 {stage['chunks_per_s']:10.1f} チャンク/秒")
+    typer.echo(
+        f"  {'total':<8} {result['indexing']['total_seconds']:8.3f} 秒 "
+        f"{result['indexing']['chunks_per_s']:10.1f} チャンク/秒"
+    )
+    typer.echo("検索レイテンシ (ms):")
+    for name, stats in result["search"].items():
+        typer.echo(
+            f"  {name:<8} p50 {stats['p50_ms']:8.3f}  p95 {stats['p95_ms']:8.3f}  "
+            f"p99 {stats['p99_ms']:8.3f}"
+        )
+    typer.echo(f"DBサイズ: {result['db_size_bytes']:,} バイト")
+    typer.echo(f"最大RSS: {result['peak_rss_mb']:.1f} MiB")
+
+    if baseline is not None:
+        typer.echo(f"\n{baseline} との比較:")
+        previous = json.loads(baseline.read_text(encoding="utf-8"))
+        for name, before, after in compare_results(previous, result):
+            change = (after - before) / before * 100 if before else 0.0
+            typer.echo(f"  {name:<32} {before:14.3f} → {after:14.3f} ({change:+.1f}%)")
+
+    if out is not None:
+        out.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        typer.echo(f"結果を書き出しました → {out}")
+
+
+@app.command("eval")
+def eval_cmd(
+    queries: Path = typer.Argument(
+        ..., help='正解つきクエリセット (JSONL: {"query": ..., "relevant": ["a.md", "b.md#3"]})'
+    ),
+    db: Path = typer.Option("index.db", "--db", help="インデックスDBファイルパス"),
+    k: int = typer.Option(5, "--k", help="recall@k・nDCG@kのk（返す結果の数）"),
+    configs: list[str] | None = typer.Option(
+        None,
+        "--config",
+        help='検索設定 (例: "initial_k=50,rerank=false,ef_search=32")。複数指定可',
+    ),
+    out: Path | None = typer.Option(None, "--out", help="結果JSONの出力先"),
+) -> None:
+    """正解つきクエリセットで検索設定ごとの検索品質とレイテンシを比較する"""
+    import json
+    from dataclasses import asdict
+
+    from embs.benchmarks.evaluate import (
+        SearchConfig,
+        evaluate,
+        format_table,
+        load_queries,
+    )
+    from embs.indexer.embedder import MODEL_NAME, Embedder
+    from embs.indexer.store import VectorStore
+
+    if not db.exists():
+        typer.echo(f"DBファイルが見つかりません: {db}", err=True)
+        raise typer.Exit(1)
+
+    store = VectorStore(db)
+    try:
+        labelled = load_queries(queries)
+        if configs:
+            search_configs = [SearchConfig.parse(spec) for spec in configs]
+        else:
+            specs = ["initial_k=10", "initial_k=20", "initial_k=50", "initial_k=20,rerank=false"]
+            if store.get_metadata().get("ann_index") == "hnsw":
+                specs.append("initial_k=20,exact=true")
+            search_configs = [SearchConfig.parse(spec) for spec in specs]
+
+        embedders = {}
+        for space in {c.space for c in search_configs}:
+            if space is None:
+                embedders[None] = Embedder(model_name=store.get_model_name() or MODEL_NAME)
+                continue
+            info = store.get_space(space)
+            if info is None:
+                raise ValueError(f"埋め込み空間が見つかりません: {space}")
+            embedders[space] = Embedder(model_name=info["model_name"])
+
+        reranker = None
+        if any(c.rerank for c in search_configs):
+            from embs.searcher.reranker import Reranker
+
+            reranker = Reranker()
+
+        typer.echo(f"{len(labelled)} クエリ × {len(search_configs)} 設定で評価します...")
+        results = evaluate(
+            store, labelled, search_configs, embedders=embedders, reranker=reranker, k=k
+        )
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    finally:
+        store.close()
+
+    typer.echo(format_table(results))
+    typer.echo("(* はパレート最適)")
+    if out is not None:
+        out.write_text(
+            json.dumps([asdict(r) for r in results], ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+        typer.echo(f"結果を書き出しました → {out}")
 
 
 if __name__ == "__main__":
@@ -1,5 +1,21 @@
-from embs.fetchers.base import BaseFetcher
-from embs.fetchers.confluence import ConfluenceFetcher
-from embs.fetchers.markdown import MarkdownFetcher
+from __future__ import annotations
 
-__all__ = ["BaseFetcher", "ConfluenceFetcher", "MarkdownFetcher"]
+from typing import TYPE_CHECKING
+
+from embs._lazy import attach
+
+if TYPE_CHECKING:
+    from embs.fetchers.base import BaseFetcher, Document
+    from embs.fetchers.confluence import ConfluenceFetcher
+    from embs.fetchers.markdown import MarkdownFetcher
+
+# Markdownだけを扱うときにConfluenceのクライアントを読み込まない
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "BaseFetcher": "embs.fetchers.base",
+        "Document": "embs.fetchers.base",
+        "ConfluenceFetcher": "embs.fetchers.confluence",
+        "MarkdownFetcher": "embs.fetchers.markdown",
+    },
+)
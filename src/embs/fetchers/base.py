@@ -1,9 +1,25 @@
 from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from dataclasses import dataclass
 from pathlib import Path
 
 
+@dataclass
+class Document:
+    """フェッチャーが返すMarkdown文書"""
+
+    id: str
+    name: str
+    text: str
+
+
 class BaseFetcher(ABC):
     @abstractmethod
     def fetch(self, out_dir: Path) -> list[Path]:
         """Markdownファイルのリストを返す"""
         ...
+
+    @abstractmethod
+    def iter_documents(self) -> Iterator[Document]:
+        """ファイルに書き出さずに文書を1件ずつ返す"""
+        ...
@@ -3,13 +3,14 @@ from __future__ import annotations
 import json
 import os
 import re
+from collections.abc import Iterator
 from dataclasses import dataclass, field
 from pathlib import Path
 
 from atlassian import Confluence
 from docling.document_converter import DocumentConverter
 
-from embs.fetchers.base import BaseFetcher
+from embs.fetchers.base import BaseFetcher, Document
 
 
 @dataclass
@@ -64,49 +65,47 @@ class ConfluenceFetcher(BaseFetcher):
         """設定ファイルに基づいて特定ページを取得する"""
         out_dir.mkdir(parents=True, exist_ok=True)
 
+        saved: list[Path] = []
+        for doc in self.iter_documents(config):
+            dest = out_dir / doc.name
+            dest.write_text(doc.text, encoding="utf-8")
+            saved.append(dest)
+
+        return saved
+
+    def iter_documents(self, config: ConfluenceConfig) -> Iterator[Document]:
+        """設定ファイルに基づいてページを取得し、Markdown文書として順に返す"""
         confluence = Confluence(url=self.url, token=self.token)
         converter = DocumentConverter()
 
-        saved: list[Path] = []
         for page_cfg in config.pages:
             page = confluence.get_page_by_id(
                 page_cfg.page_id, expand="body.storage"
             )
-            self._save_page(page, converter, out_dir, saved)
+            yield self._to_document(page, converter)
 
             if page_cfg.include_descendants:
-                self._fetch_descendants(
-                    confluence, converter, page_cfg.page_id, out_dir, saved
+                yield from self._iter_descendants(
+                    confluence, converter, page_cfg.page_id
                 )
 
-        return saved
-
-    def _fetch_descendants(
+    def _iter_descendants(
         self,
         confluence: Confluence,
         converter: DocumentConverter,
         page_id: str,
-        out_dir: Path,
-        saved: list[Path],
-    ) -> None:
+    ) -> Iterator[Document]:
         """子孫ページを再帰的に取得する"""
         children = confluence.get_page_child_by_type(
             page_id, type="page", expand="body.storage"
         )
         for child in children:
-            self._save_page(child, converter, out_dir, saved)
-            self._fetch_descendants(
-                confluence, converter, child["id"], out_dir, saved
-            )
+            yield self._to_document(child, converter)
+            yield from self._iter_descendants(confluence, converter, child["id"])
 
     @staticmethod
-    def _save_page(
-        page: dict,
-        converter: DocumentConverter,
-        out_dir: Path,
-        saved: list[Path],
-    ) -> None:
-        """ページをMarkdownに変換して保存する"""
+    def _to_document(page: dict, converter: DocumentConverter) -> Document:
+        """ページをMarkdownに変換する"""
         page_id = page["id"]
         title = page["title"]
         html_body = page["body"]["storage"]["value"]
@@ -115,6 +114,4 @@ class ConfluenceFetcher(BaseFetcher):
         md_text = result.document.export_to_markdown()
 
         filename = f"{page_id}_{_sanitize_filename(title)}.md"
-        dest = out_dir / filename
-        dest.write_text(md_text, encoding="utf-8")
-        saved.append(dest)
+        return Document(id=page_id, name=filename, text=md_text)
@@ -1,26 +1,206 @@
 from __future__ import annotations
 
+import fcntl
+import hashlib
+import json
+import os
 import shutil
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 
-from embs.fetchers.base import BaseFetcher
+from embs.fetchers.base import BaseFetcher, Document
+
+MANIFEST_NAME = ".embs-sync.json"
+STRATEGIES = ("copy", "hardlink", "reflink", "symlink")
+
+# linux/fs.h: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
+
+
+@dataclass
+class SyncResult:
+    """同期結果（出力先パスの差分）"""
+
+    added: list[Path] = field(default_factory=list)
+    changed: list[Path] = field(default_factory=list)
+    removed: list[Path] = field(default_factory=list)
+    unchanged: list[Path] = field(default_factory=list)
+
+    @property
+    def files(self) -> list[Path]:
+        """同期後に出力先に存在するファイル"""
+        return sorted(self.added + self.changed + self.unchanged)
+
+
+def _file_hash(path: Path) -> str:
+    """ファイル内容のSHA-256を計算する"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _reflink(src: Path, dest: Path) -> None:
+    """FICLONEでコピーオンライトの複製を作成する"""
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+    shutil.copystat(src, dest)
+
+
+def _materialize(src: Path, dest: Path, strategy: str) -> None:
+    """指定の戦略でsrcをdestに配置する
+
+    hardlink/reflinkが使えない場合（別デバイス、非対応FS）は通常のコピーにフォールバックする。
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    # 既存のリンク経由でソースを上書きしないよう、先に削除する
+    if dest.is_symlink() or dest.exists():
+        dest.unlink()
+
+    if strategy == "symlink":
+        os.symlink(src.resolve(), dest)
+        return
+    if strategy == "hardlink":
+        try:
+            os.link(src, dest)
+            return
+        except OSError:
+            pass
+    elif strategy == "reflink":
+        try:
+            _reflink(src, dest)
+            return
+        except OSError:
+            dest.unlink(missing_ok=True)
+    shutil.copy2(src, dest)
 
 
 class MarkdownFetcher(BaseFetcher):
     """ローカルディレクトリからMarkdownファイルを収集する"""
 
-    def __init__(self, source_dir: Path) -> None:
+    def __init__(
+        self,
+        source_dir: Path,
+        *,
+        strategy: str = "copy",
+        workers: int = 4,
+    ) -> None:
+        if strategy not in STRATEGIES:
+            raise ValueError(f"未対応の配置方法です: {strategy}")
         self.source_dir = Path(source_dir)
+        self.strategy = strategy
+        self.workers = workers
 
     def fetch(self, out_dir: Path) -> list[Path]:
+        return self.sync(out_dir, prune=False).files
+
+    def iter_documents(self) -> Iterator[Document]:
+        """ソースディレクトリの*.mdを相対パス順に読み込んで返す"""
+        for md_file in sorted(self.source_dir.rglob("*.md")):
+            relative = md_file.relative_to(self.source_dir).as_posix()
+            yield Document(
+                id=relative,
+                name=relative,
+                text=md_file.read_text(encoding="utf-8"),
+            )
+
+    def sync(self, out_dir: Path, *, prune: bool = True) -> SyncResult:
+        """差分のみを出力先に反映する
+
+        サイズ・mtimeが前回と一致するファイルはスキップし、不一致の場合はハッシュで
+        内容を比較する。prune=Trueなら前回のマニフェストに記録されていてソースから
+        消えたファイルを出力先から削除する（記録にないファイルは削除しない）。
+        """
         out_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = out_dir / MANIFEST_NAME
+        manifest = self._load_manifest(manifest_path)
+
+        sources = {
+            md_file.relative_to(self.source_dir).as_posix(): md_file
+            for md_file in self.source_dir.rglob("*.md")
+        }
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            outcomes = list(
+                pool.map(
+                    lambda item: self._sync_file(
+                        item[1], out_dir / item[0], manifest.get(item[0])
+                    ),
+                    sorted(sources.items()),
+                )
+            )
+
+        result = SyncResult()
+        new_manifest: dict[str, dict] = {}
+        for rel, (status, entry) in zip(sorted(sources), outcomes):
+            getattr(result, status).append(out_dir / rel)
+            new_manifest[rel] = entry
+
+        if prune:
+            # 消すのは前回までに自分が配置したファイルだけ。出力先に元からあった
+            # *.mdや他の手段で置かれたファイルには触れない
+            for rel in sorted(set(manifest) - set(sources)):
+                dest = out_dir / rel
+                if dest.is_symlink() or dest.exists():
+                    dest.unlink()
+                    result.removed.append(dest)
+                    self._remove_empty_parents(dest.parent, out_dir)
+        else:
+            # 削除しないファイルは次回のprune対象にできるよう記録を残す
+            for rel, entry in manifest.items():
+                if rel not in sources and (out_dir / rel).exists():
+                    new_manifest[rel] = entry
+
+        tmp = manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(new_manifest, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(manifest_path)
+
+        return result
+
+    def _sync_file(
+        self, src: Path, dest: Path, previous: dict | None
+    ) -> tuple[str, dict]:
+        """1ファイルを同期し、(状態, マニフェストエントリ) を返す"""
+        st = src.stat()
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        present = dest.exists()
+
+        if previous is None and present and not dest.is_symlink():
+            # マニフェストがない場合は既存ファイルそのものと比較する
+            dst = dest.stat()
+            previous = {"size": dst.st_size, "mtime_ns": dst.st_mtime_ns}
+
+        if present and previous is not None and previous["size"] == st.st_size:
+            if previous["mtime_ns"] == st.st_mtime_ns:
+                # リンク先の書き換えも検出できるよう、ハッシュは必ず記録しておく
+                if "sha256" not in previous:
+                    previous = {**previous, "sha256": _file_hash(src)}
+                return "unchanged", previous
+            entry["sha256"] = _file_hash(src)
+            known = previous.get("sha256") or (
+                None if dest.is_symlink() else _file_hash(dest)
+            )
+            if known == entry["sha256"]:
+                return "unchanged", entry
+        else:
+            entry["sha256"] = _file_hash(src)
+
+        _materialize(src, dest, self.strategy)
+        return ("changed" if present else "added"), entry
 
-        saved: list[Path] = []
-        for md_file in self.source_dir.rglob("*.md"):
-            relative = md_file.relative_to(self.source_dir)
-            dest = out_dir / relative
-            dest.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(md_file, dest)
-            saved.append(dest)
+    @staticmethod
+    def _load_manifest(path: Path) -> dict[str, dict]:
+        """前回の同期状態を読み込む"""
+        if not path.exists():
+            return {}
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return {}
 
-        return saved
+    @staticmethod
+    def _remove_empty_parents(directory: Path, root: Path) -> None:
+        """pruneで空になったディレクトリをroot直下まで遡って削除する"""
+        while directory != root and not any(directory.iterdir()):
+            directory.rmdir()
+            directory = directory.parent
@@ -1,5 +1,24 @@
-from embs.indexer.chunker import chunk_markdown
-from embs.indexer.embedder import Embedder
-from embs.indexer.store import VectorStore
+from __future__ import annotations
 
-__all__ = ["chunk_markdown", "Embedder", "VectorStore"]
+from typing import TYPE_CHECKING
+
+from embs._lazy import attach
+
+if TYPE_CHECKING:
+    from embs.indexer.chunker import chunk_markdown, chunk_text
+    from embs.indexer.embedder import Embedder
+    from embs.indexer.pipeline import backfill_space, index_documents
+    from embs.indexer.store import VectorStore
+
+# docling・torchを読み込むモジュールがあるため、使われた名前の定義元だけをimportする
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "chunk_markdown": "embs.indexer.chunker",
+        "chunk_text": "embs.indexer.chunker",
+        "Embedder": "embs.indexer.embedder",
+        "VectorStore": "embs.indexer.store",
+        "backfill_space": "embs.indexer.pipeline",
+        "index_documents": "embs.indexer.pipeline",
+    },
+)
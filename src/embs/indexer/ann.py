@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_M = 16
+DEFAULT_EF_CONSTRUCTION = 200
+DEFAULT_EF_SEARCH = 64
+
+
+def _import_hnswlib():
+    try:
+        import hnswlib
+    except ImportError as e:
+        raise ImportError(
+            "近似最近傍インデックスにはhnswlibが必要です: pip install 'embs[ann]'"
+        ) from e
+    return hnswlib
+
+
+class HnswIndex:
+    """hnswlibによるHNSW近似最近傍インデックス
+
+    DBと同じ場所の``<db>.hnsw``に保存する。ラベルにはchunks.idをそのまま使い、
+    削除はmark_deletedで反映する。ef_searchを大きくするほど再現率が上がり遅くなる。
+    hnswlibは削除済みの件数を返さないので、deletedに数えておく（ファイルには
+    含まれないため、読み込むときは保存時の値を渡す）。削除したラベルを追加し直すと
+    実際より多めになるが、検索件数を控えめに見積もるだけで結果は正しい。
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        dim: int,
+        *,
+        m: int = DEFAULT_M,
+        ef_construction: int = DEFAULT_EF_CONSTRUCTION,
+        deleted: int = 0,
+    ) -> None:
+        hnswlib = _import_hnswlib()
+        db_path = Path(db_path)
+        self.path = db_path.with_name(db_path.name + ".hnsw")
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        self._dirty = False
+        self.deleted = deleted
+
+        # 読み込む前に調べておく（読む間に置き換えられたら、次のstale()で読み直させる）
+        self._file_state = _file_state(self.path)
+        if self.path.exists():
+            self.index.load_index(str(self.path))
+        else:
+            self.index.init_index(
+                max_elements=1024, M=m, ef_construction=ef_construction
+            )
+
+    def add(self, rowids: list[int], embeddings: np.ndarray) -> None:
+        """ベクトルを追加する（容量が足りなければ倍々で拡張する）"""
+        if not rowids:
+            return
+        needed = self.index.element_count + len(rowids)
+        capacity = self.index.get_max_elements()
+        if needed > capacity:
+            while capacity < needed:
+                capacity *= 2
+            self.index.resize_index(capacity)
+        self.index.add_items(np.asarray(embeddings, dtype=np.float32), rowids)
+        self._dirty = True
+
+    def remove(self, rowids: Iterable[int]) -> None:
+        """ベクトルを削除済みにする"""
+        for rowid in rowids:
+            try:
+                self.index.mark_deleted(rowid)
+                self.deleted += 1
+                self._dirty = True
+            except RuntimeError:
+                # 未登録または削除済み
+                pass
+
+    def search(
+        self, query_embedding: np.ndarray, top_k: int, ef_search: int | None = None
+    ) -> list[tuple[int, float]]:
+        """近似上位k件を (rowid, L2距離) で返す
+
+        kは削除済みを除いた件数までに抑える（hnswlibはk件そろわないとエラーにする）。
+        """
+        k = min(top_k, self.live_count)
+        if k <= 0:
+            return []
+        self.index.set_ef(max(ef_search or DEFAULT_EF_SEARCH, k))
+        labels, distances = self.index.knn_query(
+            np.asarray(query_embedding, dtype=np.float32), k=k
+        )
+
+        # space="ip"の距離は 1 - cos なので、L2距離 sqrt(2 - 2cos) に換算する
+        return [
+            (int(label), float(np.sqrt(max(2.0 * d, 0.0))))
+            for label, d in zip(labels[0], distances[0])
+        ]
+
+    @property
+    def live_count(self) -> int:
+        """削除済みを除いた件数（deletedが多めなら少なめになる）"""
+        return max(self.index.element_count - self.deleted, 0)
+
+    def stale(self) -> bool:
+        """読み込んだ（保存した）後に、ファイルが他のプロセスに置き換えられたか"""
+        return _file_state(self.path) != self._file_state
+
+    @property
+    def dirty(self) -> bool:
+        """保存していない変更があるか"""
+        return self._dirty
+
+    def save(self) -> None:
+        # 検索中の他プロセスが書きかけのファイルを読まないよう、別名に書いてから差し替える
+        if self._dirty:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            self.index.save_index(str(tmp))
+            os.replace(tmp, self.path)
+            self._file_state = _file_state(self.path)
+            self._dirty = False
+
+
+def _file_state(path: Path) -> tuple[int, int, int, int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
@@ -1,30 +1,193 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import re
+from collections.abc import Callable
+from dataclasses import dataclass, field
 from pathlib import Path
 
+from docling.datamodel.base_models import InputFormat
 from docling.document_converter import DocumentConverter
 from docling_core.transforms.chunker.hierarchical_chunker import HierarchicalChunker
 
+from embs.profiling import span
+
+
+# GLuCoSE-base-ja-v2・japanese-reranker-cross-encoder-large-v1はどちらも512トークンまで。
+# rerankerはクエリと連結して入力するため、クエリと特殊トークンの分を残す
+DEFAULT_TARGET_TOKENS = 256
+DEFAULT_MAX_TOKENS = 448
+DEFAULT_OVERLAP_TOKENS = 32
+HEADING_SEPARATOR = " > "
+
+_TOKEN = re.compile(r"[A-Za-z0-9]+|[^\sA-Za-z0-9]")
+_SENTENCE_END = re.compile(r"(?<=[。．！？!?\n])")
+
 
 @dataclass
 class Chunk:
     text: str
     source_file: str
     chunk_index: int
+    headings: list[str] = field(default_factory=list)
+
+
+def approx_tokens(text: str) -> int:
+    """トークン数の概算（英数字の連なりを1、それ以外の文字を1文字1トークンと数える）"""
+    return len(_TOKEN.findall(text))
+
+
+@dataclass
+class ChunkSizing:
+    """チャンクのトークン数の調整方法
+
+    同じ見出しの下で隣り合う小さなチャンクをtarget_tokensまで結合し、
+    見出しパスを含めてmax_tokensを超えるチャンクはoverlap_tokensずつ重ねて分割する。
+    見出しパスは本文の分を残すためmax_tokensの半分までとし、長ければ上位の見出しから省く。
+    count_tokensにモデルのトークナイザを渡すと正確に数えられる。
+    """
+
+    target_tokens: int = DEFAULT_TARGET_TOKENS
+    max_tokens: int = DEFAULT_MAX_TOKENS
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS
+    count_tokens: Callable[[str], int] = approx_tokens
+    with_headings: bool = True
 
 
 def chunk_markdown(path: Path) -> list[Chunk]:
     """Markdownファイルをチャンクに分割する"""
-    converter = DocumentConverter()
-    result = converter.convert(str(path))
-    doc = result.document
+    with span("docling.convert", documents=1) as s:
+        converter = DocumentConverter()
+        result = converter.convert(str(path))
+    if s:
+        s.add(bytes=path.stat().st_size)
+    return _chunk_document(result.document, path.name)
+
+
+def chunk_text(text: str, source_file: str) -> list[Chunk]:
+    """ファイルを介さずにMarkdown文字列をチャンクに分割する"""
+    with span("docling.convert", documents=1) as s:
+        converter = DocumentConverter()
+        result = converter.convert_string(text, format=InputFormat.MD, name=source_file)
+    if s:
+        s.add(bytes=len(text.encode("utf-8")))
+    return _chunk_document(result.document, source_file)
 
-    chunker = HierarchicalChunker()
-    chunks: list[Chunk] = []
-    for i, chunk in enumerate(chunker.chunk(doc)):
-        text = chunk.text
-        if text.strip():
-            chunks.append(Chunk(text=text, source_file=path.name, chunk_index=i))
+
+def _chunk_document(doc, source_file: str) -> list[Chunk]:
+    """doclingのドキュメントを階層チャンキングする"""
+    with span("chunk") as s:
+        chunker = HierarchicalChunker()
+        chunks: list[Chunk] = []
+        for i, chunk in enumerate(chunker.chunk(doc)):
+            text = chunk.text
+            if text.strip():
+                chunks.append(
+                    Chunk(
+                        text=text,
+                        source_file=source_file,
+                        chunk_index=i,
+                        headings=list(chunk.meta.headings or []),
+                    )
+                )
+    s.add(items=len(chunks))
 
     return chunks
+
+
+def resize_chunks(chunks: list[Chunk], sizing: ChunkSizing) -> list[Chunk]:
+    """チャンクを結合・分割してトークン数を揃え、見出しパスを本文の前に付ける
+
+    chunk_indexは結果の順に0から振り直す。
+    """
+    with span("chunk.resize", items=len(chunks)) as s:
+        count = sizing.count_tokens
+        merged: list[Chunk] = []
+        merged_tokens: list[int] = []
+        for chunk in chunks:
+            tokens = count(chunk.text)
+            prev = merged[-1] if merged else None
+            if prev is not None and (prev.headings, prev.source_file) == (
+                chunk.headings,
+                chunk.source_file,
+            ):
+                joined = prev.text + "\n" + chunk.text
+                joined_tokens = count(joined)
+                if joined_tokens <= sizing.target_tokens:
+                    merged[-1] = Chunk(joined, chunk.source_file, 0, chunk.headings)
+                    merged_tokens[-1] = joined_tokens
+                    continue
+            merged.append(chunk)
+            merged_tokens.append(tokens)
+
+        resized: list[Chunk] = []
+        for chunk, tokens in zip(merged, merged_tokens):
+            prefix = ""
+            if sizing.with_headings and chunk.headings:
+                prefix = _heading_prefix(chunk.headings, sizing.max_tokens // 2, count)
+            budget = sizing.max_tokens - count(prefix)
+            bodies = [chunk.text] if tokens <= budget else _split_text(
+                chunk.text, budget, sizing.overlap_tokens, count
+            )
+            for body in bodies:
+                resized.append(
+                    Chunk(prefix + body, chunk.source_file, len(resized), chunk.headings)
+                )
+    s.add(chunks=len(resized))
+    return resized
+
+
+def _heading_prefix(headings: list[str], limit: int, count: Callable[[str], int]) -> str:
+    """見出しパスの接頭辞。limitトークンを超える場合は上位の見出しから省く"""
+    for start in range(len(headings)):
+        prefix = HEADING_SEPARATOR.join(headings[start:]) + "\n"
+        if count(prefix) <= limit:
+            return prefix
+    return ""
+
+
+def _split_text(
+    text: str, budget: int, overlap: int, count: Callable[[str], int]
+) -> list[str]:
+    """文の区切りでbudgetトークン以下に分割し、前の窓の末尾overlapトークン分を重ねる"""
+    pieces = [
+        piece
+        for sentence in _SENTENCE_END.split(text)
+        if sentence.strip()
+        for piece in _hard_split(sentence, budget, count)
+    ]
+
+    windows: list[str] = []
+    current: list[str] = []
+    for piece in pieces:
+        if current and count("".join([*current, piece])) > budget:
+            windows.append("".join(current).strip())
+            tail: list[str] = []
+            for prev in reversed(current):
+                if count("".join([prev, *tail])) > overlap:
+                    break
+                tail.insert(0, prev)
+            current = tail
+            while current and count("".join([*current, piece])) > budget:
+                current.pop(0)
+        current.append(piece)
+    if current:
+        windows.append("".join(current).strip())
+    return windows
+
+
+def _hard_split(text: str, budget: int, count: Callable[[str], int]) -> list[str]:
+    """区切りのない長い文を、budgetトークンに収まる最長の先頭部分ずつに切る"""
+    parts = []
+    while count(text) > budget:
+        lo, hi = 1, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if count(text[:mid]) <= budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        parts.append(text[:lo])
+        text = text[lo:]
+    if text:
+        parts.append(text)
+    return parts
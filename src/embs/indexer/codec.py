@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+DEFAULT_LEVEL = 3
+DEFAULT_DICT_SIZE = 64 * 1024
+# 辞書学習に使うサンプル数の上限
+MAX_SAMPLES = 10_000
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "チャンクテキストの圧縮にはzstandardが必要です: pip install 'embs[compress]'"
+        ) from e
+    return zstandard
+
+
+class TextCodec:
+    """chunks.textのzstd圧縮（学習済み辞書つき）
+
+    チャンクは数百バイト程度と短いため、1行ずつ圧縮しても効くよう
+    コーパスから学習した辞書を使う。フレームには辞書IDやチェックサムを書かない。
+    """
+
+    def __init__(self, dictionary: bytes | None = None, level: int = DEFAULT_LEVEL) -> None:
+        zstandard = _import_zstandard()
+        self.dictionary = dictionary
+        self.level = level
+
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        self._compressor = zstandard.ZstdCompressor(
+            level=level,
+            dict_data=dict_data,
+            write_dict_id=False,
+            write_checksum=False,
+        )
+        self._decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+
+    @classmethod
+    def train(
+        cls,
+        samples: list[str],
+        *,
+        dict_size: int = DEFAULT_DICT_SIZE,
+        level: int = DEFAULT_LEVEL,
+    ) -> TextCodec:
+        """サンプルから辞書を学習する（サンプルが少なすぎる場合は辞書なし）"""
+        zstandard = _import_zstandard()
+        encoded = [s.encode("utf-8") for s in samples[:MAX_SAMPLES]]
+        try:
+            dictionary = zstandard.train_dictionary(dict_size, encoded).as_bytes()
+        except zstandard.ZstdError:
+            dictionary = None
+        return cls(dictionary, level=level)
+
+    def compress(self, text: str) -> bytes:
+        return self._compressor.compress(text.encode("utf-8"))
+
+    def decompress(self, value: str | bytes) -> str:
+        """圧縮済みならテキストに戻す（未圧縮の行はそのまま返す）"""
+        if isinstance(value, str):
+            return value
+        return self._decompressor.decompress(value).decode("utf-8")
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+from embs.indexer.store import EMBEDDING_DIM, RowBatch, VectorStore
+
+FORMAT_VERSION = "1"
+_SPACE_PREFIX = "space__"
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "インデックスのエクスポート・インポートにはpyarrowが必要です: "
+            "pip install 'embs[arrow]'"
+        ) from e
+    return pyarrow, pyarrow.parquet
+
+
+def export_index(store: VectorStore, path: Path, *, batch_size: int = 4096) -> int:
+    """インデックスをParquetに書き出す
+
+    embeddingはfloat32の固定長リスト列として保存し、metadataと埋め込み空間の定義は
+    スキーマのメタデータに入れる。名前付き空間のベクトルは ``space__<name>`` 列
+    （未作成の行はnull）、重複として省いた出現位置は ``duplicates`` 列になる。
+    書き出したチャンク数を返す。
+    """
+    pa, pq = _import_pyarrow()
+
+    metadata = store.get_metadata()
+    spaces = store.list_spaces()
+    dim = int(metadata.get("embedding_dim", EMBEDDING_DIM))
+
+    fields = [
+        pa.field("id", pa.int64(), nullable=False),
+        pa.field("source_file", pa.string(), nullable=False),
+        pa.field("chunk_index", pa.int64(), nullable=False),
+        pa.field("text", pa.string(), nullable=False),
+        pa.field("embedding", pa.list_(pa.float32(), dim), nullable=False),
+        pa.field("duplicates", _duplicates_type(pa)),
+    ]
+    for space in spaces:
+        fields.append(
+            pa.field(_SPACE_PREFIX + space["name"], pa.list_(pa.float32(), space["dim"]))
+        )
+    schema = pa.schema(
+        fields,
+        metadata={
+            "embs.format": FORMAT_VERSION,
+            "embs.metadata": json.dumps(metadata, ensure_ascii=False),
+            "embs.spaces": json.dumps(
+                [{k: s[k] for k in ("name", "model_name", "dim")} for s in spaces],
+                ensure_ascii=False,
+            ),
+        },
+    )
+
+    total = 0
+    with pq.ParquetWriter(str(path), schema) as writer:
+        for batch in store.iter_rows(batch_size):
+            columns = [
+                pa.array(batch.ids, type=pa.int64()),
+                pa.array(batch.source_files, type=pa.string()),
+                pa.array(batch.chunk_indexes, type=pa.int64()),
+                pa.array(batch.texts, type=pa.string()),
+                _fixed_size_list(pa, np.asarray(batch.embeddings, dtype=np.float32), dim),
+                _duplicates_array(pa, store, batch.ids),
+            ]
+            for space in spaces:
+                vectors = store.get_space_vectors(space["name"], batch.ids)
+                values = np.zeros((len(batch.ids), space["dim"]), dtype=np.float32)
+                missing = np.ones(len(batch.ids), dtype=bool)
+                for i, rowid in enumerate(batch.ids.tolist()):
+                    if rowid in vectors:
+                        values[i] = vectors[rowid]
+                        missing[i] = False
+                columns.append(_fixed_size_list(pa, values, space["dim"], missing))
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            total += len(batch.ids)
+
+    return total
+
+
+def import_index(path: Path, db_path: Path, *, batch_size: int = 4096) -> int:
+    """Parquetからインデックスを新規DBとして復元する
+
+    embeddingはArrowのバッファをそのままnumpyとして参照し、idはそのまま保つ。
+    元のDBにANNインデックスがあれば作り直す。読み込んだチャンク数を返す。
+    """
+    _, pq = _import_pyarrow()
+
+    db_path = Path(db_path)
+    if db_path.exists():
+        raise FileExistsError(f"出力先のDBが既に存在します: {db_path}")
+
+    parquet = pq.ParquetFile(str(path))
+    schema = parquet.schema_arrow
+    schema_meta = schema.metadata or {}
+    if schema_meta.get(b"embs.format") != FORMAT_VERSION.encode():
+        raise ValueError(f"embsのエクスポート形式ではありません: {path}")
+    metadata = json.loads(schema_meta[b"embs.metadata"])
+    spaces = json.loads(schema_meta[b"embs.spaces"])
+    dim = schema.field("embedding").type.list_size
+
+    store = VectorStore(db_path, backend=metadata.get("vector_backend"))
+    try:
+        store.create_tables(model_name=metadata["model_name"], dim=dim)
+        store.restore_metadata(metadata)
+        for space in spaces:
+            store.add_space(space["name"], model_name=space["model_name"], dim=space["dim"])
+
+        total = 0
+        for record_batch in parquet.iter_batches(batch_size=batch_size):
+            ids = record_batch.column("id").to_numpy()
+            total += store.load_rows(
+                RowBatch(
+                    ids=ids,
+                    source_files=record_batch.column("source_file").to_pylist(),
+                    chunk_indexes=record_batch.column("chunk_index").to_pylist(),
+                    texts=record_batch.column("text").to_pylist(),
+                    embeddings=_to_matrix(record_batch.column("embedding"), dim),
+                )
+            )
+            if "duplicates" in record_batch.schema.names:
+                store.add_duplicates(
+                    (chunk_id, loc["source_file"], loc["chunk_index"])
+                    for chunk_id, locs in zip(
+                        ids.tolist(), record_batch.column("duplicates").to_pylist()
+                    )
+                    for loc in locs or ()
+                )
+            for space in spaces:
+                column = record_batch.column(_SPACE_PREFIX + space["name"])
+                vectors = _to_matrix(column, space["dim"])
+                valid = column.is_valid().to_numpy(zero_copy_only=False)
+                store.insert_space_vectors(
+                    space["name"], zip(ids[valid].tolist(), vectors[valid])
+                )
+
+        if metadata.get("ann_index") == "hnsw":
+            store.build_ann()
+    finally:
+        store.close()
+
+    return total
+
+
+def _duplicates_type(pa):
+    return pa.list_(
+        pa.struct([("source_file", pa.string()), ("chunk_index", pa.int64())])
+    )
+
+
+def _duplicates_array(pa, store: VectorStore, ids: np.ndarray):
+    locations = store.get_duplicates(ids.tolist())
+    return pa.array(
+        [
+            [
+                {"source_file": source_file, "chunk_index": chunk_index}
+                for source_file, chunk_index in locations.get(rowid, ())
+            ]
+            for rowid in ids.tolist()
+        ],
+        type=_duplicates_type(pa),
+    )
+
+
+def _fixed_size_list(pa, matrix: np.ndarray, dim: int, mask: np.ndarray | None = None):
+    """(n, dim)のfloat32行列をコピーせずに固定長リスト配列にする"""
+    values = pa.array(np.ascontiguousarray(matrix).reshape(-1), type=pa.float32())
+    if mask is None or not mask.any():
+        return pa.FixedSizeListArray.from_arrays(values, dim)
+    return pa.FixedSizeListArray.from_arrays(values, dim, mask=pa.array(mask))
+
+
+def _to_matrix(column, dim: int) -> np.ndarray:
+    """固定長リスト配列の値バッファを (n, dim) の行列として参照する
+
+    nullを含まなければコピーせずに参照する（null行の値は0で埋める）。
+    """
+    values = column.values.slice(column.offset * dim, len(column) * dim)
+    if values.null_count:
+        values = values.fill_null(0.0)
+    return values.to_numpy(zero_copy_only=False).reshape(-1, dim)
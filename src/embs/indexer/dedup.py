@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import hashlib
+import zlib
+from collections import defaultdict
+from collections.abc import Iterable
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_NGRAM = 5
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 16
+
+# 2^31 - 1（メルセンヌ素数）。a * x がuint64に収まるよう、値はこれ未満にする
+_PRIME = np.uint64((1 << 31) - 1)
+
+
+class Deduplicator:
+    """文字n-gramのMinHash/LSHによる重複チャンク検出
+
+    完全一致は正規化したテキストのハッシュで、近似重複はLSHで候補を絞ってから
+    MinHashの一致率（Jaccard係数の推定値）がthreshold以上かで判定する。
+    判定対象はadd()で登録したチャンクのみで、状態はメモリ上に持つ。
+    """
+
+    def __init__(
+        self,
+        *,
+        threshold: float = DEFAULT_THRESHOLD,
+        ngram: int = DEFAULT_NGRAM,
+        num_perm: int = DEFAULT_NUM_PERM,
+        bands: int = DEFAULT_BANDS,
+        seed: int = 0,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_permはbandsで割り切れる必要があります")
+        self.threshold = threshold
+        self.ngram = ngram
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+
+        self._exact: dict[bytes, int] = {}
+        self._buckets: dict[tuple[int, bytes], list[int]] = defaultdict(list)
+        self._signatures: dict[int, np.ndarray] = {}
+
+    def match(self, text: str) -> int | None:
+        """登録済みの重複チャンクがあればそのidを返す"""
+        key = self._exact_key(text)
+        if key in self._exact:
+            return self._exact[key]
+
+        signature = self._signature(text)
+        best_id, best_score = None, self.threshold
+        for band, bucket_key in enumerate(self._band_keys(signature)):
+            for candidate in self._buckets.get((band, bucket_key), ()):
+                score = float(np.mean(self._signatures[candidate] == signature))
+                if score >= best_score:
+                    best_id, best_score = candidate, score
+        return best_id
+
+    def add(self, chunk_id: int, text: str) -> None:
+        """重複判定の対象としてチャンクを登録する"""
+        self._exact.setdefault(self._exact_key(text), chunk_id)
+        signature = self._signature(text)
+        self._signatures[chunk_id] = signature
+        for band, bucket_key in enumerate(self._band_keys(signature)):
+            self._buckets[(band, bucket_key)].append(chunk_id)
+
+    def remove(self, chunk_ids: Iterable[int]) -> None:
+        """削除されたチャンクを判定の対象から外す"""
+        removed = {i for i in chunk_ids if i in self._signatures}
+        if not removed:
+            return
+        for chunk_id in removed:
+            signature = self._signatures.pop(chunk_id)
+            for band, bucket_key in enumerate(self._band_keys(signature)):
+                bucket = self._buckets[(band, bucket_key)]
+                bucket.remove(chunk_id)
+                if not bucket:
+                    del self._buckets[(band, bucket_key)]
+        self._exact = {k: v for k, v in self._exact.items() if v not in removed}
+
+    @staticmethod
+    def _exact_key(text: str) -> bytes:
+        normalized = " ".join(text.split())
+        return hashlib.sha1(normalized.encode("utf-8")).digest()
+
+    def _shingles(self, text: str) -> np.ndarray:
+        normalized = " ".join(text.split())
+        n = self.ngram
+        grams = {normalized[i : i + n] for i in range(max(len(normalized) - n + 1, 1))}
+        return np.fromiter(
+            (zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)
+        ) % _PRIME
+
+    def _signature(self, text: str) -> np.ndarray:
+        shingles = self._shingles(text)
+        hashed = (self._a[:, None] * shingles[None, :] + self._b[:, None]) % _PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [
+            signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
@@ -1,18 +1,95 @@
 from __future__ import annotations
 
+from pathlib import Path
+
 import numpy as np
 from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer
+
+from embs.metrics import STAGE_ITEMS, STAGE_SECONDS, model_load
+from embs.models import resolve_model
+from embs.profiling import span
 
 MODEL_NAME = "pkshatech/GLuCoSE-base-ja-v2"
 
 
 class Embedder:
-    """GLuCoSE-base-ja-v2によるembedding生成"""
+    """GLuCoSE-base-ja-v2によるembedding生成
+
+    workersが2以上なら、コアを分けて固定したワーカープロセスでバッチを分担して
+    計算する（threads_per_workerは各ワーカーのtorchスレッド数。省略時は使える
+    コア数をワーカー数で割った値）。このときモデルはワーカーだけが読み込み、
+    親プロセスはトークン数を数えるためのトークナイザだけを持つ。
+    使い終わったらclose()を呼ぶ。
+    model_dir（または環境変数EMBS_MODEL_DIR・設定ファイル）を指定すると、
+    Hubへ問い合わせずにそのディレクトリのスナップショットから読み込む。
+    """
 
-    def __init__(self, model_name: str = MODEL_NAME) -> None:
+    def __init__(
+        self,
+        model_name: str = MODEL_NAME,
+        *,
+        workers: int = 0,
+        threads_per_worker: int | None = None,
+        model_dir: Path | None = None,
+    ) -> None:
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
+        source, local = resolve_model(model_name, model_dir)
+        self.model = None
+        self._pool = None
+        with span("model.load"), model_load(model_name):
+            if workers > 1:
+                from embs.indexer.parallel import EmbeddingPool
+
+                self._pool = EmbeddingPool(source, workers, threads_per_worker=threads_per_worker)
+                self.tokenizer = AutoTokenizer.from_pretrained(source, local_files_only=local)
+            else:
+                if local:
+                    self.model = SentenceTransformer(source, local_files_only=True)
+                else:
+                    self.model = SentenceTransformer(source)
+                self.tokenizer = self.model.tokenizer
+
+    @property
+    def dim(self) -> int:
+        """embeddingの次元数"""
+        if self._pool is not None:
+            return self._pool.dim
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def max_seq_length(self) -> int | None:
+        """モデルが受け付ける最大トークン数（特殊トークンを含む）"""
+        if self._pool is not None:
+            return self._pool.max_seq_length
+        return self.model.max_seq_length
+
+    def token_count(self, text: str) -> int:
+        """特殊トークンを除いたトークン数"""
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
 
     def embed(self, texts: list[str]) -> np.ndarray:
         """テキストのリストをembeddingに変換する"""
-        return self.model.encode(texts, normalize_embeddings=True)
+        with span("embed", items=len(texts)) as s, STAGE_SECONDS.time(stage="embed"):
+            if self._pool is not None:
+                embeddings = self._pool.encode(texts)
+            else:
+                embeddings = self.model.encode(texts, normalize_embeddings=True)
+        STAGE_ITEMS.inc(len(texts), stage="embed")
+        if s:
+            s.add(tokens=count_tokens(self.tokenizer, texts))
+        return embeddings
+
+    def close(self) -> None:
+        """ワーカープロセスを終了する（単一プロセスなら何もしない）"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+
+def count_tokens(tokenizer, texts: list[str]) -> int:
+    """トークナイザでのトークン数の合計（計測用。数えられなければ0）"""
+    try:
+        return sum(len(ids) for ids in tokenizer(list(texts))["input_ids"])
+    except Exception:
+        return 0
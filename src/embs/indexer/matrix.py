@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+
+# ログの行数がこれと基本ファイルの行数の1/4の大きい方を超えたら、基本ファイルに畳み込む
+COMPACT_MIN_RECORDS = 4096
+# 開く間に基本ファイルが置き換えられたとき、読み直す回数の上限
+LOAD_ATTEMPTS = 5
+
+
+class MatrixIndex:
+    """正規化済みembeddingを1つの連続した行列に保持する総当たり検索インデックス
+
+    chunks.idの配列とベクトル行列は``<db>.vectors.npy``の1ファイルにまとめて保存し
+    （置き換え1回で両方が入れ替わる）、開くときはnp.loadのmmap_modeでマップする
+    だけなので読み込みコストはほぼかからない。
+    追加・削除はメモリ上で即座に反映し、flush()で``<db>.vectors.log``に追記する
+    （行数はベクトル数に比例せず、追記した分だけ書く）。ログは (rowid, ベクトル) の
+    固定長レコードの並びで、削除は負のrowidの墓標として記録する。開くときはログも
+    マップし、基本ファイルの上に重ねる。ログが大きくなったらcompact()で基本ファイルを
+    書き直してログを消す。
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        db_path = Path(db_path)
+        self.vectors_path = db_path.with_name(db_path.name + ".vectors.npy")
+        self.log_path = db_path.with_name(db_path.name + ".vectors.log")
+
+        # 基本ファイルとログの (rowid配列, ベクトル行列, まだ有効な行)。
+        # 削除・上書きされた行は有効な行から外す
+        self._segments: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        # 開いた後に追加した分。rowid -> ベクトル
+        self._tail: dict[int, np.ndarray] = {}
+        self._tail_arrays: tuple[np.ndarray, np.ndarray] | None = None
+        self._log_records = 0
+        # flush()でログに追記する操作（削除はベクトルがNone）
+        self._pending: list[tuple[int, np.ndarray | None]] = []
+        # 読み込んだ時点の (基本ファイル, ログ) の状態
+        self._file_states: tuple = (None, None)
+        self._load()
+
+    def __len__(self) -> int:
+        return sum(int(alive.sum()) for _, _, alive in self._segments) + len(self._tail)
+
+    def add(self, rowid: int, embedding: np.ndarray) -> None:
+        """ベクトルを追加する（flush()まではファイルに反映されない）"""
+        op = (int(rowid), np.asarray(embedding, dtype=np.float32))
+        self._pending.append(op)
+        self._apply([op])
+
+    def remove(self, rowids: Iterable[int]) -> None:
+        """ベクトルを削除する（flush()まではファイルに反映されない）"""
+        ops = [(int(rowid), None) for rowid in rowids]
+        self._pending.extend(ops)
+        self._apply(ops)
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """(rowid配列, ベクトル行列) を返す"""
+        parts = [
+            (ids[alive], np.asarray(vectors)[alive]) for ids, vectors, alive in self._segments
+        ]
+        parts.append(self._tail_matrix())
+        parts = [(ids, vectors) for ids, vectors in parts if len(ids)]
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        return (
+            np.concatenate([ids for ids, _ in parts]),
+            np.concatenate([vectors for _, vectors in parts]),
+        )
+
+    def search(self, query_embedding: np.ndarray, top_k: int) -> list[tuple[int, float]]:
+        """内積の上位k件を (rowid, L2距離) で返す
+
+        正規化済みベクトル同士なので距離は sqrt(2 - 2cos) となり、sqlite-vecの
+        デフォルト距離と同じ順序・値になる。
+        """
+        if len(self) == 0 or top_k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        ids_parts, score_parts = [], []
+        for ids, vectors, alive in self._segments:
+            if not len(ids):
+                continue
+            scores = vectors @ query
+            if not alive.all():
+                ids, scores = ids[alive], scores[alive]
+            ids_parts.append(ids)
+            score_parts.append(scores)
+        tail_ids, tail_vectors = self._tail_matrix()
+        if len(tail_ids):
+            ids_parts.append(tail_ids)
+            score_parts.append(tail_vectors @ query)
+        ids = np.concatenate(ids_parts)
+        scores = np.concatenate(score_parts)
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        distances = np.sqrt(np.maximum(2.0 - 2.0 * scores[top], 0.0))
+        return [(int(ids[i]), float(d)) for i, d in zip(top, distances)]
+
+    def flush(self) -> None:
+        """溜まった追加・削除をログに追記する。ログが大きくなっていればcompact()する"""
+        if not self._pending:
+            return
+        dim = self._dim()
+        if dim is None:
+            # ベクトルが1つもない状態での削除だけなので、記録するものがない
+            self._pending.clear()
+            return
+
+        records = np.zeros(len(self._pending), dtype=_record_dtype(dim))
+        for i, (rowid, vector) in enumerate(self._pending):
+            if vector is None:
+                records[i]["id"] = -rowid
+            else:
+                records[i]["id"] = rowid
+                records[i]["vector"] = vector
+        with open(self.log_path, "ab") as f:
+            size = f.tell()
+            if size == 0:
+                f.write(np.int64(dim).tobytes())
+            elif (size - 8) % records.itemsize:
+                # 書き込み途中で止まったときの半端なレコードを切り捨ててから続ける
+                f.truncate(size - (size - 8) % records.itemsize)
+                f.seek(0, os.SEEK_END)
+            f.write(records.tobytes())
+        self._log_records += len(records)
+        self._pending.clear()
+        self._file_states = (self._file_states[0], _file_state(self.log_path))
+
+        base_rows = len(self._segments[0][0]) if self._segments else 0
+        if self._log_records > max(COMPACT_MIN_RECORDS, base_rows // 4):
+            self.compact()
+
+    def compact(self) -> None:
+        """ログを畳み込んで基本ファイルを書き直し、ログを消して再マップする"""
+        self.flush()
+        if self._log_records == 0:
+            return
+        dim = self._dim()
+        ids, vectors = self.arrays()
+        base = np.zeros((), dtype=_base_dtype(len(ids), dim))
+        base["ids"] = ids
+        base["vectors"] = vectors.reshape(len(ids), dim)
+        # rowidとベクトルを1つのファイルの置き換えで同時に差し替え、ログはその後に消す。
+        # 間に開いたプロセスは新しい基本ファイルに古いログを重ねて読むが、ログの適用は
+        # 冪等なので同じ内容になる。古い基本ファイルを読んでいる間に置き換えられた
+        # 場合は、_load()が基本ファイルから読み直す
+        self._segments = []
+        self._atomic_save(self.vectors_path, base)
+        self.log_path.unlink(missing_ok=True)
+        self._load()
+
+    def stale(self) -> bool:
+        """読み込んだ（書き出した）後に、基本ファイルかログが他のプロセスに書き換えられたか"""
+        return (_file_state(self.vectors_path), _file_state(self.log_path)) != self._file_states
+
+    def _apply(self, ops: list[tuple[int, np.ndarray | None]]) -> None:
+        if not ops:
+            return
+        for rowid, vector in ops:
+            self._tail.pop(rowid, None)
+            if vector is not None:
+                self._tail[rowid] = vector
+        touched = np.fromiter((rowid for rowid, _ in ops), dtype=np.int64, count=len(ops))
+        for ids, _, alive in self._segments:
+            if len(ids):
+                alive &= ~np.isin(ids, touched)
+        self._tail_arrays = None
+
+    def _tail_matrix(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._tail_arrays is None:
+            ids = np.fromiter(self._tail, dtype=np.int64, count=len(self._tail))
+            vectors = (
+                np.stack(list(self._tail.values()))
+                if self._tail
+                else np.empty((0, 0), dtype=np.float32)
+            )
+            self._tail_arrays = (ids, vectors)
+        return self._tail_arrays
+
+    def _dim(self) -> int | None:
+        for _, vectors, _ in self._segments:
+            return int(vectors.shape[1])
+        if self.log_path.exists() and self.log_path.stat().st_size >= 8:
+            with open(self.log_path, "rb") as f:
+                return int(np.frombuffer(f.read(8), dtype=np.int64)[0])
+        for _, vector in self._pending:
+            if vector is not None:
+                return len(vector)
+        return None
+
+    def _load(self) -> None:
+        """基本ファイルとログを読み込む
+
+        読んでいる間にcompact()で基本ファイルが置き換えられると、古い基本ファイルに
+        新しい（置き換え後の）ログを重ねてしまうので、基本ファイルが読む前と同じか
+        確かめ、違えば読み直す。
+        """
+        for _ in range(LOAD_ATTEMPTS):
+            before = (_file_state(self.vectors_path), _file_state(self.log_path))
+            self._load_files()
+            if _file_state(self.vectors_path) == before[0]:
+                self._file_states = before
+                return
+        raise RuntimeError(f"書き換えが続いているため読み込めませんでした: {self.vectors_path}")
+
+    def _load_files(self) -> None:
+        self._segments = []
+        self._tail = {}
+        self._tail_arrays = None
+        self._log_records = 0
+
+        try:
+            base = np.load(self.vectors_path, mmap_mode="r")
+        except FileNotFoundError:
+            base = None
+        if base is not None:
+            ids = base["ids"]
+            self._segments.append((ids, base["vectors"], np.ones(len(ids), dtype=bool)))
+
+        records = self._map_log()
+        if records is None:
+            return
+        signed = np.array(records["id"])
+        ids = np.abs(signed)
+        # 同じrowidへの操作は最後のものだけが効き、それが追加なら有効な行になる
+        _, last = np.unique(ids[::-1], return_index=True)
+        last = len(ids) - 1 - last
+        alive = np.zeros(len(ids), dtype=bool)
+        alive[last] = signed[last] > 0
+        for base_ids, _, base_alive in self._segments:
+            if len(base_ids):
+                base_alive &= ~np.isin(base_ids, ids)
+        self._segments.append((ids, records["vector"], alive))
+        self._log_records = len(records)
+
+    def _map_log(self) -> np.ndarray | None:
+        """ログのレコードをマップして返す（レコードがなければNone）"""
+        try:
+            f = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            dtype = _record_dtype(int(np.frombuffer(header, dtype=np.int64)[0]))
+            # 末尾の半端なレコード（書き込み途中で止まった分）は読まない
+            count = (os.fstat(f.fileno()).st_size - 8) // dtype.itemsize
+            if count == 0:
+                return None
+            return np.memmap(f, dtype=dtype, mode="r", offset=8, shape=(count,))
+
+    @staticmethod
+    def _atomic_save(path: Path, array: np.ndarray) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+
+
+def _file_state(path: Path) -> tuple[int, int, int, int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _base_dtype(rows: int, dim: int) -> np.dtype:
+    # rowidとベクトルをそれぞれ連続した配列として1つのレコードに収める
+    return np.dtype([("ids", "<i8", (rows,)), ("vectors", "<f4", (rows, dim))])
+
+
+def _record_dtype(dim: int) -> np.dtype:
+    return np.dtype([("id", "<i8"), ("vector", "<f4", (dim,))])
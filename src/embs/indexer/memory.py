@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import gc
+import os
+import re
+import resource
+import sys
+import threading
+
+# 上限に対するRSSの割合。HIGHを超えたら縮め、LOWを下回ったら元に戻していく
+HIGH_WATERMARK = 0.85
+LOW_WATERMARK = 0.6
+
+_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*$", re.IGNORECASE)
+
+
+def parse_size(text: str) -> int:
+    """ "512M"・"2G"・"1.5GiB"・"1000000" のようなサイズ指定をバイト数にする"""
+    m = _SIZE.match(text)
+    if m is None:
+        raise ValueError(f"サイズの指定が不正です: {text}")
+    return int(float(m.group(1)) * _UNITS[m.group(2).upper()])
+
+
+def current_rss() -> int:
+    """現在の常駐メモリ (バイト)
+
+    /proc/self/statm が読めない環境（macOSなど）では、代わりにプロセス開始からの
+    最大値を返す。
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryBudget:
+    """インデックス作成中のRSSを段階ごとに記録し、バッチサイズとキュー深さを調整する
+
+    sample()を各段階の処理後に呼ぶ。limitを超えそうになるとbatch_sizeと
+    queue_sizeを半分ずつ（最小1）に縮め、余裕ができると指定値まで戻す。
+    limitがNoneなら記録だけ行う。
+    """
+
+    def __init__(
+        self,
+        limit: int | None = None,
+        *,
+        batch_size: int = 32,
+        queue_size: int = 8,
+        high: float = HIGH_WATERMARK,
+        low: float = LOW_WATERMARK,
+    ) -> None:
+        self.limit = limit
+        self.max_batch_size = self.batch_size = max(1, batch_size)
+        self.max_queue_size = self.queue_size = max(1, queue_size)
+        self.high = high
+        self.low = low
+
+        self.peak = 0
+        self.high_water: dict[str, int] = {}
+        self.shrinks = 0
+        self.over_limit = 0
+        self._lock = threading.Lock()
+
+    def sample(self, stage: str) -> int:
+        """現在のRSSを段階stageの値として記録し、必要ならバッチサイズ等を調整する"""
+        rss = current_rss()
+        with self._lock:
+            self.peak = max(self.peak, rss)
+            self.high_water[stage] = max(self.high_water.get(stage, 0), rss)
+            if self.limit is None:
+                return rss
+
+            ratio = rss / self.limit
+            if ratio >= 1.0:
+                self.over_limit += 1
+            if ratio >= self.high:
+                if self.batch_size > 1 or self.queue_size > 1:
+                    self.batch_size = max(1, self.batch_size // 2)
+                    self.queue_size = max(1, self.queue_size // 2)
+                    self.shrinks += 1
+            elif ratio < self.low:
+                self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+                self.queue_size = min(self.max_queue_size, self.queue_size + 1)
+
+        if self.limit is not None and rss / self.limit >= self.high:
+            # 解放済みのバッチを早めに回収する
+            gc.collect()
+        return rss
+
+    def report(self) -> str:
+        """段階ごとの最大RSSを表形式の文字列にする"""
+        lines = [f"{'段階':<10}{'最大RSS(MiB)':>14}"]
+        for stage, rss in self.high_water.items():
+            lines.append(f"{stage:<10}{rss / 1024**2:>14.1f}")
+        lines.append(f"{'全体':<10}{self.peak / 1024**2:>14.1f}")
+        if self.limit is not None:
+            lines.append(
+                f"上限 {self.limit / 1024**2:.0f} MiB / 縮小 {self.shrinks} 回 / "
+                f"最終バッチサイズ {self.batch_size} / 最終キュー深さ {self.queue_size}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import statistics
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from embs.indexer.ann import DEFAULT_EF_CONSTRUCTION, DEFAULT_M
+from embs.indexer.store import (
+    SIDECAR_SUFFIXES,
+    RowBatch,
+    VectorStore,
+    staging_path,
+    swap_in,
+)
+
+DEFAULT_LATENCY_QUERIES = 20
+MIN_VEC_CHUNK_SIZE = 64
+MAX_VEC_CHUNK_SIZE = 4096
+
+
+def tuned_vec_chunk_size(rows: int) -> int:
+    """行数に合わせたvec0のchunk_size
+
+    vec0はchunk_size件ぶんの領域をまとめて確保し、その単位で読み込む。
+    大きいほど全件走査で読むBLOBの数が減るが、最後のチャンクの空きも大きくなる。
+    空きが全体の1/8程度に収まるよう行数の1/8とし、8の倍数に切り上げて
+    [MIN_VEC_CHUNK_SIZE, MAX_VEC_CHUNK_SIZE] に収める。
+    """
+    size = -(-rows // 8)
+    size = -(-size // 8) * 8
+    return min(max(size, MIN_VEC_CHUNK_SIZE), MAX_VEC_CHUNK_SIZE)
+
+
+def database_size(db_path: Path) -> int:
+    """DB本体と付随ファイル（-shmを除く）の合計バイト数"""
+    path = Path(db_path).resolve()
+    total = 0
+    for suffix in ("",) + SIDECAR_SUFFIXES:
+        if suffix == "-shm":
+            continue
+        candidate = path.with_name(path.name + suffix)
+        if candidate.exists():
+            total += candidate.stat().st_size
+    return total
+
+
+def measure_latency(store: VectorStore, queries: np.ndarray, top_k: int = 20) -> float:
+    """クエリごとの検索時間（秒）の中央値。最初の1回はキャッシュを温めるため数えない"""
+    if len(queries) == 0:
+        return 0.0
+    store.search(queries[0], top_k=top_k)
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        store.search(query, top_k=top_k)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+@dataclass
+class OptimizeReport:
+    chunks: int = 0
+    size_before: int = 0
+    size_after: int = 0
+    free_bytes_before: int = 0
+    locality_before: float = 0.0
+    locality_after: float = 0.0
+    vec_chunk_size_before: int = 0
+    vec_chunk_size_after: int = 0
+    latency_before: float = 0.0
+    latency_after: float = 0.0
+
+
+def optimize(
+    db_path: Path,
+    *,
+    vec_chunk_size: int | None = None,
+    latency_queries: int = DEFAULT_LATENCY_QUERIES,
+    top_k: int = 20,
+    hnsw_m: int = DEFAULT_M,
+    ef_construction: int = DEFAULT_EF_CONSTRUCTION,
+    batch_size: int = 4096,
+) -> OptimizeReport:
+    """インデックスDBを作り直して、追加・削除の繰り返しで崩れた配置を整える
+
+    1. チャンクをファイル・チャンク順に並べ直して新しいidを振り、chunksと
+       vec_chunksを書き直す（同じ文書のチャンクが隣り合うページ・vec0チャンクに入る）
+    2. vec_chunksはvec_chunk_size（省略時は行数から決めた値）で作り直す
+    3. VACUUMで未使用ページを詰め、ANALYZEでクエリプランナの統計を取り直す
+
+    重複の参照先・名前付き空間のベクトルは新しいidに付け替え、ANNインデックスが
+    あればhnsw_m・ef_constructionで作り直す。新しい版は別ファイルに作ってからswap_in()で差し替えるので、
+    検索中のプロセスは止まらない。差し替えまでに書き込まれた変更は失われるため、
+    embs watch等の書き込みを止めてから実行する。
+    前後のサイズと、保存済みのベクトルから無作為にlatency_queries件を選んだ検索の
+    所要時間の中央値を返す。
+    """
+    db_path = Path(db_path)
+    if not db_path.exists():
+        raise FileNotFoundError(f"DBファイルが見つかりません: {db_path}")
+    if vec_chunk_size is not None and (vec_chunk_size < 8 or vec_chunk_size % 8):
+        raise ValueError(f"vec_chunk_sizeは8の倍数で指定してください: {vec_chunk_size}")
+
+    report = OptimizeReport(size_before=database_size(db_path))
+    source = VectorStore(db_path)
+    try:
+        metadata = source.get_metadata()
+        if "model_name" not in metadata:
+            raise ValueError(f"インデックスDBではありません: {db_path}")
+        # 前後で同じクエリを使う
+        queries = source.sample_embeddings(latency_queries)
+        report.latency_before = measure_latency(source, queries, top_k)
+        before = source.storage_stats()
+        report.free_bytes_before = int(before["free_bytes"])
+        report.locality_before = before["locality"]
+        report.vec_chunk_size_before = int(before["vec_chunk_size"])
+
+        if vec_chunk_size is None:
+            vec_chunk_size = tuned_vec_chunk_size(int(before["chunks"]))
+        staged = staging_path(db_path)
+        target = VectorStore(staged, backend=source.backend)
+        try:
+            report.chunks = _rewrite(source, target, metadata, vec_chunk_size, batch_size)
+            if report.chunks and metadata.get("ann_index") == "hnsw":
+                target.build_ann(m=hnsw_m, ef_construction=ef_construction)
+            target.compact()
+        except BaseException:
+            target.close()
+            staged.unlink(missing_ok=True)
+            for suffix in SIDECAR_SUFFIXES:
+                staged.with_name(staged.name + suffix).unlink(missing_ok=True)
+            raise
+        target.close()
+    finally:
+        source.close()
+
+    swap_in(db_path, staged)
+    report.size_after = database_size(db_path)
+    store = VectorStore(db_path)
+    try:
+        report.latency_after = measure_latency(store, queries, top_k)
+        after = store.storage_stats()
+        report.locality_after = after["locality"]
+        report.vec_chunk_size_after = int(after["vec_chunk_size"])
+    finally:
+        store.close()
+    return report
+
+
+def _rewrite(
+    source: VectorStore,
+    target: VectorStore,
+    metadata: dict[str, str],
+    vec_chunk_size: int,
+    batch_size: int,
+) -> int:
+    target.create_tables(
+        model_name=metadata["model_name"],
+        dim=int(metadata["embedding_dim"]),
+        vec_chunk_size=vec_chunk_size,
+    )
+    # 圧縮辞書もそのまま引き継ぎ、書き込むテキストは同じ辞書で圧縮される
+    target.restore_metadata(metadata)
+    spaces = source.list_spaces()
+    for space in spaces:
+        target.add_space(space["name"], model_name=space["model_name"], dim=space["dim"])
+
+    total = 0
+    for batch in source.iter_rows(batch_size, by_source=True):
+        new_ids = np.arange(total + 1, total + 1 + len(batch.ids), dtype=np.int64)
+        remap = dict(zip(batch.ids.tolist(), new_ids.tolist()))
+        total += target.load_rows(
+            RowBatch(
+                ids=new_ids,
+                source_files=batch.source_files,
+                chunk_indexes=batch.chunk_indexes,
+                texts=batch.texts,
+                embeddings=batch.embeddings,
+            )
+        )
+        duplicates = [
+            (remap[chunk_id], source_file, chunk_index)
+            for chunk_id, locations in source.get_duplicates(batch.ids.tolist()).items()
+            for source_file, chunk_index in locations
+        ]
+        if duplicates:
+            target.add_duplicates(duplicates)
+        for space in spaces:
+            vectors = source.get_space_vectors(space["name"], batch.ids)
+            target.insert_space_vectors(
+                space["name"], ((remap[i], v) for i, v in vectors.items())
+            )
+    return total
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# ワーカーでモデルを読み込むクラス（"モジュール:属性"）。torchのスレッド数を設定してから
+# importするため、クラスそのものではなく名前で渡す
+DEFAULT_LOADER = "sentence_transformers:SentenceTransformer"
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+_model = None
+_ready = None
+
+
+def available_cores() -> list[int]:
+    """このプロセスが使えるCPUコアの番号"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_slices(workers: int, threads_per_worker: int, cores: list[int]) -> list[list[int]]:
+    """ワーカーごとに重ならないコアの組を割り当てる（足りなければ先頭から再利用）"""
+    return [
+        [cores[(w * threads_per_worker + t) % len(cores)] for t in range(threads_per_worker)]
+        for w in range(workers)
+    ]
+
+
+def _init_worker(loader: str, model_name: str, slices, counter, ready, threads: int) -> None:
+    global _model, _ready
+    _ready = ready
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    cores = slices[index % len(slices)]
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError:
+            pass
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    module, _, attr = loader.partition(":")
+    _model = getattr(importlib.import_module(module), attr)(model_name)
+
+
+def _wait_ready() -> tuple[int, int | None, int | None]:
+    """(pid, embeddingの次元数, 最大トークン数) を返す（モデルが持たなければNone）"""
+    _ready.wait()
+    dimension = getattr(_model, "get_sentence_embedding_dimension", None)
+    return (
+        os.getpid(),
+        dimension() if dimension is not None else None,
+        getattr(_model, "max_seq_length", None),
+    )
+
+
+def _encode(texts: list[str]) -> np.ndarray:
+    return np.asarray(_model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+class EmbeddingPool:
+    """コアを分けて固定した複数のワーカープロセスでembeddingを並列に計算する
+
+    各ワーカーはthreads_per_worker個のコアに固定され、torchもそのスレッド数で動く。
+    encode()は入力をワーカー数に分けて配り、結果を元の順に1つの配列へまとめる。
+    親プロセスはモデルを読み込まず、次元数・最大トークン数はワーカーから受け取る。
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int,
+        *,
+        threads_per_worker: int | None = None,
+        loader: str = DEFAULT_LOADER,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workersは1以上を指定してください")
+        cores = available_cores()
+        if threads_per_worker is None:
+            threads_per_worker = max(1, len(cores) // workers)
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.slices = core_slices(workers, threads_per_worker, cores)
+
+        # torchはforkと相性が悪いためspawnで起動する
+        ctx = multiprocessing.get_context("spawn")
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(
+                loader,
+                model_name,
+                self.slices,
+                ctx.Value("i", 0),
+                ctx.Barrier(workers),
+                threads_per_worker,
+            ),
+        )
+        # 全ワーカーを起動してモデルの読み込みを待つ。遅れて起動したワーカーの分まで
+        # 先に起動した1つが引き受けてしまわないようにするため
+        futures = [self._executor.submit(_wait_ready) for _ in range(workers)]
+        ready = [f.result() for f in futures]
+        self.pids = [pid for pid, _, _ in ready]
+        _, self.dim, self.max_seq_length = ready[0]
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """テキストを連続した区間に分けて各ワーカーで計算し、順序どおりに結合する"""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        shards = [s.tolist() for s in np.array_split(np.arange(len(texts)), self.workers) if len(s)]
+        results = self._executor.map(_encode, [[texts[i] for i in shard] for shard in shards])
+        return np.concatenate(list(results))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
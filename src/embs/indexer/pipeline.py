@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import queue
+import threading
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+
+from embs.fetchers.base import Document
+from embs.indexer.chunker import Chunk, ChunkSizing, chunk_text, resize_chunks
+from embs.indexer.dedup import Deduplicator
+from embs.indexer.embedder import Embedder
+from embs.indexer.memory import MemoryBudget
+from embs.indexer.store import VectorStore
+
+_DONE = object()
+
+
+@dataclass
+class PipelineStats:
+    """パイプラインの処理件数"""
+
+    documents: int = 0
+    chunks: int = 0
+    duplicates: int = 0
+
+
+def index_documents(
+    documents: Iterable[Document],
+    store: VectorStore,
+    embedder: Embedder,
+    *,
+    mirror_dir: Path | None = None,
+    batch_size: int = 32,
+    queue_size: int = 8,
+    deduplicator: Deduplicator | None = None,
+    memory: MemoryBudget | None = None,
+    sizing: ChunkSizing | None = None,
+    on_document: Callable[[Document], None] | None = None,
+) -> PipelineStats:
+    """文書ストリームをチャンキング → embedding → VectorStoreへ流し込む
+
+    取得は別スレッドで進め、届いた文書から順にチャンキングとembeddingを行う。
+    同じsource_fileの既存チャンクは最初に現れた時点で置き換える。
+    mirror_dirを指定すると取得したMarkdownも書き出す。
+    deduplicatorを渡すと重複チャンクはembeddingせず出現位置だけを記録する。
+    memoryを渡すと各段階のRSSを記録し、そのbatch_size・queue_sizeに従う。
+    sizingを渡すとチャンクをトークン数に合わせて結合・分割する。
+    """
+    docs: queue.Queue = queue.Queue()
+    errors: list[BaseException] = []
+    # 取得済みで未処理の文書数。memoryがあれば上限は実行中に変わる
+    slots = threading.Condition()
+    in_flight = 0
+
+    def depth() -> int:
+        return memory.queue_size if memory is not None else queue_size
+
+    def produce() -> None:
+        nonlocal in_flight
+        try:
+            for doc in documents:
+                with slots:
+                    slots.wait_for(lambda: in_flight < depth())
+                    in_flight += 1
+                docs.put(doc)
+                if memory is not None:
+                    memory.sample("fetch")
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            docs.put(_DONE)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    def current_batch_size() -> int:
+        return memory.batch_size if memory is not None else batch_size
+
+    stats = PipelineStats()
+    seen: set[str] = set()
+    pending: list[Chunk] = []
+    while (doc := docs.get()) is not _DONE:
+        with slots:
+            in_flight -= 1
+            slots.notify()
+        if on_document is not None:
+            on_document(doc)
+        if mirror_dir is not None:
+            dest = mirror_dir / doc.name
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            dest.write_text(doc.text, encoding="utf-8")
+
+        source_file = PurePosixPath(doc.name).name
+        if source_file not in seen:
+            store.delete_source(source_file)
+            seen.add(source_file)
+
+        chunks = chunk_text(doc.text, source_file)
+        if sizing is not None:
+            chunks = resize_chunks(chunks, sizing)
+        pending.extend(chunks)
+        if memory is not None:
+            memory.sample("chunk")
+        stats.documents += 1
+        if len(pending) >= current_batch_size():
+            _flush(pending, store, embedder, stats, current_batch_size, deduplicator, memory)
+            pending = []
+
+    _flush(pending, store, embedder, stats, current_batch_size, deduplicator, memory)
+    producer.join()
+    if errors:
+        raise errors[0]
+    return stats
+
+
+def _flush(
+    chunks: list[Chunk],
+    store: VectorStore,
+    embedder: Embedder,
+    stats: PipelineStats,
+    batch_size: Callable[[], int],
+    deduplicator: Deduplicator | None = None,
+    memory: MemoryBudget | None = None,
+) -> None:
+    """溜まったチャンクをまとめてembeddingし、1トランザクションで保存する
+
+    embeddingはbatch_size()件ずつ行うので、途中でメモリが逼迫すれば
+    残りはより小さいバッチで処理する。
+    """
+    if not chunks:
+        return
+
+    duplicates: list[tuple[Chunk, int]] = []
+    if deduplicator is not None:
+        chunks, duplicates = _split_duplicates(chunks, deduplicator)
+
+    embeddings = []
+    start = 0
+    while start < len(chunks):
+        size = batch_size()
+        embeddings.extend(embedder.embed([c.text for c in chunks[start : start + size]]))
+        if memory is not None:
+            memory.sample("embed")
+        start += size
+
+    ids = store.insert_batch(
+        (c.source_file, c.chunk_index, c.text, emb) for c, emb in zip(chunks, embeddings)
+    )
+    if memory is not None:
+        memory.sample("store")
+    stats.chunks += len(ids)
+
+    if deduplicator is not None:
+        for chunk, rowid in zip(chunks, ids):
+            deduplicator.add(rowid, chunk.text)
+        # 同じバッチ内の代表チャンクは負の番号 -(位置+1) で参照している
+        store.add_duplicates(
+            (ids[-ref - 1] if ref < 0 else ref, c.source_file, c.chunk_index)
+            for c, ref in duplicates
+        )
+        stats.duplicates += len(duplicates)
+
+
+def _split_duplicates(
+    chunks: list[Chunk], deduplicator: Deduplicator
+) -> tuple[list[Chunk], list[tuple[Chunk, int]]]:
+    """保存済み・同じバッチ内のチャンクと重複するものを分ける
+
+    重複側は (チャンク, 代表の参照) で返す。参照は保存済みならそのid、
+    同じバッチ内なら代表の位置を -(位置+1) で表す。
+    """
+    in_batch = Deduplicator(
+        threshold=deduplicator.threshold,
+        ngram=deduplicator.ngram,
+        num_perm=deduplicator.rows * deduplicator.bands,
+        bands=deduplicator.bands,
+    )
+    unique: list[Chunk] = []
+    duplicates: list[tuple[Chunk, int]] = []
+    for chunk in chunks:
+        original = deduplicator.match(chunk.text)
+        if original is None:
+            original = in_batch.match(chunk.text)
+        if original is not None:
+            duplicates.append((chunk, original))
+            continue
+        unique.append(chunk)
+        in_batch.add(-len(unique), chunk.text)
+    return unique, duplicates
+
+
+def backfill_space(
+    store: VectorStore,
+    name: str,
+    embedder: Embedder,
+    *,
+    batch_size: int = 64,
+    limit: int | None = None,
+) -> int:
+    """名前付き埋め込み空間のうち、ベクトルが未作成のチャンクを埋める
+
+    batch_size件ごとに別トランザクションで書き込むので、途中で止めても
+    次回は続きから再開でき、その間も既存の空間で検索できる。未作成のチャンクは
+    前のバッチの最後のidから続けて探すので、全体を1回なめるだけで済む。
+    """
+    done = 0
+    last_id = 0
+    while limit is None or done < limit:
+        size = batch_size if limit is None else min(batch_size, limit - done)
+        missing = store.missing_in_space(name, size, after=last_id)
+        if not missing:
+            break
+        last_id = missing[-1][0]
+        embeddings = embedder.embed([text for _, text in missing])
+        done += store.insert_space_vectors(
+            name, ((rowid, emb) for (rowid, _), emb in zip(missing, embeddings))
+        )
+    return done
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+
+import numpy as np
+
+from embs.indexer.dedup import Deduplicator
+from embs.indexer.store import RowBatch, VectorStore
+
+# シャード間で一致していなければ結合できないmetadata
+REQUIRED_METADATA = ("model_name", "embedding_dim")
+_SHARD = re.compile(r"^\s*(\d+)\s*/\s*(\d+)\s*$")
+
+
+def parse_shard(text: str) -> tuple[int, int]:
+    """ "i/N" を (i, N) にする（iは0からN-1）"""
+    m = _SHARD.match(text)
+    if m is None:
+        raise ValueError(f"シャードの指定が不正です（例: 0/4）: {text}")
+    index, count = int(m.group(1)), int(m.group(2))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"シャード番号は0から{count - 1}で指定してください: {text}")
+    return index, count
+
+
+def shard_of(name: str, count: int) -> int:
+    """文書名のハッシュで決まるシャード番号
+
+    インデックスのsource_fileと同じくファイル名部分で分けるため、同じsource_fileに
+    なる文書は必ず同じシャードに入る。プロセスごとに値の変わるhash()ではなく
+    SHA-1を使うので、どのマシン・プロセスで計算しても同じ割り当てになる。
+    """
+    key = PurePosixPath(name).name
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+@dataclass
+class MergeStats:
+    shards: int = 0
+    chunks: int = 0
+    duplicates: int = 0
+    space_vectors: int = 0
+    # 結合時にシャード間の重複として代表にまとめたチャンク数
+    deduplicated: int = 0
+
+
+def merge_stores(
+    sources: list[Path],
+    out: Path,
+    *,
+    backend: str | None = None,
+    batch_size: int = 4096,
+    deduplicator: Deduplicator | None = None,
+) -> MergeStats:
+    """シャードDBを1つの新しいDBに結合する
+
+    チャンクのidは出力先で振り直し、重複の参照先・名前付き空間のベクトルも
+    それに合わせて付け替える。embeddingは再計算せずにそのまま書き込む。
+    モデル名・次元・埋め込み空間の定義がシャード間で異なる場合や、同じファイルが
+    複数のシャードに含まれる場合はValueErrorを送出する。元のシャードにANN
+    インデックスや圧縮があれば、結合後に作り直す。
+
+    各シャードの重複除去はシャードの中で閉じているので、別々のシャードに入った
+    同じ内容のチャンクはそのまま残る。deduplicatorを渡すと結合しながら判定し、
+    重複は先に出てきたチャンクの出現位置として記録する（embeddingは共有される）。
+    """
+    out = Path(out)
+    if out.exists():
+        raise FileExistsError(f"出力先のDBが既に存在します: {out}")
+    if not sources:
+        raise ValueError("結合するDBを指定してください")
+    for path in sources:
+        if not Path(path).exists():
+            raise FileNotFoundError(f"DBファイルが見つかりません: {path}")
+
+    stores = [VectorStore(path) for path in sources]
+    try:
+        metadata, spaces = _check_compatible(sources, stores)
+        target = VectorStore(out, backend=backend or metadata.get("vector_backend"))
+        try:
+            stats = _copy(stores, target, metadata, spaces, batch_size, deduplicator)
+            shard_metadata = [s.get_metadata() for s in stores]
+            if stats.chunks and any(m.get("ann_index") == "hnsw" for m in shard_metadata):
+                target.build_ann()
+            levels = [
+                m["text_codec_level"] for m in shard_metadata if m.get("text_codec") == "zstd"
+            ]
+            if stats.chunks and levels:
+                target.compress_texts(level=int(levels[0]))
+        finally:
+            target.close()
+    finally:
+        for store in stores:
+            store.close()
+    return stats
+
+
+def _check_compatible(
+    sources: list[Path], stores: list[VectorStore]
+) -> tuple[dict[str, str], list[dict]]:
+    metadata = stores[0].get_metadata()
+    spaces = _space_definitions(stores[0])
+    seen: dict[str, Path] = {}
+    for path, store in zip(sources, stores):
+        other = store.get_metadata()
+        for key in REQUIRED_METADATA:
+            if other.get(key) != metadata.get(key):
+                raise ValueError(
+                    f"{path} の{key}が{sources[0]}と異なります: "
+                    f"{other.get(key)} != {metadata.get(key)}"
+                )
+        if _space_definitions(store) != spaces:
+            raise ValueError(f"{path} の埋め込み空間の定義が{sources[0]}と異なります")
+        for source_file in store.list_sources():
+            if source_file in seen:
+                raise ValueError(
+                    f"{source_file} が {seen[source_file]} と {path} の両方に含まれています"
+                )
+            seen[source_file] = path
+    return metadata, spaces
+
+
+def _space_definitions(store: VectorStore) -> list[dict]:
+    return sorted(
+        ({k: s[k] for k in ("name", "model_name", "dim")} for s in store.list_spaces()),
+        key=lambda s: s["name"],
+    )
+
+
+def _copy(
+    stores: list[VectorStore],
+    target: VectorStore,
+    metadata: dict[str, str],
+    spaces: list[dict],
+    batch_size: int,
+    deduplicator: Deduplicator | None = None,
+) -> MergeStats:
+    target.create_tables(model_name=metadata["model_name"], dim=int(metadata["embedding_dim"]))
+    for space in spaces:
+        target.add_space(space["name"], model_name=space["model_name"], dim=space["dim"])
+
+    stats = MergeStats()
+    next_id = 1
+    for store in stores:
+        for batch in store.iter_rows(batch_size):
+            remap: dict[int, int] = {}
+            keep: list[int] = []
+            duplicates: list[tuple[int, str, int]] = []
+            for i, (old_id, text) in enumerate(zip(batch.ids.tolist(), batch.texts)):
+                original = deduplicator.match(text) if deduplicator is not None else None
+                if original is not None:
+                    remap[old_id] = original
+                    duplicates.append((original, batch.source_files[i], batch.chunk_indexes[i]))
+                    continue
+                remap[old_id] = next_id
+                keep.append(i)
+                if deduplicator is not None:
+                    deduplicator.add(next_id, text)
+                next_id += 1
+            stats.deduplicated += len(duplicates)
+
+            kept_ids = batch.ids[keep]
+            stats.chunks += target.load_rows(
+                RowBatch(
+                    ids=np.array([remap[i] for i in kept_ids.tolist()], dtype=np.int64),
+                    source_files=[batch.source_files[i] for i in keep],
+                    chunk_indexes=[batch.chunk_indexes[i] for i in keep],
+                    texts=[batch.texts[i] for i in keep],
+                    embeddings=batch.embeddings[keep],
+                )
+            )
+            duplicates += [
+                (remap[chunk_id], source_file, chunk_index)
+                for chunk_id, locations in store.get_duplicates(batch.ids.tolist()).items()
+                for source_file, chunk_index in locations
+            ]
+            if duplicates:
+                target.add_duplicates(duplicates)
+                stats.duplicates += len(duplicates)
+            for space in spaces:
+                vectors = store.get_space_vectors(space["name"], kept_ids)
+                stats.space_vectors += target.insert_space_vectors(
+                    space["name"], ((remap[i], v) for i, v in vectors.items())
+                )
+        stats.shards += 1
+    return stats
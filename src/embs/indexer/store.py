@@ -1,14 +1,54 @@
 from __future__ import annotations
 
+import base64
+import os
+import re
 import sqlite3
 import struct
+import time
+import uuid
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
 
 import numpy as np
 import sqlite_vec
 
+from embs.indexer.ann import DEFAULT_EF_CONSTRUCTION, DEFAULT_M, HnswIndex
+from embs.indexer.codec import DEFAULT_DICT_SIZE, DEFAULT_LEVEL, TextCodec
+from embs.indexer.matrix import MatrixIndex
+from embs.metrics import STAGE_ITEMS, STAGE_SECONDS
+from embs.profiling import span
 
 EMBEDDING_DIM = 768
+BACKENDS = ("sqlite-vec", "numpy")
+# chunk_sizeを指定しないvec0テーブルが1チャンクに確保するベクトル数
+VEC0_DEFAULT_CHUNK_SIZE = 1024
+
+# WALで読み手が書き手にブロックされないようにし、読み込みはmmap・大きめのキャッシュで行う
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+}
+
+_SPACE_NAME = re.compile(r"^[A-Za-z0-9_]+$")
+
+# DB本体と一緒に作られる付随ファイル
+SIDECAR_SUFFIXES = ("-wal", "-shm", ".vectors.npy", ".vectors.log", ".hnsw")
+
+
+@dataclass
+class RowBatch:
+    """id順に並んだチャンクとembeddingのまとまり"""
+
+    ids: np.ndarray
+    source_files: list[str]
+    chunk_indexes: list[int]
+    texts: list[str]
+    embeddings: np.ndarray
 
 
 def _serialize_f32(vec: np.ndarray) -> bytes:
@@ -17,17 +57,83 @@ def _serialize_f32(vec: np.ndarray) -> bytes:
 
 
 class VectorStore:
-    """sqlite-vecベースのベクトルストア"""
+    """sqlite-vecベースのベクトルストア
+
+    backend="numpy"の場合、ベクトルはDBと同じ場所の.npyに連続配置し、
+    memmapした行列との内積で総当たり検索する（テキストは引き続きchunksテーブル）。
+    backendを省略すると、既存DBのmetadataに記録されたバックエンドを使う。
 
-    def __init__(self, db_path: Path) -> None:
+    build_ann()でHNSWの近似最近傍インデックスを作成すると、以降の挿入・削除は
+    それにも反映され、search()はexact=Trueを指定しない限りHNSWで検索する。
+
+    compress_texts()を実行すると、chunks.textは学習済み辞書つきのzstdで圧縮した
+    BLOBとして保存され、検索時は返す行だけを展開する。
+
+    主モデルのベクトル（vec_chunks）とは別に、add_space()で名前付きの埋め込み空間を
+    追加できる。各空間は専用のvec0テーブル（vec_space_<name>）とspacesテーブルの
+    モデル名・次元を持ち、既存チャンクへのベクトルは後から少しずつ埋められる。
+    insert系のメソッドは空間のベクトルを作らないので、追加・更新したチャンクは
+    backfill_space()で埋めるまで空間では未作成のまま残る（空間は未完成になる）。
+
+    書き込みメソッドはそれぞれコミットするが、transaction()の中では最後に1回だけ
+    コミットするので、削除と追加をまとめて他のプロセスに見せられる。
+    """
+
+    def __init__(self, db_path: Path, *, backend: str | None = None) -> None:
         self.db_path = Path(db_path)
-        self.conn = sqlite3.connect(str(self.db_path))
+        # swap_in()でシンボリックリンクが差し替えられても、開いた版を使い続ける
+        self.data_path = self.db_path.resolve()
+        self.conn = sqlite3.connect(str(self.data_path))
         self.conn.enable_load_extension(True)
         sqlite_vec.load(self.conn)
         self.conn.enable_load_extension(False)
+        for name, value in PRAGMAS.items():
+            self.conn.execute(f"PRAGMA {name} = {value}")
+
+        self.backend = backend or self._get_metadata("vector_backend") or "sqlite-vec"
+        if self.backend not in BACKENDS:
+            raise ValueError(f"未対応のバックエンドです: {self.backend}")
+        self._matrix = MatrixIndex(self.data_path) if self.backend == "numpy" else None
+
+        # refresh()で読み直すかを決めるため、読み込む前の版とmetadataを控えておく
+        self._version = self.get_index_version()
+        self._loaded_metadata = self._sidecar_metadata()
+        self._ann: HnswIndex | None = None
+        self._load_ann()
 
-    def create_tables(self, model_name: str) -> None:
-        """テーブルを作成する"""
+        self._codec: TextCodec | None = None
+        self._load_codec()
+
+        self._changes = self.conn.total_changes
+        self._unflushed = False
+        self._in_transaction = False
+        # transaction()の中のANNインデックスへの変更は、コミットするまで保留する
+        self._deferred_ann: list[tuple[list[int], np.ndarray | None]] = []
+
+    def _load_ann(self) -> None:
+        self._ann = None
+        if self._get_metadata("ann_index") == "hnsw":
+            self._ann = HnswIndex(self.data_path, int(self._get_metadata("ann_dim")))
+            # ファイルを読んでから削除数を読む（flush()は削除数を先に記録するので、
+            # ファイルより古い値を読むことはない）
+            self._ann.deleted = int(self._get_metadata("ann_deleted") or 0)
+
+    def _load_codec(self) -> None:
+        self._codec = None
+        if self._get_metadata("text_codec") == "zstd":
+            dictionary = base64.b64decode(self._get_metadata("text_codec_dict") or "")
+            self._codec = TextCodec(
+                dictionary or None, level=int(self._get_metadata("text_codec_level"))
+            )
+
+    def create_tables(
+        self, model_name: str, dim: int = EMBEDDING_DIM, *, vec_chunk_size: int | None = None
+    ) -> None:
+        """テーブルを作成する
+
+        vec_chunk_sizeを指定すると、vec0がまとめて確保・走査するベクトルの件数
+        （chunk_size、8の倍数）をその値にする。省略時はsqlite-vecの既定値。
+        """
         cur = self.conn.cursor()
         cur.execute(
             """
@@ -39,13 +145,21 @@ class VectorStore:
             )
             """
         )
+        # 同じファイルの前後のチャンク・ファイル単位の削除を索引だけで引けるようにする
+        # （索引の各エントリはrowidも持つため、idまでは表を読まずに得られる）
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks (source_file, chunk_index)"
+        )
+        options = f", chunk_size={vec_chunk_size}" if vec_chunk_size else ""
         cur.execute(
             f"""
             CREATE VIRTUAL TABLE IF NOT EXISTS vec_chunks USING vec0 (
-                embedding float[{EMBEDDING_DIM}]
+                embedding float[{dim}]{options}
             )
             """
         )
+        self._create_spaces_table(cur)
+        self._create_duplicates_table(cur)
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS metadata (
@@ -54,62 +168,743 @@ class VectorStore:
             )
             """
         )
-        cur.execute(
-            """
-            INSERT OR REPLACE INTO metadata (key, value) VALUES ('model_name', ?)
-            """,
-            (model_name,),
+        cur.executemany(
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+            [
+                ("model_name", model_name),
+                ("embedding_dim", str(dim)),
+                ("vector_backend", self.backend),
+            ],
         )
-        self.conn.commit()
+        self._commit()
 
     def get_model_name(self) -> str | None:
         """保存されたembeddingモデル名を取得する"""
+        return self._get_metadata("model_name")
+
+    def add_space(self, name: str, model_name: str, dim: int) -> None:
+        """名前付きの埋め込み空間を追加する"""
+        if not _SPACE_NAME.match(name):
+            raise ValueError(f"空間名には英数字と_のみ使えます: {name}")
+        existing = self.get_space(name)
+        if existing is not None:
+            if existing["model_name"] != model_name or existing["dim"] != dim:
+                raise ValueError(
+                    f"空間 {name} は既に {existing['model_name']} "
+                    f"({existing['dim']}次元) で作成されています"
+                )
+            return
+
         cur = self.conn.cursor()
+        self._create_spaces_table(cur)
+        cur.execute(
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS vec_space_{name} USING vec0 (
+                embedding float[{dim}]
+            )
+            """
+        )
+        cur.execute(
+            "INSERT INTO spaces (name, model_name, dim) VALUES (?, ?, ?)",
+            (name, model_name, dim),
+        )
+        self._commit()
+
+    @staticmethod
+    def _create_spaces_table(cur: sqlite3.Cursor) -> None:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS spaces (
+                name TEXT PRIMARY KEY,
+                model_name TEXT NOT NULL,
+                dim INTEGER NOT NULL
+            )
+            """
+        )
+
+    @staticmethod
+    def _create_duplicates_table(cur: sqlite3.Cursor) -> None:
+        # 重複として保存を省いたチャンクの出現位置 → 代表チャンクのid
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS duplicates (
+                chunk_id INTEGER NOT NULL,
+                source_file TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL
+            )
+            """
+        )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_duplicates_chunk ON duplicates (chunk_id)"
+        )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_duplicates_source ON duplicates (source_file)"
+        )
+
+    def add_duplicates(self, rows: Iterable[tuple[int, str, int]]) -> None:
+        """重複チャンクの出現位置 (代表id, source_file, chunk_index) を記録する"""
+        cur = self.conn.cursor()
+        self._create_duplicates_table(cur)
+        cur.executemany(
+            "INSERT INTO duplicates (chunk_id, source_file, chunk_index) VALUES (?, ?, ?)",
+            rows,
+        )
+        self._commit()
+
+    def get_duplicates(self, ids: list[int]) -> dict[int, list[tuple[str, int]]]:
+        """代表チャンクごとに、重複として省いた出現位置 (source_file, chunk_index) を返す"""
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
         try:
-            cur.execute("SELECT value FROM metadata WHERE key = 'model_name'")
+            rows = self.conn.execute(
+                f"""
+                SELECT chunk_id, source_file, chunk_index FROM duplicates
+                WHERE chunk_id IN ({placeholders})
+                ORDER BY rowid
+                """,
+                ids,
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return {}
+
+        locations: dict[int, list[tuple[str, int]]] = {}
+        for chunk_id, source_file, chunk_index in rows:
+            locations.setdefault(chunk_id, []).append((source_file, chunk_index))
+        return locations
+
+    def _attach_duplicates(self, results: list[dict]) -> list[dict]:
+        """重複として省いた出現位置があれば結果に "duplicates" として付ける"""
+        locations = self.get_duplicates([r["id"] for r in results])
+        for r in results:
+            if r["id"] in locations:
+                r["duplicates"] = locations[r["id"]]
+        return results
+
+    def list_sources(self) -> list[str]:
+        """チャンクのあるsource_fileの一覧"""
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT DISTINCT source_file FROM chunks ORDER BY source_file"
+            )
+        ]
+
+    def get_context(self, ids: list[int], window: int = 1) -> dict[int, list[dict]]:
+        """各チャンクについて、同じファイルの前後window個までのチャンクを返す
+
+        結果はチャンクidごとの {"id", "chunk_index", "text"} のリストで、
+        chunk_index順に並び、そのチャンク自身も含む。重複として保存を省いた位置は
+        代表チャンクの本文で埋める。結果セット全体を1回のクエリで引く。
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        query = f"""
+            SELECT t.id, c.id, c.chunk_index, c.text
+            FROM chunks AS t
+            JOIN chunks AS c
+              ON c.source_file = t.source_file
+             AND c.chunk_index BETWEEN t.chunk_index - ? AND t.chunk_index + ?
+            WHERE t.id IN ({placeholders})
+            """
+        params = [window, window, *ids]
+        if self._has_table("duplicates"):
+            query += f"""
+            UNION ALL
+            SELECT t.id, d.chunk_id, d.chunk_index, c.text
+            FROM chunks AS t
+            JOIN duplicates AS d
+              ON d.source_file = t.source_file
+             AND d.chunk_index BETWEEN t.chunk_index - ? AND t.chunk_index + ?
+            JOIN chunks AS c ON c.id = d.chunk_id
+            WHERE t.id IN ({placeholders})
+            """
+            params += [window, window, *ids]
+        rows = self.conn.execute(query + " ORDER BY 1, 3", params).fetchall()
+
+        context: dict[int, list[dict]] = {}
+        for hit_id, chunk_id, chunk_index, text in rows:
+            context.setdefault(hit_id, []).append(
+                {"id": chunk_id, "chunk_index": chunk_index, "text": self._decode_text(text)}
+            )
+        return context
+
+    def get_space(self, name: str) -> dict | None:
+        """空間のモデル名・次元と、ベクトルが埋まっている件数を返す"""
+        try:
+            row = self.conn.execute(
+                "SELECT name, model_name, dim FROM spaces WHERE name = ?", (name,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        if row is None:
+            return None
+
+        filled = self.conn.execute(f"SELECT COUNT(*) FROM vec_space_{name}").fetchone()[0]
+        total = self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return {
+            "name": row[0],
+            "model_name": row[1],
+            "dim": row[2],
+            "filled": filled,
+            "total": total,
+        }
+
+    def list_spaces(self) -> list[dict]:
+        """追加された埋め込み空間の一覧を返す"""
+        try:
+            names = [row[0] for row in self.conn.execute("SELECT name FROM spaces ORDER BY name")]
+        except sqlite3.OperationalError:
+            return []
+        return [self.get_space(name) for name in names]
+
+    def missing_in_space(
+        self, name: str, limit: int, *, after: int = 0
+    ) -> list[tuple[int, str]]:
+        """空間にまだベクトルがないチャンクのうち、idがafterより大きいものを
+        (id, text) でid順に返す
+
+        前回の最後のidをafterに渡して続きから引けば、埋め終わった範囲を
+        読み直さずに済む。
+        """
+        rows = self.conn.execute(
+            f"""
+            SELECT c.id, c.text FROM chunks AS c
+            LEFT JOIN vec_space_{name} AS v ON v.rowid = c.id
+            WHERE c.id > ? AND v.rowid IS NULL
+            ORDER BY c.id
+            LIMIT ?
+            """,
+            (after, limit),
+        ).fetchall()
+        return [(rowid, self._decode_text(text)) for rowid, text in rows]
+
+    def insert_space_vectors(
+        self, name: str, rows: Iterable[tuple[int, np.ndarray]]
+    ) -> int:
+        """既存チャンクに対する空間のベクトルを1トランザクションで書き込む"""
+        cur = self.conn.cursor()
+        count = 0
+        for rowid, embedding in rows:
+            cur.execute(
+                f"INSERT OR REPLACE INTO vec_space_{name} (rowid, embedding) VALUES (?, ?)",
+                (rowid, _serialize_f32(embedding)),
+            )
+            count += 1
+        self._commit()
+        return count
+
+    def _space_names(self) -> list[str]:
+        try:
+            return [row[0] for row in self.conn.execute("SELECT name FROM spaces")]
+        except sqlite3.OperationalError:
+            return []
+
+    def get_metadata(self) -> dict[str, str]:
+        """metadataテーブルの全項目を返す"""
+        try:
+            return dict(self.conn.execute("SELECT key, value FROM metadata"))
+        except sqlite3.OperationalError:
+            return {}
+
+    def restore_metadata(self, items: dict[str, str]) -> None:
+        """別のDBから持ち込んだmetadataを書き込む
+
+        ANNインデックスの項目はファイルを伴うため書き込まない（build_ann()で作り直す）。
+        """
+        self._set_metadata({k: v for k, v in items.items() if not k.startswith("ann_")})
+        self._load_codec()
+
+    def _get_metadata(self, key: str) -> str | None:
+        cur = self.conn.cursor()
+        try:
+            cur.execute("SELECT value FROM metadata WHERE key = ?", (key,))
             row = cur.fetchone()
             return row[0] if row else None
         except sqlite3.OperationalError:
             return None
 
+    def refresh(self) -> None:
+        """他のプロセスの書き込みを反映する
+
+        SQLiteの内容は常に最新が見えるが、numpyバックエンドの行列・HNSWインデックス・
+        圧縮辞書は読み込んだときのままなので、開いたまま検索を続けるときは検索の前に
+        呼ぶ。付随ファイルと版を比べ、変わったものだけを読み直す。書き込みに使っている
+        ストアでは呼ばない。
+        """
+        if self._matrix is not None and self._matrix.stale():
+            self._matrix = MatrixIndex(self.data_path)
+        ann_stale = self._ann is not None and self._ann.stale()
+        version = self.get_index_version()
+        if version == self._version and not ann_stale:
+            return
+        self._version = version
+        metadata = self._sidecar_metadata()
+        changed = {
+            key
+            for key in metadata.keys() | self._loaded_metadata.keys()
+            if metadata.get(key) != self._loaded_metadata.get(key)
+        }
+        self._loaded_metadata = metadata
+        if ann_stale or any(key.startswith("ann_") for key in changed):
+            self._load_ann()
+        if any(key.startswith("text_codec") for key in changed):
+            self._load_codec()
+
+    def _sidecar_metadata(self) -> dict[str, str]:
+        """HNSWインデックス・圧縮辞書の読み込みに関わるmetadata"""
+        return {
+            key: value
+            for key, value in self.get_metadata().items()
+            if key.startswith(("ann_", "text_codec"))
+        }
+
+    def get_index_version(self) -> str | None:
+        """内容が変わるたびに新しい値になるインデックスの版（検索結果のキャッシュ用）"""
+        try:
+            row = self.conn.execute("SELECT version FROM index_version").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """ブロック内の書き込みを1つのトランザクションにまとめる
+
+        例外で抜けた場合はロールバックし、numpyバックエンドの行列とANNインデックスへの
+        変更も捨てる。入れ子にした場合は外側のブロックにまとめられる。
+        """
+        if self._in_transaction:
+            yield
+            return
+        self._in_transaction = True
+        try:
+            yield
+        except BaseException:
+            self._in_transaction = False
+            self.conn.rollback()
+            self._changes = self.conn.total_changes
+            self._deferred_ann.clear()
+            if self._matrix is not None:
+                # コミット済みの内容はログまで書き出してあるので、読み直せば元に戻る
+                self._matrix = MatrixIndex(self.data_path)
+            raise
+        self._in_transaction = False
+        self._commit()
+
+    def _ann_add(self, rowids: list[int], embeddings: np.ndarray) -> None:
+        if self._in_transaction:
+            self._deferred_ann.append((rowids, embeddings))
+        else:
+            self._ann.add(rowids, embeddings)
+
+    def _ann_remove(self, rowids: list[int]) -> None:
+        if self._in_transaction:
+            self._deferred_ann.append((rowids, None))
+        else:
+            self._ann.remove(rowids)
+
+    def _commit(self) -> None:
+        """コミットする。行が変わっていればインデックスの版も新しい値にする
+
+        numpyバックエンドの行列への変更は、チャンクのコミットより先にログへ追記する。
+        途中で止まってもコミット済みのチャンクにはベクトルが残る（コミットされなかった
+        チャンクのベクトルは検索結果から外れ、同じidの追加で上書きされる）。
+        transaction()の中では何もしない。
+        """
+        if self._in_transaction:
+            return
+        if self._matrix is not None:
+            self._matrix.flush()
+        if self.conn.total_changes != self._changes:
+            self._bump_version()
+            self._unflushed = True
+        self.conn.commit()
+        self._changes = self.conn.total_changes
+        for rowids, embeddings in self._deferred_ann:
+            if embeddings is None:
+                self._ann.remove(rowids)
+            else:
+                self._ann.add(rowids, embeddings)
+        self._deferred_ann.clear()
+
+    def _bump_version(self) -> None:
+        # カウンタではなく乱数にするので、作り直したDBと版の値が重なることはない。
+        # DBごとの値なのでmetadataには入れない（エクスポート・結合で持ち回らない）
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS index_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO index_version (id, version) VALUES (1, ?)",
+            (uuid.uuid4().hex,),
+        )
+
+    def _set_metadata(self, items: dict[str, str]) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+            list(items.items()),
+        )
+        self._commit()
+
+    def _add_vector(self, cur: sqlite3.Cursor, rowid: int, embedding: np.ndarray) -> None:
+        if self._ann is not None:
+            self._ann_add([rowid], np.asarray(embedding)[None, :])
+        if self._matrix is not None:
+            self._matrix.add(rowid, embedding)
+        else:
+            cur.execute(
+                "INSERT INTO vec_chunks (rowid, embedding) VALUES (?, ?)",
+                (rowid, _serialize_f32(embedding)),
+            )
+
     def insert(
         self,
         source_file: str,
         chunk_index: int,
         text: str,
         embedding: np.ndarray,
-    ) -> None:
-        """チャンクとembeddingを挿入する"""
+    ) -> int:
+        """チャンクとembeddingを挿入し、チャンクのidを返す"""
+        with span("store.insert", items=1):
+            cur = self.conn.cursor()
+            cur.execute(
+                "INSERT INTO chunks (source_file, chunk_index, text) VALUES (?, ?, ?)",
+                (source_file, chunk_index, self._encode_text(text)),
+            )
+            rowid = cur.lastrowid
+            self._add_vector(cur, rowid, embedding)
+            self._commit()
+        return rowid
+
+    def insert_many(
+        self, rows: Iterable[tuple[str, int, str, np.ndarray]]
+    ) -> int:
+        """(source_file, chunk_index, text, embedding) の列を1トランザクションで挿入する"""
+        return len(self.insert_batch(rows))
+
+    def insert_batch(
+        self, rows: Iterable[tuple[str, int, str, np.ndarray]]
+    ) -> list[int]:
+        """insert_manyと同じく1トランザクションで挿入し、振られたidを順に返す"""
+        with span("store.insert") as s:
+            cur = self.conn.cursor()
+            ids = []
+            for source_file, chunk_index, text, embedding in rows:
+                cur.execute(
+                    "INSERT INTO chunks (source_file, chunk_index, text) VALUES (?, ?, ?)",
+                    (source_file, chunk_index, self._encode_text(text)),
+                )
+                self._add_vector(cur, cur.lastrowid, embedding)
+                ids.append(cur.lastrowid)
+            self._commit()
+        s.add(items=len(ids))
+        return ids
+
+    def iter_rows(self, batch_size: int = 4096, *, by_source: bool = False) -> Iterator[RowBatch]:
+        """全チャンクをid順（by_source=Trueならファイル・チャンク順）にembeddingつきで返す"""
+        positions: dict[int, int] | None = None
+        if self._matrix is not None:
+            matrix_ids, matrix_vectors = self._matrix.arrays()
+            positions = {int(rowid): i for i, rowid in enumerate(matrix_ids)}
+
+        for batch_ids in self._id_batches(batch_size, by_source):
+            placeholders = ",".join("?" * len(batch_ids))
+            by_id = {
+                row[0]: row
+                for row in self.conn.execute(
+                    f"""
+                    SELECT id, source_file, chunk_index, text FROM chunks
+                    WHERE id IN ({placeholders})
+                    """,
+                    batch_ids,
+                )
+            }
+            rows = [by_id[i] for i in batch_ids]
+
+            ids = np.array(batch_ids, dtype=np.int64)
+            if positions is not None:
+                embeddings = matrix_vectors[[positions[int(i)] for i in ids]]
+            else:
+                blobs = self._vec_blobs("vec_chunks", ids)
+                embeddings = np.stack(
+                    [np.frombuffer(blobs[int(i)], dtype=np.float32) for i in ids]
+                )
+            yield RowBatch(
+                ids=ids,
+                source_files=[row[1] for row in rows],
+                chunk_indexes=[row[2] for row in rows],
+                texts=[self._decode_text(row[3]) for row in rows],
+                embeddings=embeddings,
+            )
+
+    def _id_batches(self, batch_size: int, by_source: bool) -> Iterator[list[int]]:
+        if by_source:
+            # idx_chunks_sourceだけで並べられる（idは索引のエントリに含まれる）
+            ids = [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT id FROM chunks ORDER BY source_file, chunk_index, id"
+                )
+            ]
+            for start in range(0, len(ids), batch_size):
+                yield ids[start : start + batch_size]
+            return
+
+        last_id = 0
+        while True:
+            ids = [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT id FROM chunks WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                )
+            ]
+            if not ids:
+                return
+            last_id = ids[-1]
+            yield ids
+
+    def load_rows(self, batch: RowBatch) -> int:
+        """idを保ったままチャンクとembeddingをまとめて書き込む"""
         cur = self.conn.cursor()
-        cur.execute(
-            "INSERT INTO chunks (source_file, chunk_index, text) VALUES (?, ?, ?)",
-            (source_file, chunk_index, text),
+        cur.executemany(
+            "INSERT INTO chunks (id, source_file, chunk_index, text) VALUES (?, ?, ?, ?)",
+            zip(
+                batch.ids.tolist(),
+                batch.source_files,
+                batch.chunk_indexes,
+                (self._encode_text(t) for t in batch.texts),
+            ),
         )
-        rowid = cur.lastrowid
-        cur.execute(
-            "INSERT INTO vec_chunks (rowid, embedding) VALUES (?, ?)",
-            (rowid, _serialize_f32(embedding)),
+        embeddings = np.ascontiguousarray(batch.embeddings, dtype=np.float32)
+        if self._matrix is not None:
+            for rowid, embedding in zip(batch.ids.tolist(), embeddings):
+                self._matrix.add(rowid, embedding)
+        else:
+            cur.executemany(
+                "INSERT INTO vec_chunks (rowid, embedding) VALUES (?, ?)",
+                ((rowid, emb.tobytes()) for rowid, emb in zip(batch.ids.tolist(), embeddings)),
+            )
+        if self._ann is not None:
+            self._ann_add(batch.ids.tolist(), embeddings)
+        self._commit()
+        return len(batch.ids)
+
+    def get_space_vectors(self, name: str, ids: np.ndarray) -> dict[int, np.ndarray]:
+        """空間のベクトルのうち、指定idの分を返す（未作成のidは含まない）"""
+        return {
+            rowid: np.frombuffer(blob, dtype=np.float32)
+            for rowid, blob in self._vec_blobs(f"vec_space_{name}", ids).items()
+        }
+
+    def _vec_blobs(self, table: str, ids: np.ndarray) -> dict[int, bytes]:
+        placeholders = ",".join("?" * len(ids))
+        return dict(
+            self.conn.execute(
+                f"SELECT rowid, embedding FROM {table} WHERE rowid IN ({placeholders})",
+                ids.tolist(),
+            )
         )
-        self.conn.commit()
+
+    def delete_source(self, source_file: str) -> int:
+        """指定ファイルのチャンクとembeddingを削除する
+
+        重複として他のファイルにも出現するチャンクは、削除せずにその出現位置を
+        代表に繰り上げる。削除したチャンク数を返す。
+        """
+        return len(self.delete_source_chunks(source_file))
+
+    def delete_source_chunks(self, source_file: str) -> list[int]:
+        """delete_source()と同じく削除し、削除したチャンクのidを返す"""
+        cur = self.conn.cursor()
+        ids = [
+            row[0]
+            for row in cur.execute(
+                "SELECT id FROM chunks WHERE source_file = ?", (source_file,)
+            )
+        ]
+        if self._has_table("duplicates"):
+            cur.execute("DELETE FROM duplicates WHERE source_file = ?", (source_file,))
+            promoted = self._promote_duplicates(cur, ids)
+            ids = [i for i in ids if i not in promoted]
+        if self._ann is not None:
+            self._ann_remove(ids)
+        if self._matrix is not None:
+            self._matrix.remove(ids)
+        else:
+            cur.executemany(
+                "DELETE FROM vec_chunks WHERE rowid = ?", [(i,) for i in ids]
+            )
+        for name in self._space_names():
+            cur.executemany(
+                f"DELETE FROM vec_space_{name} WHERE rowid = ?", [(i,) for i in ids]
+            )
+        cur.execute("DELETE FROM chunks WHERE source_file = ?", (source_file,))
+        self._commit()
+        return ids
+
+    @staticmethod
+    def _promote_duplicates(cur: sqlite3.Cursor, ids: list[int]) -> set[int]:
+        """残っている重複の出現位置を代表チャンクの位置に繰り上げる"""
+        promoted: set[int] = set()
+        for chunk_id in ids:
+            row = cur.execute(
+                """
+                SELECT rowid, source_file, chunk_index FROM duplicates
+                WHERE chunk_id = ? ORDER BY rowid LIMIT 1
+                """,
+                (chunk_id,),
+            ).fetchone()
+            if row is None:
+                continue
+            cur.execute(
+                "UPDATE chunks SET source_file = ?, chunk_index = ? WHERE id = ?",
+                (row[1], row[2], chunk_id),
+            )
+            cur.execute("DELETE FROM duplicates WHERE rowid = ?", (row[0],))
+            promoted.add(chunk_id)
+        return promoted
+
+    def _has_table(self, name: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone()
+        return row is not None
+
+    def _encode_text(self, text: str) -> str | bytes:
+        return self._codec.compress(text) if self._codec is not None else text
+
+    def _decode_text(self, value: str | bytes) -> str:
+        return self._codec.decompress(value) if self._codec is not None else value
+
+    def compress_texts(
+        self, *, level: int = DEFAULT_LEVEL, dict_size: int = DEFAULT_DICT_SIZE
+    ) -> tuple[int, int]:
+        """格納済みテキストから辞書を学習し、全行を圧縮し直す
+
+        (圧縮前の合計バイト数, 圧縮後の合計バイト数) を返す。
+        """
+        rows = [
+            (rowid, self._decode_text(value))
+            for rowid, value in self.conn.execute("SELECT id, text FROM chunks")
+        ]
+        codec = TextCodec.train([text for _, text in rows], dict_size=dict_size, level=level)
+
+        encoded = [(codec.compress(text), rowid) for rowid, text in rows]
+        self.conn.executemany("UPDATE chunks SET text = ? WHERE id = ?", encoded)
+        self._codec = codec
+        self._set_metadata(
+            {
+                "text_codec": "zstd",
+                "text_codec_level": str(level),
+                "text_codec_dict": base64.b64encode(codec.dictionary or b"").decode("ascii"),
+            }
+        )
+        # 空いたページを解放してファイルを縮める
+        self.conn.execute("VACUUM")
+
+        before = sum(len(text.encode("utf-8")) for _, text in rows)
+        after = sum(len(blob) for blob, _ in encoded)
+        return before, after
+
+    def build_ann(
+        self, *, m: int = DEFAULT_M, ef_construction: int = DEFAULT_EF_CONSTRUCTION
+    ) -> int:
+        """格納済みの全ベクトルからHNSWインデックスを作り直す"""
+        ids, vectors = self._all_vectors()
+        if len(ids) == 0:
+            raise ValueError("インデックス化されたベクトルがありません")
+
+        ann_path = self.data_path.with_name(self.data_path.name + ".hnsw")
+        ann_path.unlink(missing_ok=True)
+        ann = HnswIndex(
+            self.data_path, vectors.shape[1], m=m, ef_construction=ef_construction
+        )
+        ann.add(ids.tolist(), vectors)
+        ann.save()
+
+        self._ann = ann
+        self._set_metadata(
+            {"ann_index": "hnsw", "ann_dim": str(vectors.shape[1]), "ann_deleted": "0"}
+        )
+        return len(ids)
+
+    def _all_vectors(self) -> tuple[np.ndarray, np.ndarray]:
+        """(rowid配列, ベクトル行列) を返す"""
+        if self._matrix is not None:
+            return self._matrix.arrays()
+
+        rows = self.conn.execute("SELECT rowid, embedding FROM vec_chunks").fetchall()
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        vectors = np.array(
+            [np.frombuffer(row[1], dtype=np.float32) for row in rows], dtype=np.float32
+        )
+        return ids, vectors
 
     def search(
-        self, query_embedding: np.ndarray, top_k: int = 20
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 20,
+        *,
+        exact: bool = False,
+        ef_search: int | None = None,
+        space: str | None = None,
+    ) -> list[dict]:
+        """コサイン類似度で上位k件を検索する
+
+        HNSWインデックスがあれば近似検索し、exact=Trueなら常に全件を走査する。
+        spaceを指定するとその名前付き埋め込み空間を全件走査する。
+        """
+        with span("store.search", queries=1) as s, STAGE_SECONDS.time(stage="vector_search"):
+            if space is not None:
+                if self.get_space(space) is None:
+                    raise ValueError(f"埋め込み空間が見つかりません: {space}")
+                results = self._search_vec_table(f"vec_space_{space}", query_embedding, top_k)
+            else:
+                hits = None
+                if self._ann is not None and not exact:
+                    try:
+                        hits = self._ann.search(query_embedding, top_k, ef_search=ef_search)
+                    except RuntimeError:
+                        # 読み込んだファイルと削除数の組が合わない場合（開く途中で
+                        # build_ann()で作り直された等）。この検索は全件走査で答える
+                        hits = None
+                if hits is None and self._matrix is not None:
+                    hits = self._matrix.search(query_embedding, top_k)
+                if hits is not None:
+                    results = self._fetch_hits(hits)
+                else:
+                    results = self._search_vec_table("vec_chunks", query_embedding, top_k)
+            results = self._attach_duplicates(results)
+        s.add(items=len(results))
+        STAGE_ITEMS.inc(len(results), stage="vector_search")
+        return results
+
+    def _search_vec_table(
+        self, table: str, query_embedding: np.ndarray, top_k: int
     ) -> list[dict]:
-        """コサイン類似度で上位k件を検索する"""
+        """sqlite-vecのvec0テーブルでKNN検索する"""
         cur = self.conn.cursor()
         rows = cur.execute(
-            """
+            f"""
             SELECT
                 v.rowid,
                 v.distance,
                 c.source_file,
                 c.chunk_index,
                 c.text
-            FROM vec_chunks v
+            FROM {table} v
             INNER JOIN chunks c ON c.id = v.rowid
             WHERE v.embedding MATCH ?
+                AND k = ?
             ORDER BY v.distance
-            LIMIT ?
             """,
             (_serialize_f32(query_embedding), top_k),
         ).fetchall()
@@ -122,10 +917,161 @@ class VectorStore:
                     "distance": row[1],
                     "source_file": row[2],
                     "chunk_index": row[3],
-                    "text": row[4],
+                    "text": self._decode_text(row[4]),
                 }
             )
         return results
 
+    def _fetch_hits(self, hits: list[tuple[int, float]]) -> list[dict]:
+        """(rowid, 距離) の列に対応するテキストだけをchunksから引く"""
+        if not hits:
+            return []
+
+        placeholders = ",".join("?" * len(hits))
+        rows = self.conn.execute(
+            f"SELECT id, source_file, chunk_index, text FROM chunks WHERE id IN ({placeholders})",
+            [rowid for rowid, _ in hits],
+        ).fetchall()
+        by_id = {row[0]: row for row in rows}
+
+        return [
+            {
+                "id": rowid,
+                "distance": distance,
+                "source_file": by_id[rowid][1],
+                "chunk_index": by_id[rowid][2],
+                "text": self._decode_text(by_id[rowid][3]),
+            }
+            for rowid, distance in hits
+            if rowid in by_id
+        ]
+
+    def storage_stats(self) -> dict[str, float]:
+        """DBの物理的な状態
+
+        chunks: チャンク数
+        free_bytes: 未使用ページの合計バイト数
+        locality: 同じファイルの隣り合うチャンクのうち、idも連続している割合
+        vec_chunk_size: vec_chunksのchunk_size（指定していなければsqlite-vecの既定値）
+        """
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        free_pages = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        (locality,) = self.conn.execute(
+            """
+            SELECT AVG(id - previous = 1) FROM (
+                SELECT id, LAG(id) OVER (
+                    PARTITION BY source_file ORDER BY chunk_index, id
+                ) AS previous
+                FROM chunks
+            )
+            WHERE previous IS NOT NULL
+            """
+        ).fetchone()
+        row = self.conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'vec_chunks'"
+        ).fetchone()
+        match = re.search(r"chunk_size\s*=\s*(\d+)", row[0]) if row else None
+        (chunks,) = self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()
+        return {
+            "chunks": chunks,
+            "free_bytes": page_size * free_pages,
+            "locality": 1.0 if locality is None else float(locality),
+            "vec_chunk_size": int(match.group(1)) if match else VEC0_DEFAULT_CHUNK_SIZE,
+        }
+
+    def sample_embeddings(self, count: int) -> np.ndarray:
+        """無作為に選んだcount件までのチャンクのembeddingを返す"""
+        ids = np.array(
+            [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT id FROM chunks ORDER BY random() LIMIT ?", (count,)
+                )
+            ],
+            dtype=np.int64,
+        )
+        if len(ids) == 0:
+            return np.empty((0, 0), dtype=np.float32)
+        if self._matrix is not None:
+            matrix_ids, matrix_vectors = self._matrix.arrays()
+            positions = {int(rowid): i for i, rowid in enumerate(matrix_ids)}
+            return np.array(matrix_vectors[[positions[int(i)] for i in ids]], dtype=np.float32)
+        blobs = self._vec_blobs("vec_chunks", ids)
+        return np.stack([np.frombuffer(blobs[int(i)], dtype=np.float32) for i in ids])
+
+    def compact(self) -> None:
+        """未使用ページを詰めて表ごとに連続させ（VACUUM）、統計を取り直す（ANALYZE）"""
+        self.flush()
+        if self._matrix is not None:
+            self._matrix.compact()
+        self.conn.execute("VACUUM")
+        self.conn.execute("ANALYZE")
+
+    def flush(self) -> None:
+        """ANNインデックスへの変更をファイルに書き出す
+
+        開いたまま更新を続けるとき、他プロセスの検索に反映するために呼ぶ。
+        numpyバックエンドの行列はコミットごとに書き出している。
+        """
+        if self._ann is not None and self._ann.dirty:
+            self._set_metadata({"ann_deleted": str(self._ann.deleted)})
+            self._ann.save()
+        if self._matrix is not None:
+            self._matrix.flush()
+        if self._unflushed and self._ann is not None:
+            # 書き出す前の付随ファイルで検索した結果をキャッシュに残さないよう、版を改める
+            self._bump_version()
+            self.conn.commit()
+            self._changes = self.conn.total_changes
+        self._unflushed = False
+
     def close(self) -> None:
+        self.flush()
         self.conn.close()
+
+
+def staging_path(db_path: Path) -> Path:
+    """再構築用の新しい版のDBパス（<db>.<タイムスタンプ>）を返す"""
+    db_path = Path(db_path)
+    return db_path.with_name(f"{db_path.name}.{time.time_ns()}")
+
+
+def swap_in(db_path: Path, staged: Path) -> None:
+    """構築済みの版をdb_pathに原子的に差し替える
+
+    db_pathは各版を指すシンボリックリンクとし、リンクをos.replaceで置き換える。
+    版ごとに-wal/-shmや付随ファイルが分かれるので、検索中のプロセスは開いている
+    旧版をそのまま読み続け、新たに開くプロセスからは新しい版が見える。
+    開いているプロセスは-wal/-shmや.hnsw等を後から開き直すことがあるため、直前の
+    版は付随ファイルごと残し（``.<db>.prev``が指す）、次に差し替えたときに削除する。
+    つまり版は現在と直前の2つまで残り、直前の版を開いているプロセスは次の差し替え
+    までに閉じればよい。
+    """
+    db_path = Path(db_path)
+    staged = Path(staged)
+    previous = db_path.resolve() if db_path.is_symlink() else None
+    prev_link = db_path.with_name(f".{db_path.name}.prev")
+    expired = prev_link.resolve() if prev_link.is_symlink() else None
+
+    link = db_path.with_name(f".{db_path.name}.link")
+    link.unlink(missing_ok=True)
+    os.symlink(staged.name, link)
+    os.replace(link, db_path)
+
+    if previous is None or previous == staged.resolve():
+        return
+    link.unlink(missing_ok=True)
+    os.symlink(previous.name, link)
+    os.replace(link, prev_link)
+
+    if expired is not None and expired not in (previous, staged.resolve()):
+        expired.unlink(missing_ok=True)
+        _remove_sidecars(expired)
+    # db_pathが通常ファイルだったころの付随ファイル（置き換えた時点で直前の版になり、
+    # ここで2つ前になった）。リンクになってからは開くときに版のパスへ解決されるので使われない
+    _remove_sidecars(db_path)
+
+
+def _remove_sidecars(path: Path) -> None:
+    for suffix in SIDECAR_SUFFIXES:
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+
+from embs.fetchers.base import Document
+from embs.indexer.chunker import ChunkSizing
+from embs.indexer.dedup import Deduplicator
+from embs.indexer.pipeline import index_documents
+from embs.indexer.store import VectorStore
+
+DEFAULT_DEBOUNCE = 1.0
+DEFAULT_POLL_INTERVAL = 1.0
+# 変更が続いてもこの倍数×debounce秒たてば反映する
+MAX_DELAY_FACTOR = 10
+# 個々のファイルを特定できない変更（ディレクトリの移動・イベントの取りこぼし）
+RESCAN = "/"
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+
+def _is_markdown(name: str) -> bool:
+    return name.endswith(".md")
+
+
+def _scan(root: Path) -> dict[str, tuple[int, int]]:
+    """root以下の*.mdの {相対パス: (mtime_ns, サイズ)}"""
+    found: dict[str, tuple[int, int]] = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif _is_markdown(entry.name) and entry.is_file():
+                    st = entry.stat()
+                    relative = Path(entry.path).relative_to(root).as_posix()
+                    found[relative] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                continue
+    return found
+
+
+class PollingWatcher:
+    """一定間隔でディレクトリを走査し、mtimeとサイズが変わった*.mdを返す"""
+
+    def __init__(self, root: Path, interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        self.root = Path(root)
+        self.interval = interval
+        self._snapshot = _scan(self.root)
+        self._last = time.monotonic()
+
+    def poll(self, timeout: float | None = None) -> set[str]:
+        """次の走査まで（最大timeout秒）待ち、変更・追加・削除された相対パスを返す"""
+        wait = self._last + self.interval - time.monotonic()
+        if timeout is not None:
+            wait = min(wait, timeout)
+        if wait > 0:
+            time.sleep(wait)
+        if time.monotonic() < self._last + self.interval:
+            return set()
+
+        current = _scan(self.root)
+        self._last = time.monotonic()
+        changed = {
+            path
+            for path in current.keys() | self._snapshot.keys()
+            if current.get(path) != self._snapshot.get(path)
+        }
+        self._snapshot = current
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Linuxのinotifyでディレクトリ以下の*.mdの書き込み・移動・削除を受け取る
+
+    サブディレクトリごとに監視を登録し、新しく作られたディレクトリも追加する。
+    """
+
+    # イベントは届いた時点で読めるので、走査の間隔はない
+    interval = 0.0
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1に失敗しました")
+        self._dirs: dict[int, Path] = {}
+        self._buffer = b""
+        self._add_tree(self.root)
+
+    def _add_tree(self, directory: Path) -> set[str]:
+        """directory以下を監視に加え、既にある*.mdの相対パスを返す"""
+        existing: set[str] = set()
+        for current, _, filenames in os.walk(directory):
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(current), _WATCH_MASK
+            )
+            if wd >= 0:
+                self._dirs[wd] = Path(current)
+            existing.update(
+                (Path(current) / f).relative_to(self.root).as_posix()
+                for f in filenames
+                if _is_markdown(f)
+            )
+        return existing
+
+    def poll(self, timeout: float | None = None) -> set[str]:
+        """イベントを最大timeout秒待ち、変更・追加・削除された相対パスを返す"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            self._buffer += os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed: set[str] = set()
+        offset = 0
+        while offset + _EVENT.size <= len(self._buffer):
+            wd, mask, _, length = _EVENT.unpack_from(self._buffer, offset)
+            end = offset + _EVENT.size + length
+            if end > len(self._buffer):
+                break
+            name = self._buffer[offset + _EVENT.size : end].rstrip(b"\0")
+            offset = end
+
+            if mask & _IN_Q_OVERFLOW:
+                # 取りこぼしがあるので全ファイルを変更扱いにし、削除も確認し直す
+                changed.update(_scan(self.root))
+                changed.add(RESCAN)
+                continue
+            if mask & _IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    changed.update(self._add_tree(path))
+                elif mask & _IN_MOVED_FROM:
+                    # 中にあったファイルはもう分からないので、インデックスと突き合わせる
+                    changed.add(RESCAN)
+                continue
+            if _is_markdown(path.name):
+                changed.add(path.relative_to(self.root).as_posix())
+        self._buffer = self._buffer[offset:]
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+def _load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    for name in ("inotify_init1", "inotify_add_watch"):
+        if not hasattr(libc, name):
+            raise OSError(f"{name}が使えません")
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def open_watcher(
+    root: Path, *, polling: bool = False, interval: float = DEFAULT_POLL_INTERVAL
+) -> InotifyWatcher | PollingWatcher:
+    """使えればinotify、使えなければ（またはpolling=True）ポーリングで監視する"""
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root)
+        except OSError:
+            pass
+    return PollingWatcher(root, interval)
+
+
+def collect_changes(
+    watcher: InotifyWatcher | PollingWatcher,
+    debounce: float = DEFAULT_DEBOUNCE,
+    *,
+    timeout: float | None = None,
+) -> set[str]:
+    """変更を待ち、debounce秒静かになるまでの変更をまとめて返す
+
+    変更が途切れなくても、最初の変更からMAX_DELAY_FACTOR×debounce秒で打ち切る。
+    timeout秒待っても変更がなければ空集合を返す。ポーリングでは走査の間隔より
+    短い静止時間は判定できないので、debounceは走査間隔以上として扱う。
+    """
+    debounce = max(debounce, watcher.interval)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    changes: set[str] = set()
+    while not changes:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            return changes
+        changes |= watcher.poll(remaining if remaining is not None else 1.0)
+
+    until = time.monotonic() + debounce * MAX_DELAY_FACTOR
+    while (remaining := until - time.monotonic()) > 0:
+        more = watcher.poll(min(debounce, remaining))
+        if not more:
+            break
+        changes |= more
+    return changes
+
+
+@dataclass
+class WatchStats:
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    chunks: int = 0
+
+
+class IncrementalIndexer:
+    """変更のあったファイルだけを再チャンキング・再embeddingする
+
+    インデックスのsource_fileはファイル名部分なので、同名のファイルはまとめて
+    入れ替える（全件のembs indexと同じ結果になる）。内容が前回反映時と同じなら
+    何もしない。ファイル名ごとに古いチャンクの削除と新しいチャンクの追加を
+    1つのトランザクションで行うので、検索から文書が消えたり途中までしか
+    見えなかったりすることはない。最後にANNインデックス等を書き出す。
+
+    ファイル名ごとの相対パスは起動時に1回だけ走査し、以降は変更のあったパスだけを
+    statして更新する（RESCANのときは走査し直す）。
+    deduplicatorを渡すと重複チャンクを代表にまとめる。既存のチャンクは起動時に
+    登録し、削除したチャンクは判定の対象から外す。
+    """
+
+    def __init__(
+        self,
+        docs_dir: Path,
+        store: VectorStore,
+        embedder,
+        *,
+        batch_size: int = 32,
+        sizing: ChunkSizing | None = None,
+        deduplicator: Deduplicator | None = None,
+        on_document: Callable[[Document], None] | None = None,
+    ) -> None:
+        self.docs_dir = Path(docs_dir)
+        self.store = store
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.sizing = sizing
+        self.deduplicator = deduplicator
+        self.on_document = on_document
+        self._digests: dict[str, str] = {}
+        self._paths: dict[str, set[str]] = {}
+        self._rescan()
+        if deduplicator is not None:
+            for batch in store.iter_rows():
+                for chunk_id, text in zip(batch.ids.tolist(), batch.texts):
+                    deduplicator.add(chunk_id, text)
+
+    def apply(self, paths: set[str]) -> WatchStats:
+        """変更のあった相対パスをインデックスに反映する
+
+        RESCANを含む場合は、ディスクにないsource_fileをインデックスから削除する。
+        """
+        names = {PurePosixPath(p).name for p in paths if _is_markdown(p)}
+        if RESCAN in paths:
+            self._rescan()
+            names |= {name for name in self.store.list_sources() if name not in self._paths}
+        else:
+            for path in paths:
+                if _is_markdown(path):
+                    self._update_path(path)
+
+        stats = WatchStats()
+        for name in sorted(names):
+            group = self._read(sorted(self._paths.get(name, ())))
+            if not group:
+                with self.store.transaction():
+                    deleted = self.store.delete_source_chunks(name)
+                if self.deduplicator is not None:
+                    self.deduplicator.remove(deleted)
+                if deleted:
+                    stats.deleted += 1
+                self._digests.pop(name, None)
+                continue
+            digest = hashlib.sha1(
+                "\0".join(f"{doc.name}\0{doc.text}" for doc in group).encode("utf-8")
+            ).hexdigest()
+            if self._digests.get(name) == digest:
+                stats.unchanged += 1
+                continue
+
+            with self.store.transaction():
+                deleted = self.store.delete_source_chunks(name)
+                if self.deduplicator is not None:
+                    self.deduplicator.remove(deleted)
+                result = index_documents(
+                    group,
+                    self.store,
+                    self.embedder,
+                    batch_size=self.batch_size,
+                    sizing=self.sizing,
+                    deduplicator=self.deduplicator,
+                    on_document=self.on_document,
+                )
+            self._digests[name] = digest
+            stats.updated += result.documents
+            stats.chunks += result.chunks
+        self.store.flush()
+        return stats
+
+    def _rescan(self) -> None:
+        self._paths = {}
+        for path in _scan(self.docs_dir):
+            self._paths.setdefault(PurePosixPath(path).name, set()).add(path)
+
+    def _update_path(self, path: str) -> None:
+        name = PurePosixPath(path).name
+        group = self._paths.setdefault(name, set())
+        if (self.docs_dir / path).is_file():
+            group.add(path)
+        else:
+            group.discard(path)
+            if not group:
+                del self._paths[name]
+
+    def _read(self, paths: list[str]) -> list[Document]:
+        documents = []
+        for path in paths:
+            try:
+                text = (self.docs_dir / path).read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError):
+                # 書き込み途中・直後に削除されたファイルは次の変更で拾う
+                continue
+            documents.append(Document(id=path, name=path, text=text))
+        return documents
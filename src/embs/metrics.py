@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import bisect
+import math
+import signal
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 秒単位のレイテンシ用
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} のラベルは {self.label_names} です: {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        """HELP・TYPE行に続くサンプル行"""
+
+
+class Counter(_Metric):
+    """単調増加するカウンタ"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}"
+            for k, v in items
+        ]
+
+
+class Gauge(_Metric):
+    """任意の値をとる計測値"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}"
+            for k, v in items
+        ]
+
+
+class Histogram(_Metric):
+    """固定バケットのヒストグラム"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [各バケットの件数..., +Inf], 合計, 件数
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, totals = self._values.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0, 0])
+            )
+            counts[i] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """with文の中の経過秒数を記録する"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return int(entry[1][1]) if entry else 0
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(
+                (k, (list(counts), list(totals))) for k, (counts, totals) in self._values.items()
+            )
+        lines = []
+        for key, (counts, (total, n)) in items:
+            cumulative = 0
+            for bound, c in zip((*self.buckets, math.inf), counts):
+                cumulative += c
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {int(n)}")
+        return lines
+
+
+class Registry:
+    """メトリクスの登録先。同じ名前で登録すると既存のものを返す"""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labels)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram, name, help, labels, buckets=buckets)
+
+    def _register(self, cls, name: str, help: str, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+            elif not isinstance(metric, cls) or metric.label_names != tuple(labels):
+                raise ValueError(f"メトリクス {name} は別の型・ラベルで登録済みです")
+            return metric
+
+    def render(self) -> str:
+        """Prometheusのテキスト形式で全メトリクスを返す"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = [line for metric in metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+QUERIES = REGISTRY.counter("embs_queries_total", "検索クエリ数")
+QUERY_SECONDS = REGISTRY.histogram("embs_query_seconds", "検索1回あたりの所要時間（秒）")
+STAGE_SECONDS = REGISTRY.histogram(
+    "embs_stage_seconds", "段階 (embed / vector_search / rerank) ごとの所要時間（秒）", ("stage",)
+)
+STAGE_ITEMS = REGISTRY.counter(
+    "embs_stage_items_total", "段階ごとに処理したテキスト・候補の件数", ("stage",)
+)
+CANDIDATES = REGISTRY.histogram(
+    "embs_search_candidates",
+    "ベクトル検索で得た候補数",
+    buckets=(0, 1, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "embs_cache_requests_total", "キャッシュの参照数 (result=hit / miss)", ("cache", "result")
+)
+MODEL_LOAD_SECONDS = REGISTRY.gauge(
+    "embs_model_load_seconds", "モデルの読み込みにかかった時間（秒）", ("model",)
+)
+MODEL_LOADS = REGISTRY.counter("embs_model_loads_total", "モデルの読み込み回数", ("model",))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """キャッシュの参照結果を数える"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+@contextmanager
+def model_load(model: str) -> Iterator[None]:
+    """モデルの読み込み時間と回数を記録する"""
+    start = time.perf_counter()
+    yield
+    MODEL_LOAD_SECONDS.set(time.perf_counter() - start, model=model)
+    MODEL_LOADS.inc(model=model)
+
+
+def dump(path: Path | None = None, registry: Registry = REGISTRY) -> str:
+    """現在の値をテキスト形式でファイル（省略時は標準エラー）に書き出す"""
+    text = registry.render()
+    if path is None:
+        sys.stderr.write(text)
+    else:
+        Path(path).write_text(text, encoding="utf-8")
+    return text
+
+
+def dump_on_signal(
+    path: Path | None = None, sig: int = signal.SIGUSR1, registry: Registry = REGISTRY
+) -> None:
+    """シグナル（既定SIGUSR1）を受けたらdump()する。常駐プロセス向け"""
+    signal.signal(sig, lambda *_: dump(path, registry))
+
+
+def start_http_server(
+    port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY
+) -> ThreadingHTTPServer:
+    """/metrics でPrometheusテキスト形式を返すHTTPサーバーを別スレッドで起動する
+
+    port=0なら空いているポートを使う（server.server_portで確認できる）。
+    止めるときはserver.shutdown()を呼ぶ。
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+MODEL_DIR_ENV = "EMBS_MODEL_DIR"
+CONFIG_ENV = "EMBS_CONFIG"
+MANIFEST_NAME = "embs-manifest.json"
+
+
+def config_path() -> Path:
+    """設定ファイルのパス（$EMBS_CONFIG、なければ $XDG_CONFIG_HOME/embs/config.json）"""
+    if os.environ.get(CONFIG_ENV):
+        return Path(os.environ[CONFIG_ENV])
+    base = os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config"
+    return Path(base) / "embs" / "config.json"
+
+
+def model_dir(explicit: Path | None = None) -> Path | None:
+    """モデルのスナップショットを置くディレクトリ
+
+    引数（CLIの--model-dir）、環境変数EMBS_MODEL_DIR、設定ファイルのmodel_dirの順に
+    探し、どれもなければNone（Hugging Face Hubから取得する）。
+    """
+    if explicit is not None:
+        return Path(explicit)
+    if os.environ.get(MODEL_DIR_ENV):
+        return Path(os.environ[MODEL_DIR_ENV])
+    path = config_path()
+    if path.is_file():
+        value = json.loads(path.read_text(encoding="utf-8")).get("model_dir")
+        if value:
+            return Path(value).expanduser()
+    return None
+
+
+def snapshot_path(model_name: str, root: Path) -> Path:
+    """モデルIDに対応するスナップショットのディレクトリ (org/name → org--name)"""
+    return Path(root) / model_name.replace("/", "--")
+
+
+def resolve_model(model_name: str, root: Path | None = None) -> tuple[str, bool]:
+    """モデルの読み込み元と、ローカルのスナップショットかどうかを返す
+
+    スナップショットのディレクトリが設定されているのにモデルがなければ、
+    Hubへ問い合わせずにFileNotFoundErrorを送出する。
+    """
+    root = model_dir(root)
+    if root is None:
+        return model_name, False
+    path = snapshot_path(model_name, root)
+    if not (path / MANIFEST_NAME).is_file():
+        raise FileNotFoundError(
+            f"モデル {model_name} のスナップショットが {path} にありません"
+            f"（embs models pull {model_name} --dir {root} で取得してください）"
+        )
+    return str(path), True
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _snapshot_files(path: Path) -> list[Path]:
+    # snapshot_downloadが作る .cache/ とマニフェスト自身は対象外
+    return sorted(
+        p
+        for p in path.rglob("*")
+        if p.is_file()
+        and p.name != MANIFEST_NAME
+        and ".cache" not in p.relative_to(path).parts
+    )
+
+
+def write_manifest(path: Path, model_name: str, revision: str | None = None) -> dict:
+    """スナップショット内の各ファイルのSHA-256をマニフェストに記録する"""
+    manifest = {
+        "model": model_name,
+        "revision": revision,
+        "files": {p.relative_to(path).as_posix(): _sha256(p) for p in _snapshot_files(path)},
+    }
+    (path / MANIFEST_NAME).write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    return manifest
+
+
+def pull(model_name: str, root: Path, revision: str | None = None) -> Path:
+    """Hugging Face Hubからモデルを取得してスナップショットを作る
+
+    revisionを省略すると現在のコミットに固定して取得する。
+    """
+    from huggingface_hub import HfApi, snapshot_download
+
+    sha = HfApi().model_info(model_name, revision=revision).sha
+    path = snapshot_path(model_name, root)
+    tmp = path.with_name(path.name + ".partial")
+    shutil.rmtree(tmp, ignore_errors=True)
+    snapshot_download(model_name, revision=sha, local_dir=tmp)
+    shutil.rmtree(tmp / ".cache", ignore_errors=True)
+    write_manifest(tmp, model_name, sha)
+    shutil.rmtree(path, ignore_errors=True)
+    tmp.rename(path)
+    return path
+
+
+def verify(model_name: str, root: Path) -> list[str]:
+    """スナップショットをマニフェストと照合し、問題点のリストを返す（空なら正常）"""
+    path = snapshot_path(model_name, root)
+    manifest_file = path / MANIFEST_NAME
+    if not manifest_file.is_file():
+        return [f"マニフェストがありません: {manifest_file}"]
+
+    manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+    problems = []
+    if manifest.get("model") != model_name:
+        problems.append(f"別のモデルのスナップショットです: {manifest.get('model')}")
+    for name, digest in manifest["files"].items():
+        file = path / name
+        if not file.is_file():
+            problems.append(f"ファイルがありません: {name}")
+        elif _sha256(file) != digest:
+            problems.append(f"内容が変更されています: {name}")
+    return problems
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class SpanRecord:
+    """計測した1区間"""
+
+    name: str
+    start: float
+    duration: float
+    thread_id: int
+    counters: dict[str, int] = field(default_factory=dict)
+
+
+class _Span:
+    """有効時のspan。終了時に区間をProfilerへ記録する"""
+
+    __slots__ = ("_profiler", "_record")
+
+    def __init__(self, profiler: Profiler, name: str, counters: dict[str, int]) -> None:
+        self._profiler = profiler
+        self._record = SpanRecord(name, 0.0, 0.0, threading.get_ident(), counters)
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __enter__(self) -> _Span:
+        self._record.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._record.duration = time.perf_counter() - self._record.start
+        self._profiler.records.append(self._record)
+
+    def add(self, **counters: int) -> None:
+        """件数・トークン数・バイト数などのカウンタを加算する（区間の終了後でもよい）"""
+        for key, value in counters.items():
+            self._record.counters[key] = self._record.counters.get(key, 0) + value
+
+
+class _NullSpan:
+    """無効時のspan。何もせず、偽として評価される"""
+
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def add(self, **counters: int) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """区間ごとの所要時間とカウンタを集める
+
+    enable()で有効にしている間だけ、span()の区間がrecordsに溜まる。
+    """
+
+    def __init__(self) -> None:
+        self.records: list[SpanRecord] = []
+        self.origin = time.perf_counter()
+
+    def summary(self) -> list[dict]:
+        """区間名ごとに呼び出し回数・合計/平均/最大時間・カウンタ合計をまとめる"""
+        rows: dict[str, dict] = {}
+        for r in self.records:
+            row = rows.setdefault(
+                r.name,
+                {"name": r.name, "calls": 0, "total_s": 0.0, "max_s": 0.0, "counters": {}},
+            )
+            row["calls"] += 1
+            row["total_s"] += r.duration
+            row["max_s"] = max(row["max_s"], r.duration)
+            for key, value in r.counters.items():
+                row["counters"][key] = row["counters"].get(key, 0) + value
+        for row in rows.values():
+            row["mean_s"] = row["total_s"] / row["calls"]
+        return sorted(rows.values(), key=lambda row: row["total_s"], reverse=True)
+
+    def format_summary(self) -> str:
+        """summary()を表形式の文字列にする"""
+        lines = [
+            f"{'区間':<20}{'回数':>8}{'合計(ms)':>12}{'平均(ms)':>12}{'最大(ms)':>12}  カウンタ"
+        ]
+        for row in self.summary():
+            counters = " ".join(f"{k}={v:,}" for k, v in sorted(row["counters"].items()))
+            lines.append(
+                f"{row['name']:<20}{row['calls']:>8}{row['total_s'] * 1000:>12.2f}"
+                f"{row['mean_s'] * 1000:>12.3f}{row['max_s'] * 1000:>12.3f}  {counters}"
+            )
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict:
+        """Chrome trace形式（chrome://tracing・Perfettoで開ける）のdictを返す"""
+        pid = os.getpid()
+        events = [
+            {
+                "name": r.name,
+                "ph": "X",
+                "ts": (r.start - self.origin) * 1e6,
+                "dur": r.duration * 1e6,
+                "pid": pid,
+                "tid": r.thread_id,
+                "args": r.counters,
+            }
+            for r in self.records
+        ]
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"summary": self.summary()},
+        }
+
+
+_profiler: Profiler | None = None
+
+
+def enable() -> Profiler:
+    """計測を有効にし、記録先のProfilerを返す"""
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable() -> Profiler | None:
+    """計測を無効にし、それまでのProfilerを返す"""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def span(name: str, **counters: int) -> _Span | _NullSpan:
+    """区間を計測するコンテキストマネージャを返す
+
+    計測が無効なら何もしない共有オブジェクトを返すので、ホットパスに置いても
+    関数呼び出し1回分のコストで済む。カウンタの計算自体が重い場合は
+    ``if s:`` で有効時だけ求めて ``s.add()`` する。
+    """
+    if _profiler is None:
+        return _NULL_SPAN
+    return _Span(_profiler, name, counters)
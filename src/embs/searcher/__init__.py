@@ -1,4 +1,21 @@
-from embs.searcher.query import search
-from embs.searcher.reranker import Reranker
+from __future__ import annotations
 
-__all__ = ["search", "Reranker"]
+from typing import TYPE_CHECKING
+
+from embs._lazy import attach
+
+if TYPE_CHECKING:
+    from embs.searcher.cache import QueryCache
+    from embs.searcher.query import SearchUpdate, search, search_progressive
+    from embs.searcher.reranker import Reranker
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "QueryCache": "embs.searcher.cache",
+        "SearchUpdate": "embs.searcher.query",
+        "search": "embs.searcher.query",
+        "search_progressive": "embs.searcher.query",
+        "Reranker": "embs.searcher.reranker",
+    },
+)
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+
+from embs.metrics import record_cache
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL = 24 * 60 * 60
+# インデックスDBと同じ場所に置くキャッシュファイルの接尾辞
+CACHE_SUFFIX = ".qcache"
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"JSONにできない値です: {type(value).__name__}")
+
+
+class QueryCache:
+    """クエリのembeddingと最終結果を保存し、言い換えのクエリに結果を再利用する
+
+    新しいクエリのembeddingとのコサイン類似度がthreshold以上のクエリがあれば、
+    そのリランキング済みの結果を返す。エントリは同じ検索条件（params）かつ同じ
+    インデックスの版（VectorStore.get_index_version()）のものだけを照合するので、
+    インデックスが更新されると古い結果は使われず、次の保存時に消える。
+    最終利用からの順でmax_entries件まで、作成からttl秒まで保持する。
+
+    CLIのように検索ごとにプロセスが変わっても使えるよう、SQLiteのファイルに
+    保存する（pathに":memory:"を指定するとプロセス内だけで保持する）。
+    """
+
+    def __init__(
+        self,
+        path: Path | str = ":memory:",
+        *,
+        threshold: float = DEFAULT_THRESHOLD,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"thresholdは0より大きく1以下で指定してください: {threshold}")
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self.conn = sqlite3.connect(str(path), timeout=5.0)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                version TEXT NOT NULL,
+                params TEXT NOT NULL,
+                query TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                results TEXT NOT NULL,
+                created REAL NOT NULL,
+                used REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_entries_key ON entries (version, params)"
+        )
+        self.conn.commit()
+
+    @classmethod
+    def for_index(cls, db_path: Path, **kwargs) -> QueryCache:
+        """インデックスDB（<db>）に対応するキャッシュファイル <db>.qcache を開く"""
+        db_path = Path(db_path)
+        return cls(db_path.with_name(db_path.name + CACHE_SUFFIX), **kwargs)
+
+    def lookup(
+        self, embedding: np.ndarray, *, version: str | None, params: dict
+    ) -> list[dict] | None:
+        """類似度がthreshold以上のクエリの結果を返す（なければNone）"""
+        rows = self.conn.execute(
+            """
+            SELECT id, embedding FROM entries
+            WHERE version = ? AND params = ? AND created >= ?
+            """,
+            (str(version), _params_key(params), self._clock() - self.ttl),
+        ).fetchall()
+        query = _normalize(embedding)
+        best_id = None
+        if rows:
+            matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+            if matrix.shape[1] == len(query):
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    best_id = rows[best][0]
+        record_cache("query", hit=best_id is not None)
+        if best_id is None:
+            return None
+
+        (results,) = self.conn.execute(
+            "SELECT results FROM entries WHERE id = ?", (best_id,)
+        ).fetchone()
+        try:
+            self.conn.execute(
+                "UPDATE entries SET used = ? WHERE id = ?", (self._clock(), best_id)
+            )
+            self.conn.commit()
+        except sqlite3.OperationalError:
+            self.conn.rollback()
+        return json.loads(results)
+
+    def store(
+        self,
+        query: str,
+        embedding: np.ndarray,
+        results: list[dict],
+        *,
+        version: str | None,
+        params: dict,
+    ) -> None:
+        """結果を保存し、古い版・期限切れ・上限を超えた分を消す
+
+        キャッシュは検索を速くするためのものなので、他のプロセスが書き込み中で
+        ロックを取れない場合などは保存せずに戻る。
+        """
+        now = self._clock()
+        try:
+            self.conn.execute(
+                "DELETE FROM entries WHERE version != ? OR created < ?",
+                (str(version), now - self.ttl),
+            )
+            self.conn.execute(
+                """
+                INSERT INTO entries (version, params, query, embedding, results, created, used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    str(version),
+                    _params_key(params),
+                    query,
+                    _normalize(embedding).tobytes(),
+                    json.dumps(results, ensure_ascii=False, default=_json_default),
+                    now,
+                    now,
+                ),
+            )
+            self.conn.execute(
+                """
+                DELETE FROM entries WHERE id NOT IN (
+                    SELECT id FROM entries ORDER BY used DESC, id DESC LIMIT ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self.conn.commit()
+        except sqlite3.OperationalError:
+            self.conn.rollback()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def clear(self) -> None:
+        self.conn.execute("DELETE FROM entries")
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _normalize(embedding: np.ndarray) -> np.ndarray:
+    vec = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm > 0 else vec
+
+
+def _params_key(params: dict) -> str:
+    return json.dumps(params, sort_keys=True, ensure_ascii=False)
@@ -1,11 +1,106 @@
 from __future__ import annotations
 
+import sqlite3
 import sys
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
 from pathlib import Path
 
 from embs.indexer.embedder import Embedder, MODEL_NAME
 from embs.indexer.store import VectorStore
-from embs.searcher.reranker import Reranker
+from embs.metrics import CANDIDATES, QUERIES, QUERY_SECONDS
+from embs.searcher.cache import QueryCache
+from embs.searcher.reranker import DEFAULT_BATCH_SIZE, DEFAULT_MAX_LENGTH, Reranker
+from embs.searcher.reranker import MODEL_NAME as RERANKER_MODEL_NAME
+
+# 同じ設定のembedding・rerankerはプロセス内で使い回す（キー: クラスと引数）
+_MODELS: dict[tuple, object] = {}
+_MODELS_LOCK = threading.Lock()
+
+
+def _shared(cls, **kwargs):
+    """clsのインスタンスを引数ごとに1つだけ作って返す
+
+    長く動くプロセスから繰り返し検索するとき、モデルの読み込みを1回で済ませ、
+    Rerankerのスコアのキャッシュも検索をまたいで効くようにする。
+    """
+    key = (cls, tuple(sorted(kwargs.items())))
+    with _MODELS_LOCK:
+        model = _MODELS.get(key)
+        if model is None:
+            model = _MODELS[key] = cls(**kwargs)
+    return model
+
+
+def release_models() -> None:
+    """使い回しているモデルと開いたままのインデックスDBを手放す（メモリを空けたいとき）"""
+    with _MODELS_LOCK:
+        _MODELS.clear()
+        stores = [store for store, _ in _STORES.values()]
+        _STORES.clear()
+    for store in stores:
+        try:
+            store.close()
+        except sqlite3.ProgrammingError:
+            # 別のスレッドで開いた接続は閉じられない（参照がなくなれば閉じられる）
+            pass
+
+
+# インデックスDBもプロセス内で開いたまま使い回す（キー: DBのパスとスレッド）。
+# sqlite3の接続は開いたスレッドでしか使えないため、スレッドごとに持つ
+_STORES: dict[tuple[Path, int], tuple[VectorStore, tuple]] = {}
+
+
+def shared_store(db_path: Path) -> VectorStore:
+    """db_pathのVectorStoreを検索をまたいで使い回す
+
+    開くたびにHNSWインデックスを読み込み直さないよう、同じDBは開いたままにする。
+    他のプロセスの書き込みはrefresh()で反映し、swap_in()での差し替えや
+    作り直しでDBファイル自体が変わっていれば開き直す。
+    """
+    key = (Path(db_path).absolute(), threading.get_ident())
+    identity = _file_identity(db_path)
+    with _MODELS_LOCK:
+        entry = _STORES.pop(key, None)
+    if entry is not None and entry[1] != identity:
+        entry[0].close()
+        entry = None
+    if entry is None:
+        entry = (VectorStore(db_path), identity)
+    else:
+        entry[0].refresh()
+    with _MODELS_LOCK:
+        _STORES[key] = entry
+    return entry[0]
+
+
+def _file_identity(db_path: Path) -> tuple:
+    """シンボリックリンクを解決したDBファイルと、そのinode"""
+    path = Path(db_path).resolve()
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return (path, None)
+    return (path, st.st_dev, st.st_ino)
+
+
+@dataclass
+class SearchUpdate:
+    """段階的な検索の途中経過
+
+    stageは "vector"（ベクトル検索の上位）、"partial"（途中までのリランキング）、
+    "reranked"（最終結果）のいずれか。elapsedは検索開始からの秒数。
+    """
+
+    stage: str
+    results: list[dict]
+    elapsed: float
+
+    @property
+    def final(self) -> bool:
+        return self.stage == "reranked"
 
 
 def search(
@@ -13,31 +108,212 @@ def search(
     db_path: Path,
     top_k: int = 5,
     initial_k: int = 20,
+    *,
+    exact: bool = False,
+    ef_search: int | None = None,
+    candidate_space: str | None = None,
+    rerank_batch_size: int = DEFAULT_BATCH_SIZE,
+    rerank_max_length: int | None = DEFAULT_MAX_LENGTH,
+    model_dir: Path | None = None,
+    context: int = 0,
+    cache: QueryCache | None = None,
 ) -> list[dict]:
     """セマンティック検索を実行する
 
     1. クエリをembedding化
     2. sqlite-vecでコサイン類似度検索（上位initial_k件）
+       HNSWインデックスがあれば近似検索（exact=Trueで全件走査、ef_searchで精度調整）
+       candidate_spaceを指定すると、その空間の軽量モデルで候補を集める。
+       空間のベクトルが揃っていない・候補がない場合は主モデルで検索する
     3. rerankerで上位top_k件に絞り込み
+       （長さ順にrerank_batch_size件ずつ、rerank_max_lengthトークンまでで推論）
+
+    model_dirを指定すると、各モデルをそのディレクトリのスナップショットから読み込む。
+    contextが1以上なら、各結果に同じファイルの前後context個までのチャンクを
+    "context" として付ける。
+    cacheを渡すと、主モデルで検索する場合にクエリのembedding化のあとで類似クエリの
+    結果を探し、見つかればベクトル検索とリランキングを省く。
     """
-    store = VectorStore(db_path)
+    updates = search_progressive(
+        query,
+        db_path,
+        top_k,
+        initial_k,
+        exact=exact,
+        ef_search=ef_search,
+        candidate_space=candidate_space,
+        rerank_batch_size=rerank_batch_size,
+        rerank_max_length=rerank_max_length,
+        model_dir=model_dir,
+        context=context,
+        cache=cache,
+        progressive=False,
+    )
+    results: list[dict] = []
+    for update in updates:
+        results = update.results
+    return results
 
-    # モデル名の整合性チェック
-    stored_model = store.get_model_name()
-    if stored_model and stored_model != MODEL_NAME:
-        print(
-            f"警告: インデックスのembeddingモデル({stored_model})が"
-            f"現在のモデル({MODEL_NAME})と異なります",
-            file=sys.stderr,
+
+def search_progressive(
+    query: str,
+    db_path: Path,
+    top_k: int = 5,
+    initial_k: int = 20,
+    *,
+    exact: bool = False,
+    ef_search: int | None = None,
+    candidate_space: str | None = None,
+    rerank_batch_size: int = DEFAULT_BATCH_SIZE,
+    rerank_max_length: int | None = DEFAULT_MAX_LENGTH,
+    model_dir: Path | None = None,
+    context: int = 0,
+    cache: QueryCache | None = None,
+    rerank_step: int | None = None,
+    progressive: bool = True,
+) -> Iterator[SearchUpdate]:
+    """search()と同じ検索を、途中経過を順に返しながら行う
+
+    ベクトル検索が終わった時点でその上位top_k件を "vector" として返し、
+    rerankerの読み込み・推論を待たずに表示できるようにする。rerank_stepを
+    指定すると、候補をベクトル検索の順にrerank_step件ずつリランキングし、
+    そのたびにそこまでの順位を "partial" として返す。最後に "reranked" を返す。
+    キャッシュに結果があれば "reranked" だけを返す。
+    progressive=Falseなら "reranked" だけを返す（search()が使う）。
+    """
+    if rerank_step is not None and rerank_step < 1:
+        raise ValueError(f"rerank_stepは1以上で指定してください: {rerank_step}")
+    QUERIES.inc()
+    start = time.perf_counter()
+    store = shared_store(db_path)
+    try:
+        stages = _search(
+            store,
+            query,
+            top_k,
+            initial_k,
+            exact=exact,
+            ef_search=ef_search,
+            candidate_space=candidate_space,
+            rerank_batch_size=rerank_batch_size,
+            rerank_max_length=rerank_max_length,
+            model_dir=model_dir,
+            cache=cache,
+            progressive=progressive,
+            rerank_step=rerank_step,
         )
+        for stage, results in stages:
+            if context > 0:
+                neighbours = store.get_context([r["id"] for r in results], window=context)
+                for r in results:
+                    r["context"] = neighbours.get(r["id"], [])
+            yield SearchUpdate(stage, results, time.perf_counter() - start)
+    finally:
+        # 失敗したり途中で打ち切られたりした検索も所要時間に数える
+        QUERY_SECONDS.observe(time.perf_counter() - start)
 
-    embedder = Embedder()
-    query_embedding = embedder.embed([query])[0]
 
-    candidates = store.search(query_embedding, top_k=initial_k)
-    store.close()
+def _search(
+    store: VectorStore,
+    query: str,
+    top_k: int,
+    initial_k: int,
+    *,
+    exact: bool,
+    ef_search: int | None,
+    candidate_space: str | None,
+    rerank_batch_size: int,
+    rerank_max_length: int | None,
+    model_dir: Path | None,
+    cache: QueryCache | None = None,
+    progressive: bool = False,
+    rerank_step: int | None = None,
+) -> Iterator[tuple[str, list[dict]]]:
+    """(段階, 結果) を順に返す。最後は必ず ("reranked", 最終結果)"""
+    candidates: list[dict] = []
+    cache_params: dict | None = None
+    if candidate_space is not None:
+        candidates = _search_space(store, query, candidate_space, initial_k, model_dir)
+    if not candidates:
+        # モデル名の整合性チェック
+        stored_model = store.get_model_name()
+        if stored_model and stored_model != MODEL_NAME:
+            print(
+                f"警告: インデックスのembeddingモデル({stored_model})が"
+                f"現在のモデル({MODEL_NAME})と異なります",
+                file=sys.stderr,
+            )
+
+        embedder = _shared(Embedder, model_dir=model_dir)
+        query_embedding = embedder.embed([query])[0]
 
-    reranker = Reranker()
-    results = reranker.rerank(query, candidates, top_k=top_k)
+        if cache is not None and candidate_space is None:
+            # 結果を左右する条件が同じクエリだけを照合する
+            cache_params = {
+                "model": MODEL_NAME,
+                "reranker": RERANKER_MODEL_NAME,
+                "top_k": top_k,
+                "initial_k": initial_k,
+                "exact": exact,
+                "ef_search": ef_search,
+                "rerank_max_length": rerank_max_length,
+            }
+            version = store.get_index_version()
+            cached = cache.lookup(query_embedding, version=version, params=cache_params)
+            if cached is not None:
+                yield "reranked", cached
+                return
 
-    return results
+        candidates = store.search(
+            query_embedding, top_k=initial_k, exact=exact, ef_search=ef_search
+        )
+    CANDIDATES.observe(len(candidates))
+    if progressive:
+        # rerankerが候補に書き込む前の写しを渡す
+        yield "vector", [dict(c) for c in candidates[:top_k]]
+
+    reranker = _shared(
+        Reranker, batch_size=rerank_batch_size, max_length=rerank_max_length, model_dir=model_dir
+    )
+    if progressive and rerank_step and rerank_step < len(candidates):
+        # スコアは各候補に書き込まれるので、区切りごとに新しい分だけを推論する
+        for begin in range(0, len(candidates), rerank_step):
+            end = begin + rerank_step
+            reranker.rerank(query, candidates[begin:end], top_k=rerank_step)
+            if end < len(candidates):
+                yield "partial", [dict(c) for c in _ranked(candidates[:end], top_k)]
+        results = _ranked(candidates, top_k)
+    else:
+        results = reranker.rerank(query, candidates, top_k=top_k)
+    if cache_params is not None:
+        cache.store(query, query_embedding, results, version=version, params=cache_params)
+    yield "reranked", results
+
+
+def _ranked(candidates: list[dict], top_k: int) -> list[dict]:
+    return sorted(candidates, key=lambda c: c["rerank_score"], reverse=True)[:top_k]
+
+
+def _search_space(
+    store: VectorStore,
+    query: str,
+    space: str,
+    initial_k: int,
+    model_dir: Path | None = None,
+) -> list[dict]:
+    """名前付き埋め込み空間で候補を集める（使えない場合は空リスト）"""
+    info = store.get_space(space)
+    if info is None:
+        print(f"警告: 埋め込み空間({space})が見つかりません", file=sys.stderr)
+        return []
+    if info["filled"] < info["total"]:
+        print(
+            f"警告: 埋め込み空間({space})のベクトルが未完成のため"
+            f"主モデルで検索します ({info['filled']}/{info['total']})",
+            file=sys.stderr,
+        )
+        return []
+
+    embedder = _shared(Embedder, model_name=info["model_name"], model_dir=model_dir)
+    query_embedding = embedder.embed([query])[0]
+    return store.search(query_embedding, top_k=initial_k, space=space)
@@ -1,15 +1,49 @@
 from __future__ import annotations
 
+from collections import OrderedDict
+from pathlib import Path
+
 from sentence_transformers import CrossEncoder
 
+from embs.indexer.embedder import count_tokens
+from embs.metrics import STAGE_ITEMS, STAGE_SECONDS, model_load, record_cache
+from embs.models import resolve_model
+from embs.profiling import span
+
 MODEL_NAME = "hotchpotch/japanese-reranker-cross-encoder-large-v1"
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_LENGTH = 512
+DEFAULT_CACHE_SIZE = 10_000
 
 
 class Reranker:
-    """japanese-reranker-cross-encoderによるリランキング"""
+    """japanese-reranker-cross-encoderによるリランキング
+
+    ペアは長さ順に並べてbatch_size件ずつ推論し、パディングを減らす。
+    入力はmax_lengthトークンで打ち切る。スコアは (モデル, クエリ, チャンクid) ごとに
+    最大cache_size件まで保持し、同じ候補を再計算しない（0で無効）。
+    model_dirを指定するとそのディレクトリのスナップショットから読み込む。
+    """
 
-    def __init__(self, model_name: str = MODEL_NAME) -> None:
-        self.model = CrossEncoder(model_name)
+    def __init__(
+        self,
+        model_name: str = MODEL_NAME,
+        *,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_length: int | None = DEFAULT_MAX_LENGTH,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        model_dir: Path | None = None,
+    ) -> None:
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple, float] = OrderedDict()
+        source, local = resolve_model(model_name, model_dir)
+        with span("model.load"), model_load(model_name):
+            if local:
+                self.model = CrossEncoder(source, max_length=max_length, local_files_only=True)
+            else:
+                self.model = CrossEncoder(source, max_length=max_length)
 
     def rerank(
         self, query: str, candidates: list[dict], top_k: int = 5
@@ -18,11 +52,45 @@ class Reranker:
         if not candidates:
             return []
 
-        pairs = [(query, c["text"]) for c in candidates]
-        scores = self.model.predict(pairs)
+        keys = [self._cache_key(query, c) for c in candidates]
+        missing = []
+        for i, (candidate, key) in enumerate(zip(candidates, keys)):
+            score = self._cache.get(key) if key is not None else None
+            if score is not None:
+                self._cache.move_to_end(key)
+                candidate["rerank_score"] = score
+            else:
+                missing.append(i)
+            if key is not None:
+                record_cache("rerank", hit=score is not None)
 
-        for candidate, score in zip(candidates, scores):
-            candidate["rerank_score"] = float(score)
+        if missing:
+            # 長さの近いペアを同じバッチにしてパディングを減らす
+            missing.sort(key=lambda i: len(candidates[i]["text"]))
+            pairs = [(query, candidates[i]["text"]) for i in missing]
+            with span("rerank", items=len(pairs)) as s, STAGE_SECONDS.time(stage="rerank"):
+                scores = self.model.predict(pairs, batch_size=self.batch_size)
+            STAGE_ITEMS.inc(len(pairs), stage="rerank")
+            if s:
+                s.add(tokens=count_tokens(self.model.tokenizer, [query + c for _, c in pairs]))
+
+            for i, score in zip(missing, scores):
+                candidates[i]["rerank_score"] = float(score)
+                self._remember(keys[i], float(score))
 
         ranked = sorted(candidates, key=lambda c: c["rerank_score"], reverse=True)
         return ranked[:top_k]
+
+    def _cache_key(self, query: str, candidate: dict) -> tuple | None:
+        # 再インデックスでidが再利用されても取り違えないよう、本文のハッシュも含める
+        if self.cache_size <= 0 or candidate.get("id") is None:
+            return None
+        return (self.model_name, query, candidate["id"], hash(candidate["text"]))
+
+    def _remember(self, key: tuple | None, score: float) -> None:
+        if key is None:
+            return
+        self._cache[key] = score
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
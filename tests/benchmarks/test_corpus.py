@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import numpy as np
+
+from embs.benchmarks.corpus import generate_corpus, generate_queries
+from embs.benchmarks.stubs import StubEmbedder, StubReranker
+
+
+class TestGenerateCorpus:
+    def test_deterministic(self):
+        assert generate_corpus(5, seed=1) == generate_corpus(5, seed=1)
+        assert generate_corpus(5, seed=1) != generate_corpus(5, seed=2)
+
+    def test_size_and_names(self):
+        docs = generate_corpus(3, sections=2)
+
+        assert [d.name for d in docs] == ["bench-00000.md", "bench-00001.md", "bench-00002.md"]
+        assert all(d.text.count("\n## ") == 2 for d in docs)
+
+    def test_queries_deterministic(self):
+        assert generate_queries(4) == generate_queries(4)
+        assert len(generate_queries(4)) == 4
+
+
+class TestStubs:
+    def test_embedder_is_normalized_and_deterministic(self):
+        embedder = StubEmbedder(dim=32)
+
+        vecs = embedder.embed(["デプロイ手順", "監視の設定"])
+
+        assert vecs.shape == (2, embedder.dim)
+        np.testing.assert_allclose(np.linalg.norm(vecs, axis=1), 1.0, rtol=1e-5)
+        np.testing.assert_array_equal(vecs, embedder.embed(["デプロイ手順", "監視の設定"]))
+
+    def test_embedder_similar_texts_are_closer(self):
+        a, b, c = StubEmbedder().embed(
+            ["本番環境のデプロイ手順", "本番環境のデプロイ手順を自動化", "オンコール担当の連絡先"]
+        )
+
+        assert a @ b > a @ c
+
+    def test_reranker_orders_by_overlap(self, sample_candidates):
+        sample_candidates[2]["text"] = "デプロイ手順"
+
+        ranked = StubReranker().rerank("デプロイ手順", sample_candidates, top_k=2)
+
+        assert [c["id"] for c in ranked][0] == 3
+        assert len(ranked) == 2
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import json
+import math
+
+import pytest
+
+from embs.benchmarks.evaluate import (
+    EvalResult,
+    LabelledQuery,
+    SearchConfig,
+    evaluate,
+    format_table,
+    load_queries,
+    ndcg_at_k,
+    pareto_front,
+    recall_at_k,
+    reciprocal_rank,
+    relevance,
+)
+from embs.benchmarks.stubs import StubEmbedder, StubReranker
+from embs.indexer.store import VectorStore
+
+
+def _hit(source_file, chunk_index=0, **extra):
+    return {"source_file": source_file, "chunk_index": chunk_index, **extra}
+
+
+class TestMetrics:
+    def test_relevance_file_and_chunk_labels(self):
+        results = [_hit("a.md", 0), _hit("a.md", 1), _hit("b.md", 2), _hit("b.md", 3)]
+
+        assert relevance(results, ["a.md", "b.md#3"]) == [1, 0, 0, 1]
+
+    def test_relevance_counts_duplicates(self):
+        results = [_hit("a.md", 0, duplicates=[("c.md", 4)])]
+
+        assert relevance(results, ["c.md#4"]) == [1]
+
+    def test_recall_mrr_ndcg(self):
+        gains = [0, 1, 0, 1]
+
+        assert recall_at_k(gains, 2, k=2) == 0.5
+        assert recall_at_k(gains, 2, k=4) == 1.0
+        assert reciprocal_rank(gains, k=4) == 0.5
+        assert reciprocal_rank(gains, k=1) == 0.0
+        expected = (1 / math.log2(3) + 1 / math.log2(5)) / (1 + 1 / math.log2(3))
+        assert ndcg_at_k(gains, 2, k=4) == pytest.approx(expected)
+        assert ndcg_at_k([1, 1], 2, k=2) == pytest.approx(1.0)
+
+
+class TestSearchConfig:
+    def test_parse(self):
+        config = SearchConfig.parse("initial_k=50, rerank=false,ef_search=32,space=small")
+
+        assert config.name == "initial_k=50, rerank=false,ef_search=32,space=small"
+        assert (config.initial_k, config.rerank, config.ef_search, config.space) == (
+            50,
+            False,
+            32,
+            "small",
+        )
+        assert config.exact is False
+
+    @pytest.mark.parametrize("spec", ["unknown=1", "initial_k", "rerank=maybe", "name=x"])
+    def test_parse_invalid(self, spec):
+        with pytest.raises(ValueError):
+            SearchConfig.parse(spec)
+
+
+class TestLoadQueries:
+    def test_load(self, tmp_path):
+        path = tmp_path / "queries.jsonl"
+        path.write_text(
+            json.dumps({"query": "デプロイ", "relevant": ["a.md"]}, ensure_ascii=False)
+            + "\n\n",
+            encoding="utf-8",
+        )
+
+        assert load_queries(path) == [LabelledQuery(query="デプロイ", relevant=["a.md"])]
+
+    def test_missing_relevant(self, tmp_path):
+        path = tmp_path / "queries.jsonl"
+        path.write_text(json.dumps({"query": "q"}) + "\n", encoding="utf-8")
+
+        with pytest.raises(ValueError):
+            load_queries(path)
+
+
+class TestEvaluate:
+    @pytest.fixture
+    def store(self, tmp_path):
+        embedder = StubEmbedder()
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name=embedder.model_name, dim=embedder.dim)
+        texts = {
+            "deploy.md": "本番環境へのデプロイ手順とロールバック",
+            "monitor.md": "監視アラートの閾値とオンコール体制",
+            "backup.md": "データベースのバックアップと復元手順",
+        }
+        store.insert_many(
+            (name, 0, text, emb)
+            for (name, text), emb in zip(texts.items(), embedder.embed(list(texts.values())))
+        )
+        yield store
+        store.close()
+
+    def test_evaluate_configs(self, store):
+        queries = [
+            LabelledQuery("デプロイ手順とロールバック", ["deploy.md"]),
+            LabelledQuery("バックアップの復元手順", ["backup.md#0"]),
+        ]
+        configs = [SearchConfig.parse("initial_k=3"), SearchConfig.parse("initial_k=3,rerank=false")]
+
+        results = evaluate(
+            store,
+            queries,
+            configs,
+            embedders={None: StubEmbedder()},
+            reranker=StubReranker(),
+            k=1,
+        )
+
+        assert [r.config for r in results] == ["initial_k=3", "initial_k=3,rerank=false"]
+        for r in results:
+            assert r.recall == 1.0
+            assert r.mrr == 1.0
+            assert "p95_ms" in r.latency
+        assert any(r.pareto for r in results)
+        assert "recall@1" in format_table(results)
+
+    def test_rerank_requires_reranker(self, store):
+        with pytest.raises(ValueError):
+            evaluate(
+                store,
+                [LabelledQuery("q", ["deploy.md"])],
+                [SearchConfig()],
+                embedders={None: StubEmbedder()},
+            )
+
+
+class TestParetoFront:
+    def test_dominated_config_is_excluded(self):
+        fast = EvalResult("fast", 5, 0.6, 0.5, 0.5, {"p95_ms": 5.0})
+        slow_good = EvalResult("slow", 5, 0.9, 0.8, 0.8, {"p95_ms": 50.0})
+        slow_bad = EvalResult("bad", 5, 0.5, 0.4, 0.4, {"p95_ms": 60.0})
+
+        assert pareto_front([fast, slow_good, slow_bad]) == [True, True, False]
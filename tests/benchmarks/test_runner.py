@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+from embs.benchmarks.runner import BenchConfig, compare_results, run_benchmark
+from embs.indexer.chunker import Chunk
+
+
+def _fake_chunk_text(text, source_file):
+    return [
+        Chunk(text=para, source_file=source_file, chunk_index=i)
+        for i, para in enumerate(p for p in text.split("\n\n") if p.strip())
+    ]
+
+
+@pytest.fixture
+def result(tmp_path):
+    config = BenchConfig(documents=4, queries=10, batch_size=8)
+    with patch("embs.benchmarks.runner.chunk_text", side_effect=_fake_chunk_text):
+        return run_benchmark(config, tmp_path)
+
+
+class TestRunBenchmark:
+    def test_reports_all_metrics(self, result):
+        assert result["corpus"]["documents"] == 4
+        assert result["corpus"]["chunks"] > 0
+        assert set(result["indexing"]["stages"]) == {"chunk", "embed", "store"}
+        assert set(result["search"]) == {"embed", "open", "store", "rerank", "total"}
+        assert {"p50_ms", "p95_ms", "p99_ms"} <= set(result["search"]["store"])
+        assert result["db_size_bytes"] > 0
+        assert result["peak_rss_mb"] > 0
+
+    def test_json_serializable(self, result):
+        assert json.loads(json.dumps(result))["config"]["documents"] == 4
+
+    def test_ann_stage(self, tmp_path):
+        pytest.importorskip("hnswlib")
+        config = BenchConfig(documents=2, queries=3, ann=True)
+        with patch("embs.benchmarks.runner.chunk_text", side_effect=_fake_chunk_text):
+            result = run_benchmark(config, tmp_path)
+
+        assert "ann" in result["indexing"]["stages"]
+
+    def test_rerun_replaces_previous_db(self, tmp_path, result):
+        config = BenchConfig(documents=4, queries=10, batch_size=8)
+        with patch("embs.benchmarks.runner.chunk_text", side_effect=_fake_chunk_text):
+            again = run_benchmark(config, tmp_path)
+
+        assert again["corpus"]["chunks"] == result["corpus"]["chunks"]
+
+
+class TestCompareResults:
+    def test_common_metrics(self, result):
+        rows = dict((name, (before, after)) for name, before, after in compare_results(result, result))
+
+        assert rows["search.store.p95_ms"][0] == rows["search.store.p95_ms"][1]
+        assert "indexing.chunks_per_s" in rows
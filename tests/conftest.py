@@ -4,6 +4,13 @@ import numpy as np
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def _no_model_snapshots(monkeypatch, tmp_path):
+    """開発環境のEMBS_MODEL_DIRや設定ファイルをテストに持ち込まない"""
+    monkeypatch.delenv("EMBS_MODEL_DIR", raising=False)
+    monkeypatch.setenv("EMBS_CONFIG", str(tmp_path / "no-config.json"))
+
+
 @pytest.fixture
 def sample_embedding():
     """768次元の正規化済みサンプルembedding"""
@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import os
+
+import pytest
+
 from embs.fetchers.markdown import MarkdownFetcher
 
 
@@ -70,3 +74,162 @@ class TestMarkdownFetcher:
 
         assert out.exists()
         assert (out / "doc.md").exists()
+
+
+class TestMarkdownFetcherSync:
+    def _make_source(self, tmp_path):
+        source = tmp_path / "source"
+        (source / "sub").mkdir(parents=True)
+        (source / "a.md").write_text("A", encoding="utf-8")
+        (source / "sub" / "b.md").write_text("B", encoding="utf-8")
+        return source
+
+    def test_first_sync_reports_added(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+
+        result = MarkdownFetcher(source).sync(out)
+
+        assert sorted(result.added) == [out / "a.md", out / "sub" / "b.md"]
+        assert result.changed == []
+        assert result.removed == []
+
+    def test_second_sync_skips_unchanged(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+        fetcher = MarkdownFetcher(source)
+        fetcher.sync(out)
+
+        result = fetcher.sync(out)
+
+        assert result.added == []
+        assert result.changed == []
+        assert len(result.unchanged) == 2
+
+    def test_detects_changed_content(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+        fetcher = MarkdownFetcher(source)
+        fetcher.sync(out)
+
+        (source / "a.md").write_text("A2", encoding="utf-8")
+        result = fetcher.sync(out)
+
+        assert result.changed == [out / "a.md"]
+        assert (out / "a.md").read_text(encoding="utf-8") == "A2"
+
+    def test_touch_without_content_change_is_unchanged(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+        fetcher = MarkdownFetcher(source)
+        fetcher.sync(out)
+
+        st = (source / "a.md").stat()
+        os.utime(source / "a.md", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        result = fetcher.sync(out)
+
+        assert result.changed == []
+        assert len(result.unchanged) == 2
+
+    def test_prune_removes_stale_files(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+        fetcher = MarkdownFetcher(source)
+        fetcher.sync(out)
+
+        (source / "sub" / "b.md").unlink()
+        result = fetcher.sync(out)
+
+        assert result.removed == [out / "sub" / "b.md"]
+        assert not (out / "sub").exists()
+
+    def test_prune_keeps_files_not_in_manifest(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+        (out / "notes").mkdir(parents=True)
+        (out / "notes" / "local.md").write_text("mine", encoding="utf-8")
+        fetcher = MarkdownFetcher(source)
+        fetcher.sync(out)
+
+        (source / "a.md").unlink()
+        result = fetcher.sync(out)
+
+        assert result.removed == [out / "a.md"]
+        assert (out / "notes" / "local.md").read_text(encoding="utf-8") == "mine"
+
+    def test_prune_after_fetch_removes_recorded_files(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+        fetcher = MarkdownFetcher(source)
+        fetcher.fetch(out)
+
+        (source / "a.md").unlink()
+        fetcher.fetch(out)
+        result = fetcher.sync(out)
+
+        assert result.removed == [out / "a.md"]
+
+    def test_fetch_does_not_prune(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+        fetcher = MarkdownFetcher(source)
+        fetcher.fetch(out)
+
+        (source / "a.md").unlink()
+        fetcher.fetch(out)
+
+        assert (out / "a.md").exists()
+
+    def test_hardlink_strategy(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+
+        MarkdownFetcher(source, strategy="hardlink").sync(out)
+
+        assert os.path.samefile(source / "a.md", out / "a.md")
+
+    def test_symlink_strategy(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+
+        MarkdownFetcher(source, strategy="symlink").sync(out)
+
+        assert (out / "a.md").is_symlink()
+        assert (out / "a.md").read_text(encoding="utf-8") == "A"
+
+    def test_relink_does_not_modify_source(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+        MarkdownFetcher(source, strategy="symlink").sync(out)
+
+        (source / "a.md").write_text("A2", encoding="utf-8")
+        result = MarkdownFetcher(source, strategy="copy").sync(out)
+
+        assert result.changed == [out / "a.md"]
+        assert not (out / "a.md").is_symlink()
+        assert (source / "a.md").read_text(encoding="utf-8") == "A2"
+
+    def test_reflink_falls_back_to_copy(self, tmp_path):
+        source = self._make_source(tmp_path)
+        out = tmp_path / "output"
+
+        MarkdownFetcher(source, strategy="reflink").sync(out)
+
+        assert (out / "a.md").read_text(encoding="utf-8") == "A"
+
+    def test_invalid_strategy_raises(self, tmp_path):
+        with pytest.raises(ValueError):
+            MarkdownFetcher(tmp_path, strategy="rsync")
+
+
+class TestMarkdownFetcherIterDocuments:
+    def test_yields_documents_without_writing(self, tmp_path):
+        source = tmp_path / "source"
+        (source / "sub").mkdir(parents=True)
+        (source / "a.md").write_text("A", encoding="utf-8")
+        (source / "sub" / "b.md").write_text("B", encoding="utf-8")
+
+        docs = list(MarkdownFetcher(source).iter_documents())
+
+        assert [d.name for d in docs] == ["a.md", "sub/b.md"]
+        assert [d.text for d in docs] == ["A", "B"]
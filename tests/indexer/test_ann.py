@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+pytest.importorskip("hnswlib")
+
+from embs.indexer.ann import HnswIndex  # noqa: E402
+
+
+def _unit_rows(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vecs = rng.standard_normal((n, dim)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+class TestHnswIndex:
+    def test_search_finds_self(self, tmp_path):
+        vecs = _unit_rows(50)
+        index = HnswIndex(tmp_path / "test.db", dim=16)
+        index.add(list(range(1, 51)), vecs)
+
+        hits = index.search(vecs[9], top_k=3)
+
+        assert hits[0][0] == 10
+        assert hits[0][1] == pytest.approx(0.0, abs=1e-3)
+        assert len(hits) == 3
+
+    def test_grows_beyond_initial_capacity(self, tmp_path):
+        vecs = _unit_rows(1500)
+        index = HnswIndex(tmp_path / "test.db", dim=16)
+        index.add(list(range(1500)), vecs)
+
+        assert index.index.get_max_elements() >= 1500
+
+    def test_remove_excludes_from_results(self, tmp_path):
+        vecs = _unit_rows(3)
+        index = HnswIndex(tmp_path / "test.db", dim=16)
+        index.add([1, 2, 3], vecs)
+
+        index.remove([1, 99])
+
+        assert sorted(rowid for rowid, _ in index.search(vecs[0], top_k=5)) == [2, 3]
+
+    def test_save_and_reload(self, tmp_path):
+        vecs = _unit_rows(10)
+        index = HnswIndex(tmp_path / "test.db", dim=16)
+        index.add(list(range(10)), vecs)
+        index.save()
+
+        reloaded = HnswIndex(tmp_path / "test.db", dim=16)
+
+        assert reloaded.search(vecs[4], top_k=1)[0][0] == 4
+
+    def test_k_is_clamped_to_live_count(self, tmp_path):
+        vecs = _unit_rows(5)
+        index = HnswIndex(tmp_path / "test.db", dim=16)
+        index.add([1, 2, 3, 4, 5], vecs)
+        index.remove([2, 3, 3])
+
+        assert (index.deleted, index.live_count) == (2, 3)
+        index.index = MagicMock(wraps=index.index, element_count=5)
+        hits = index.search(vecs[0], top_k=10)
+
+        assert sorted(rowid for rowid, _ in hits) == [1, 4, 5]
+        index.index.knn_query.assert_called_once()
+        assert index.index.knn_query.call_args.kwargs["k"] == 3
+
+    def test_deleted_count_survives_reopen(self, tmp_path):
+        from embs.indexer.store import VectorStore
+
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="test-model", dim=16)
+        vecs = _unit_rows(4)
+        store.insert_many([(f"{i}.md", 0, str(i), v) for i, v in enumerate(vecs)])
+        store.build_ann()
+        store.delete_source("0.md")
+        store.delete_source("1.md")
+        store.close()
+
+        store = VectorStore(tmp_path / "test.db")
+        assert store._ann.live_count == 2
+        assert {r["source_file"] for r in store.search(vecs[0], top_k=10)} == {"2.md", "3.md"}
+        store.close()
@@ -2,7 +2,16 @@ from __future__ import annotations
 
 from unittest.mock import MagicMock, patch
 
-from embs.indexer.chunker import Chunk, chunk_markdown
+import pytest
+
+from embs.indexer.chunker import (
+    Chunk,
+    ChunkSizing,
+    approx_tokens,
+    chunk_markdown,
+    chunk_text,
+    resize_chunks,
+)
 
 
 class TestChunkDataclass:
@@ -113,3 +122,115 @@ class TestChunkMarkdown:
         # chunk_indexは元のenumerateのインデックスを保持
         assert result[0].chunk_index == 0
         assert result[1].chunk_index == 2
+
+
+class TestChunkText:
+    @patch("embs.indexer.chunker.HierarchicalChunker")
+    @patch("embs.indexer.chunker.DocumentConverter")
+    def test_converts_string(self, mock_converter_cls, mock_chunker_cls):
+        mock_chunk = MagicMock()
+        mock_chunk.text = "chunk"
+        mock_chunker_cls.return_value.chunk.return_value = [mock_chunk]
+
+        result = chunk_text("# Test", "page.md")
+
+        mock_converter_cls.return_value.convert_string.assert_called_once()
+        assert result == [Chunk(text="chunk", source_file="page.md", chunk_index=0)]
+
+    @patch("embs.indexer.chunker.HierarchicalChunker")
+    @patch("embs.indexer.chunker.DocumentConverter")
+    def test_keeps_heading_path(self, mock_converter_cls, mock_chunker_cls):
+        mock_chunk = MagicMock()
+        mock_chunk.text = "本文"
+        mock_chunk.meta.headings = ["手順書", "デプロイ"]
+        mock_chunker_cls.return_value.chunk.return_value = [mock_chunk]
+
+        result = chunk_text("# 手順書", "page.md")
+
+        assert result[0].headings == ["手順書", "デプロイ"]
+
+
+def _chars(text):
+    """テスト用: 空白以外の1文字を1トークンと数える"""
+    return len("".join(text.split()))
+
+
+class TestApproxTokens:
+    def test_counts_words_and_characters(self):
+        assert approx_tokens("deploy手順 v2") == 4
+        assert approx_tokens("") == 0
+
+
+class TestResizeChunks:
+    def _sizing(self, **kwargs):
+        return ChunkSizing(count_tokens=_chars, **kwargs)
+
+    def test_merges_small_siblings_under_same_heading(self):
+        chunks = [
+            Chunk("あ" * 5, "a.md", 0, ["T", "A"]),
+            Chunk("い" * 5, "a.md", 1, ["T", "A"]),
+            Chunk("う" * 5, "a.md", 3, ["T", "B"]),
+        ]
+
+        result = resize_chunks(chunks, self._sizing(target_tokens=20, with_headings=False))
+
+        assert [c.text for c in result] == ["あ" * 5 + "\n" + "い" * 5, "う" * 5]
+        assert [c.chunk_index for c in result] == [0, 1]
+
+    def test_merge_stops_at_target(self):
+        chunks = [Chunk("あ" * 8, "a.md", i, ["T"]) for i in range(3)]
+
+        result = resize_chunks(chunks, self._sizing(target_tokens=16, with_headings=False))
+
+        assert [_chars(c.text) for c in result] == [16, 8]
+
+    def test_prefixes_heading_path(self):
+        result = resize_chunks([Chunk("本文", "a.md", 0, ["手順書", "デプロイ"])], self._sizing())
+
+        assert result[0].text == "手順書 > デプロイ\n本文"
+        assert result[0].headings == ["手順書", "デプロイ"]
+
+    def test_splits_oversized_with_overlap(self):
+        sentences = [f"{c * 9}。" for c in "あいうえお"]
+        chunks = [Chunk("".join(sentences), "a.md", 0, [])]
+
+        result = resize_chunks(
+            chunks, self._sizing(target_tokens=10, max_tokens=25, overlap_tokens=10)
+        )
+
+        assert [c.text for c in result] == [
+            sentences[0] + sentences[1],
+            sentences[1] + sentences[2],
+            sentences[2] + sentences[3],
+            sentences[3] + sentences[4],
+        ]
+        assert all(_chars(c.text) <= 25 for c in result)
+
+    def test_budget_includes_heading(self):
+        chunks = [Chunk("あ" * 30, "a.md", 0, ["見出し"])]
+
+        result = resize_chunks(chunks, self._sizing(max_tokens=20, overlap_tokens=0))
+
+        assert all(_chars(c.text) <= 20 for c in result)
+        assert "".join(c.text.split("\n", 1)[1] for c in result) == "あ" * 30
+
+    def test_long_heading_path_is_shortened(self):
+        headings = ["い" * 8, "う" * 6, "え" * 3]
+        chunks = [Chunk("あ" * 30, "a.md", 0, headings)]
+
+        result = resize_chunks(chunks, self._sizing(max_tokens=20, overlap_tokens=0))
+
+        # 見出しパスは半分の10トークンまで。上位の見出しから省く
+        assert all(c.text.startswith("う" * 6 + " > " + "え" * 3 + "\n") for c in result)
+        assert all(_chars(c.text) <= 20 for c in result)
+        assert all(c.headings == headings for c in result)
+
+    @pytest.mark.parametrize("count", [_chars, approx_tokens])
+    def test_never_exceeds_max_tokens(self, count):
+        text = "".join(f"手順{i}を実行する。" for i in range(200))
+        chunks = [Chunk(text, "a.md", 0, ["運用", "デプロイ"])]
+
+        result = resize_chunks(chunks, ChunkSizing(max_tokens=64, count_tokens=count))
+
+        assert len(result) > 1
+        assert all(count(c.text) <= 64 for c in result)
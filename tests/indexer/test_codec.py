@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("zstandard")
+
+from embs.indexer.codec import TextCodec  # noqa: E402
+
+
+def _samples(n=300):
+    return [f"これはテスト文書{i}です。デプロイ手順とエラーハンドリングについて説明します。" for i in range(n)]
+
+
+class TestTextCodec:
+    def test_roundtrip_with_dictionary(self):
+        codec = TextCodec.train(_samples(), dict_size=4096)
+
+        assert codec.dictionary is not None
+        text = "デプロイ手順を確認してください。"
+        assert codec.decompress(codec.compress(text)) == text
+
+    def test_dictionary_shrinks_short_texts(self):
+        samples = _samples()
+        trained = TextCodec.train(samples, dict_size=4096)
+        plain = TextCodec()
+
+        assert len(trained.compress(samples[0])) < len(plain.compress(samples[0]))
+
+    def test_too_few_samples_falls_back_to_no_dictionary(self):
+        codec = TextCodec.train(["短い"], dict_size=4096)
+
+        assert codec.dictionary is None
+        assert codec.decompress(codec.compress("短い")) == "短い"
+
+    def test_decompress_passes_through_plain_text(self):
+        assert TextCodec().decompress("未圧縮") == "未圧縮"
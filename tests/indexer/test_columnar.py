@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from embs.indexer.columnar import export_index, import_index  # noqa: E402
+from embs.indexer.store import EMBEDDING_DIM, VectorStore  # noqa: E402
+
+
+def _populate(store, n=10, seed=0):
+    rng = np.random.default_rng(seed)
+    vecs = rng.standard_normal((n, EMBEDDING_DIM)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    store.insert_many(
+        [(f"doc{i % 3}.md", i, f"チャンク{i}", vecs[i]) for i in range(n)]
+    )
+    return vecs
+
+
+def _dump(store):
+    rows = []
+    for batch in store.iter_rows(batch_size=3):
+        for i in range(len(batch.ids)):
+            rows.append(
+                (
+                    int(batch.ids[i]),
+                    batch.source_files[i],
+                    batch.chunk_indexes[i],
+                    batch.texts[i],
+                    batch.embeddings[i].tobytes(),
+                )
+            )
+    return rows
+
+
+class TestExportImport:
+    @pytest.mark.parametrize("backend", ["sqlite-vec", "numpy"])
+    def test_roundtrip_is_exact(self, tmp_path, backend):
+        src = VectorStore(tmp_path / "src.db", backend=backend)
+        src.create_tables(model_name="test-model")
+        _populate(src)
+        src.delete_source("doc1.md")  # idに欠番を作る
+
+        parquet = tmp_path / "index.parquet"
+        assert export_index(src, parquet, batch_size=4) == 7
+
+        import_index(parquet, tmp_path / "dst.db", batch_size=4)
+        dst = VectorStore(tmp_path / "dst.db")
+
+        assert dst.backend == backend
+        assert _dump(dst) == _dump(src)
+        assert dst.get_metadata() == src.get_metadata()
+        src.close()
+        dst.close()
+
+    def test_roundtrip_spaces(self, tmp_path):
+        src = VectorStore(tmp_path / "src.db")
+        src.create_tables(model_name="test-model")
+        _populate(src, n=4)
+        src.add_space("small", model_name="small-model", dim=4)
+        # 一部のチャンクだけベクトルを作成しておく
+        (first_id, _), = src.missing_in_space("small", limit=1)
+        src.insert_space_vectors("small", [(first_id, np.eye(4, dtype=np.float32)[2])])
+
+        parquet = tmp_path / "index.parquet"
+        export_index(src, parquet)
+        import_index(parquet, tmp_path / "dst.db")
+        dst = VectorStore(tmp_path / "dst.db")
+
+        info = dst.get_space("small")
+        assert (info["filled"], info["total"]) == (1, 4)
+        vectors = dst.get_space_vectors("small", np.array([first_id]))
+        np.testing.assert_array_equal(vectors[first_id], np.eye(4, dtype=np.float32)[2])
+        src.close()
+        dst.close()
+
+    def test_roundtrip_compressed_text(self, tmp_path):
+        pytest.importorskip("zstandard")
+        src = VectorStore(tmp_path / "src.db")
+        src.create_tables(model_name="test-model")
+        _populate(src, n=50)
+        src.compress_texts(dict_size=1024)
+
+        parquet = tmp_path / "index.parquet"
+        export_index(src, parquet)
+        import_index(parquet, tmp_path / "dst.db")
+        dst = VectorStore(tmp_path / "dst.db")
+
+        assert _dump(dst) == _dump(src)
+        stored = dst.conn.execute("SELECT text FROM chunks LIMIT 1").fetchone()[0]
+        assert isinstance(stored, bytes)
+        src.close()
+        dst.close()
+
+    def test_roundtrip_duplicates(self, tmp_path):
+        src = VectorStore(tmp_path / "src.db")
+        src.create_tables(model_name="test-model")
+        _populate(src, n=3)
+        src.add_duplicates([(1, "other.md", 4), (1, "other.md", 7)])
+
+        parquet = tmp_path / "index.parquet"
+        export_index(src, parquet)
+        import_index(parquet, tmp_path / "dst.db")
+        dst = VectorStore(tmp_path / "dst.db")
+
+        assert dst.get_duplicates([1, 2, 3]) == {1: [("other.md", 4), ("other.md", 7)]}
+        src.close()
+        dst.close()
+
+    def test_import_refuses_existing_db(self, tmp_path):
+        src = VectorStore(tmp_path / "src.db")
+        src.create_tables(model_name="test-model")
+        _populate(src, n=1)
+        parquet = tmp_path / "index.parquet"
+        export_index(src, parquet)
+        src.close()
+
+        with pytest.raises(FileExistsError):
+            import_index(parquet, tmp_path / "src.db")
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import pytest
+
+from embs.indexer.dedup import Deduplicator
+
+BASE = (
+    "デプロイ手順: まずステージング環境でマイグレーションを実行し、"
+    "ヘルスチェックが通ることを確認してから本番環境へ切り替える。"
+    "問題があればロールバック用のスクリプトで直前のリリースに戻す。"
+)
+
+
+class TestDeduplicator:
+    def test_exact_duplicate_ignores_whitespace(self):
+        dedup = Deduplicator()
+        dedup.add(1, BASE)
+
+        assert dedup.match("  " + BASE.replace("、", "、\n") + "\n") == 1
+
+    def test_near_duplicate(self):
+        dedup = Deduplicator(threshold=0.8)
+        dedup.add(1, BASE)
+
+        assert dedup.match(BASE.replace("直前の", "一つ前の")) == 1
+
+    def test_distinct_text_is_not_matched(self):
+        dedup = Deduplicator()
+        dedup.add(1, BASE)
+
+        assert dedup.match("障害報告: 監視アラートの閾値を見直し、通知先をオンコール担当に変更した。") is None
+
+    def test_removed_chunk_is_not_matched(self):
+        dedup = Deduplicator(threshold=0.8)
+        dedup.add(1, BASE)
+        dedup.add(2, "障害報告: 監視アラートの閾値を見直し、通知先をオンコール担当に変更した。")
+
+        dedup.remove([1, 99])
+
+        assert dedup.match(BASE) is None
+        assert dedup.match(BASE.replace("直前の", "一つ前の")) is None
+        assert dedup.match("障害報告: 監視アラートの閾値を見直し、通知先をオンコール担当に変更した。") == 2
+
+    def test_empty_index(self):
+        assert Deduplicator().match(BASE) is None
+
+    def test_num_perm_must_be_divisible_by_bands(self):
+        with pytest.raises(ValueError):
+            Deduplicator(num_perm=100, bands=16)
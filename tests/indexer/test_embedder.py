@@ -4,6 +4,7 @@ from unittest.mock import MagicMock, patch
 
 import numpy as np
 
+from embs import profiling
 from embs.indexer.embedder import MODEL_NAME, Embedder
 
 
@@ -22,6 +23,19 @@ class TestEmbedder:
         assert embedder.model_name == "custom/model"
         mock_st_cls.assert_called_once_with("custom/model")
 
+    @patch("embs.indexer.embedder.SentenceTransformer")
+    def test_init_from_snapshot(self, mock_st_cls, tmp_path):
+        from embs.models import snapshot_path, write_manifest
+
+        path = snapshot_path(MODEL_NAME, tmp_path)
+        path.mkdir()
+        write_manifest(path, MODEL_NAME)
+
+        embedder = Embedder(model_dir=tmp_path)
+
+        assert embedder.model_name == MODEL_NAME
+        mock_st_cls.assert_called_once_with(str(path), local_files_only=True)
+
     @patch("embs.indexer.embedder.SentenceTransformer")
     def test_embed_returns_ndarray(self, mock_st_cls):
         mock_model = MagicMock()
@@ -47,3 +61,40 @@ class TestEmbedder:
         mock_model.encode.assert_called_once_with(
             ["test"], normalize_embeddings=True
         )
+
+    @patch("embs.indexer.embedder.SentenceTransformer")
+    def test_dim_from_model(self, mock_st_cls):
+        mock_st_cls.return_value.get_sentence_embedding_dimension.return_value = 384
+
+        embedder = Embedder(model_name="small/model")
+
+        assert embedder.dim == 384
+
+    @patch("embs.indexer.embedder.SentenceTransformer")
+    def test_embed_records_span_when_profiling(self, mock_st_cls):
+        mock_model = mock_st_cls.return_value
+        mock_model.encode.return_value = np.zeros((2, 768), dtype=np.float32)
+        mock_model.tokenizer.return_value = {"input_ids": [[1, 2, 3], [4, 5]]}
+
+        embedder = Embedder()
+        profiler = profiling.enable()
+        try:
+            embedder.embed(["a", "b"])
+        finally:
+            profiling.disable()
+
+        [record] = profiler.records
+        assert record.name == "embed"
+        assert record.counters == {"items": 2, "tokens": 5}
+
+    @patch("embs.indexer.embedder.SentenceTransformer")
+    def test_token_count_and_max_length(self, mock_st_cls):
+        mock_model = mock_st_cls.return_value
+        mock_model.max_seq_length = 512
+        mock_model.tokenizer.return_value = {"input_ids": [5, 6, 7]}
+
+        embedder = Embedder()
+
+        assert embedder.max_seq_length == 512
+        assert embedder.token_count("デプロイ手順") == 3
+        mock_model.tokenizer.assert_called_once_with("デプロイ手順", add_special_tokens=False)
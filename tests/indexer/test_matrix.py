@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from embs.indexer import matrix
+from embs.indexer.matrix import MatrixIndex
+from embs.indexer.store import VectorStore
+
+
+def _unit(rng, dim=8):
+    vec = rng.standard_normal(dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+class TestMatrixIndex:
+    def test_search_orders_by_similarity(self, tmp_path):
+        rng = np.random.default_rng(0)
+        vecs = [_unit(rng) for _ in range(5)]
+        index = MatrixIndex(tmp_path / "test.db")
+        for i, vec in enumerate(vecs, 1):
+            index.add(i, vec)
+
+        hits = index.search(vecs[2], top_k=3)
+
+        assert hits[0][0] == 3
+        assert hits[0][1] == pytest.approx(0.0, abs=1e-3)
+        assert [d for _, d in hits] == sorted(d for _, d in hits)
+        assert len(hits) == 3
+
+    def test_distance_matches_l2(self, tmp_path):
+        rng = np.random.default_rng(1)
+        a, b = _unit(rng), _unit(rng)
+        index = MatrixIndex(tmp_path / "test.db")
+        index.add(1, a)
+
+        (_, distance), = index.search(b, top_k=1)
+
+        assert distance == pytest.approx(float(np.linalg.norm(a - b)), abs=1e-5)
+
+    def test_flush_persists_and_memmaps(self, tmp_path):
+        rng = np.random.default_rng(2)
+        vec = _unit(rng)
+        index = MatrixIndex(tmp_path / "test.db")
+        index.add(7, vec)
+        index.flush()
+
+        assert MatrixIndex(tmp_path / "test.db").search(vec, top_k=1)[0][0] == 7
+
+        index.compact()
+        reopened = MatrixIndex(tmp_path / "test.db")
+
+        ids, vectors, _ = reopened._segments[0]
+        assert isinstance(ids, np.memmap) and isinstance(vectors, np.memmap)
+        assert not index.log_path.exists()
+        assert reopened.search(vec, top_k=1)[0][0] == 7
+
+    def test_log_is_mapped_not_read(self, tmp_path):
+        rng = np.random.default_rng(8)
+        index = MatrixIndex(tmp_path / "test.db")
+        for i in range(1, 4):
+            index.add(i, _unit(rng))
+        index.remove([2])
+        index.flush()
+
+        reopened = MatrixIndex(tmp_path / "test.db")
+
+        (ids, vectors, alive), = reopened._segments
+        assert isinstance(vectors, np.memmap)
+        assert ids[alive].tolist() == [1, 3]
+        assert len(reopened) == 2
+
+    def test_reload_when_compacted_while_opening(self, tmp_path, monkeypatch):
+        rng = np.random.default_rng(9)
+        writer = MatrixIndex(tmp_path / "test.db")
+        for i in range(1, 4):
+            writer.add(i, _unit(rng))
+        writer.compact()
+        writer.add(4, _unit(rng))
+        writer.flush()
+
+        # 基本ファイルを読んだ直後、ログを読む前にcompact()が割り込んだ場合
+        map_log = MatrixIndex._map_log
+        calls = []
+
+        def compact_first(self):
+            calls.append(self)
+            if len(calls) == 1:
+                writer.add(5, _unit(rng))
+                writer.compact()
+            return map_log(self)
+
+        monkeypatch.setattr(MatrixIndex, "_map_log", compact_first)
+        reader = MatrixIndex(tmp_path / "test.db")
+
+        assert calls.count(reader) == 2
+        assert sorted(reader.arrays()[0].tolist()) == [1, 2, 3, 4, 5]
+
+    def test_flush_appends_without_rewriting_base(self, tmp_path):
+        rng = np.random.default_rng(4)
+        index = MatrixIndex(tmp_path / "test.db")
+        for i in range(1, 11):
+            index.add(i, _unit(rng))
+        index.compact()
+        base = index.vectors_path.stat()
+
+        index.remove([3])
+        index.add(3, _unit(rng))
+        index.add(11, _unit(rng))
+        index.flush()
+
+        assert index.vectors_path.stat().st_mtime_ns == base.st_mtime_ns
+        assert index.log_path.stat().st_size == 8 + 3 * (8 + 8 * 4)
+        reopened = MatrixIndex(tmp_path / "test.db")
+        ids, vectors = reopened.arrays()
+        assert sorted(ids.tolist()) == list(range(1, 12))
+        np.testing.assert_array_equal(vectors, index.arrays()[1])
+
+    def test_compacts_when_log_grows(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(matrix, "COMPACT_MIN_RECORDS", 4)
+        rng = np.random.default_rng(5)
+        index = MatrixIndex(tmp_path / "test.db")
+        for i in range(1, 6):
+            index.add(i, _unit(rng))
+            index.flush()
+
+        assert not index.log_path.exists()
+        assert len(MatrixIndex(tmp_path / "test.db")) == 5
+
+    def test_ignores_torn_record(self, tmp_path):
+        rng = np.random.default_rng(6)
+        vec = _unit(rng)
+        index = MatrixIndex(tmp_path / "test.db")
+        index.add(1, vec)
+        index.flush()
+        with open(index.log_path, "ab") as f:
+            f.write(b"\x00" * 5)
+
+        reopened = MatrixIndex(tmp_path / "test.db")
+        assert len(reopened) == 1
+        reopened.add(2, _unit(rng))
+        reopened.flush()
+        assert sorted(MatrixIndex(tmp_path / "test.db").arrays()[0].tolist()) == [1, 2]
+
+    def test_remove(self, tmp_path):
+        rng = np.random.default_rng(3)
+        index = MatrixIndex(tmp_path / "test.db")
+        index.add(1, _unit(rng))
+        index.add(2, _unit(rng))
+        index.flush()
+
+        index.remove([1])
+
+        assert [rowid for rowid, _ in index.search(_unit(rng), top_k=5)] == [2]
+        assert len(index) == 1
+        index.flush()
+        assert len(MatrixIndex(tmp_path / "test.db")) == 1
+
+    def test_empty_index(self, tmp_path):
+        index = MatrixIndex(tmp_path / "test.db")
+
+        assert index.search(np.ones(8, dtype=np.float32), top_k=5) == []
+
+
+class TestNumpyBackendDurability:
+    def test_committed_chunks_have_vectors_without_close(self, tmp_path):
+        rng = np.random.default_rng(7)
+        vec = _unit(rng)
+        store = VectorStore(tmp_path / "index.db", backend="numpy")
+        store.create_tables(model_name="m", dim=8)
+        store.insert("a.md", 0, "text", vec)
+
+        # 閉じずに（途中で止まった想定で）別の接続から開いても、ベクトルが見える
+        other = VectorStore(tmp_path / "index.db")
+        assert other.search(vec, top_k=1)[0]["source_file"] == "a.md"
+        other.close()
+        store.close()
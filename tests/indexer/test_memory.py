@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+
+from embs.indexer.memory import MemoryBudget, current_rss, parse_size
+
+
+class TestParseSize:
+    @pytest.mark.parametrize(
+        ("text", "expected"),
+        [
+            ("1000", 1000),
+            ("512M", 512 * 1024**2),
+            ("2g", 2 * 1024**3),
+            ("1.5GiB", int(1.5 * 1024**3)),
+            ("64 KB", 64 * 1024),
+        ],
+    )
+    def test_parse(self, text, expected):
+        assert parse_size(text) == expected
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            parse_size("lots")
+
+
+class TestMemoryBudget:
+    def test_current_rss(self):
+        assert current_rss() > 0
+
+    def test_records_high_water_per_stage(self):
+        budget = MemoryBudget()
+        with patch("embs.indexer.memory.current_rss", side_effect=[100, 300, 200]):
+            budget.sample("chunk")
+            budget.sample("embed")
+            budget.sample("chunk")
+
+        assert budget.high_water == {"chunk": 200, "embed": 300}
+        assert budget.peak == 300
+        assert "embed" in budget.report()
+
+    def test_without_limit_never_adjusts(self):
+        budget = MemoryBudget(batch_size=16, queue_size=4)
+        with patch("embs.indexer.memory.current_rss", return_value=10**12):
+            budget.sample("embed")
+
+        assert (budget.batch_size, budget.queue_size) == (16, 4)
+
+    def test_shrinks_near_limit_and_recovers(self):
+        budget = MemoryBudget(1000, batch_size=16, queue_size=4)
+
+        with patch("embs.indexer.memory.current_rss", return_value=900):
+            budget.sample("embed")
+        assert (budget.batch_size, budget.queue_size) == (8, 2)
+        assert budget.shrinks == 1
+
+        with patch("embs.indexer.memory.current_rss", return_value=1100):
+            for _ in range(5):
+                budget.sample("embed")
+        assert (budget.batch_size, budget.queue_size) == (1, 1)
+        assert budget.over_limit == 5
+
+        with patch("embs.indexer.memory.current_rss", return_value=100):
+            for _ in range(10):
+                budget.sample("embed")
+        assert (budget.batch_size, budget.queue_size) == (16, 4)
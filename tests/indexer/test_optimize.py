@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from embs.indexer.optimize import optimize, tuned_vec_chunk_size
+from embs.indexer.store import VectorStore
+
+
+def _vec(seed: int, dim: int = 8) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def _interleaved_db(path, *, backend=None):
+    """ファイルを交互に追加・更新して、同じファイルのidが散らばったDBを作る"""
+    store = VectorStore(path, backend=backend)
+    store.create_tables(model_name="test-model", dim=8)
+    for i in range(3):
+        store.insert_batch(
+            (name, i, f"{name}-{i}", _vec(seed + i)) for name, seed in (("a.md", 0), ("b.md", 100))
+        )
+    store.delete_source("a.md")
+    store.insert_batch(("a.md", i, f"a.md-{i}", _vec(7 + i)) for i in range(3))
+    return store
+
+
+def _contents(store: VectorStore) -> dict[tuple[str, int], tuple[str, bytes]]:
+    return {
+        (source, index): (text, emb.tobytes())
+        for batch in store.iter_rows()
+        for source, index, text, emb in zip(
+            batch.source_files, batch.chunk_indexes, batch.texts, batch.embeddings
+        )
+    }
+
+
+class TestTunedVecChunkSize:
+    def test_bounds_and_multiple_of_eight(self):
+        assert tuned_vec_chunk_size(0) == 64
+        assert tuned_vec_chunk_size(10_000) == 1256
+        assert tuned_vec_chunk_size(10_000_000) == 4096
+        assert all(tuned_vec_chunk_size(n) % 8 == 0 for n in range(0, 50_000, 997))
+
+
+class TestOptimize:
+    @pytest.mark.parametrize("backend", ["sqlite-vec", "numpy"])
+    def test_clusters_rows_by_source_and_keeps_contents(self, tmp_path, backend):
+        db = tmp_path / "index.db"
+        store = _interleaved_db(db, backend=backend)
+        before = _contents(store)
+        assert store.storage_stats()["locality"] < 1.0
+        store.close()
+
+        report = optimize(db, latency_queries=3)
+
+        assert report.chunks == 6
+        assert report.locality_after == 1.0
+        store = VectorStore(db)
+        assert _contents(store) == before
+        rows = next(store.iter_rows())
+        assert list(zip(rows.source_files, rows.chunk_indexes)) == [
+            ("a.md", 0), ("a.md", 1), ("a.md", 2), ("b.md", 0), ("b.md", 1), ("b.md", 2)
+        ]
+        hit = store.search(_vec(8), top_k=1)[0]
+        assert (hit["source_file"], hit["chunk_index"]) == ("a.md", 1)
+        assert store.backend == backend
+        store.close()
+
+    def test_sets_vec_chunk_size_and_reports(self, tmp_path):
+        db = tmp_path / "index.db"
+        _interleaved_db(db).close()
+
+        report = optimize(db, vec_chunk_size=16, latency_queries=2)
+
+        assert (report.vec_chunk_size_before, report.vec_chunk_size_after) == (1024, 16)
+        assert report.size_before > 0 and report.size_after > 0
+        assert report.latency_before > 0 and report.latency_after > 0
+        store = VectorStore(db)
+        assert store.storage_stats()["vec_chunk_size"] == 16
+        # 以降の追加も同じchunk_sizeのテーブルに入る
+        store.insert("c.md", 0, "c", _vec(99))
+        assert store.search(_vec(99), top_k=1)[0]["source_file"] == "c.md"
+        store.close()
+
+    def test_remaps_duplicates_and_spaces(self, tmp_path):
+        db = tmp_path / "index.db"
+        store = _interleaved_db(db)
+        store.add_space("small", model_name="small-model", dim=4)
+        old_id = _ids_by_position(store)[("a.md", 2)]
+        store.add_duplicates([(old_id, "c.md", 5)])
+        store.insert_space_vectors("small", [(old_id, _vec(3, 4))])
+        store.close()
+
+        optimize(db, latency_queries=0)
+
+        store = VectorStore(db)
+        new_id = _ids_by_position(store)[("a.md", 2)]
+        assert store.get_duplicates([new_id]) == {new_id: [("c.md", 5)]}
+        vectors = store.get_space_vectors("small", np.array([new_id]))
+        np.testing.assert_array_equal(vectors[new_id], _vec(3, 4))
+        store.close()
+
+    def test_rebuilds_ann(self, tmp_path):
+        pytest.importorskip("hnswlib")
+        db = tmp_path / "index.db"
+        store = _interleaved_db(db)
+        store.build_ann()
+        store.close()
+
+        optimize(db, latency_queries=0)
+
+        store = VectorStore(db)
+        assert store.get_metadata()["ann_index"] == "hnsw"
+        hit = store.search(_vec(8), top_k=1)[0]
+        assert (hit["source_file"], hit["chunk_index"]) == ("a.md", 1)
+        store.close()
+
+    def test_rejects_invalid_chunk_size(self, tmp_path):
+        db = tmp_path / "index.db"
+        _interleaved_db(db).close()
+        with pytest.raises(ValueError):
+            optimize(db, vec_chunk_size=12)
+
+    def test_missing_db(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            optimize(tmp_path / "missing.db")
+
+
+def _ids_by_position(store: VectorStore) -> dict[tuple[str, int], int]:
+    return {
+        (source, index): rowid
+        for batch in store.iter_rows()
+        for rowid, source, index in zip(batch.ids.tolist(), batch.source_files, batch.chunk_indexes)
+    }
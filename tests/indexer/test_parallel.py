@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from embs.indexer.parallel import EmbeddingPool, available_cores, core_slices
+
+FAKE_LOADER = "tests.indexer.test_parallel:FakeModel"
+
+
+class FakeModel:
+    """テキスト末尾の番号・ワーカーのpid・固定されたコア数を返すモデル"""
+
+    max_seq_length = 128
+
+    def __init__(self, model_name: str) -> None:
+        self.model_name = model_name
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return 3
+
+    def encode(self, texts, normalize_embeddings=False):
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else 0
+        return np.array(
+            [[float(t.rsplit("-", 1)[1]), os.getpid(), cores] for t in texts],
+            dtype=np.float32,
+        )
+
+
+class TestCoreSlices:
+    def test_disjoint_slices(self):
+        assert core_slices(2, 2, [0, 1, 2, 3]) == [[0, 1], [2, 3]]
+
+    def test_wraps_when_oversubscribed(self):
+        assert core_slices(3, 1, [4, 5]) == [[4], [5], [4]]
+
+    def test_available_cores_not_empty(self):
+        assert available_cores()
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = EmbeddingPool("m", 2, threads_per_worker=1, loader=FAKE_LOADER)
+    yield pool
+    pool.close()
+
+
+class TestEmbeddingPool:
+    def test_rejects_zero_workers(self):
+        with pytest.raises(ValueError):
+            EmbeddingPool("m", 0, loader=FAKE_LOADER)
+
+    def test_encode_keeps_order_across_workers(self, pool):
+        texts = [f"text-{i}" for i in range(11)]
+        result = pool.encode(texts)
+
+        assert result.shape == (11, 3)
+        assert result.dtype == np.float32
+        assert result[:, 0].tolist() == list(range(11))
+        # 起動時に2つのワーカーが揃い、それぞれ1コアに固定される
+        assert len(set(pool.pids)) == 2
+        assert set(result[:, 1].tolist()) <= {float(pid) for pid in pool.pids}
+        if hasattr(os, "sched_setaffinity"):
+            assert set(result[:, 2].tolist()) == {1.0}
+
+    def test_reports_model_shape_and_encodes_empty(self, pool):
+        assert (pool.dim, pool.max_seq_length) == (3, 128)
+        assert pool.encode([]).shape == (0, 3)
+
+    def test_fewer_texts_than_workers(self, pool):
+        result = pool.encode(["a-0"])
+
+        assert result[:, 0].tolist() == [0.0]
+
+
+class TestEmbedderWorkers:
+    @patch("embs.indexer.embedder.AutoTokenizer")
+    @patch("embs.indexer.parallel.EmbeddingPool")
+    @patch("embs.indexer.embedder.SentenceTransformer")
+    def test_embed_uses_pool(self, mock_st_cls, mock_pool_cls, mock_tokenizer_cls):
+        from embs.indexer.embedder import Embedder
+
+        mock_pool_cls.return_value.encode.return_value = np.zeros((2, 4), dtype=np.float32)
+        mock_pool_cls.return_value.dim = 4
+        mock_tokenizer_cls.from_pretrained.return_value.return_value = {"input_ids": [1, 2]}
+        embedder = Embedder(workers=4, threads_per_worker=2)
+        embedder.embed(["a", "b"])
+        assert embedder.dim == 4
+        assert embedder.token_count("a") == 2
+        embedder.close()
+
+        # 親プロセスではモデルを読み込まず、トークナイザだけを読み込む
+        mock_st_cls.assert_not_called()
+        mock_tokenizer_cls.from_pretrained.assert_called_once_with(
+            embedder.model_name, local_files_only=False
+        )
+
+        mock_pool_cls.assert_called_once_with(embedder.model_name, 4, threads_per_worker=2)
+        mock_pool_cls.return_value.encode.assert_called_once_with(["a", "b"])
+        mock_pool_cls.return_value.close.assert_called_once()
+
+    @patch("embs.indexer.parallel.EmbeddingPool")
+    @patch("embs.indexer.embedder.SentenceTransformer")
+    def test_single_worker_stays_in_process(self, mock_st_cls, mock_pool_cls):
+        from embs.indexer.embedder import Embedder
+
+        Embedder(workers=1).embed(["a"])
+
+        mock_pool_cls.assert_not_called()
+        mock_st_cls.return_value.encode.assert_called_once()
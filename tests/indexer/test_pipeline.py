@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from embs.fetchers.base import Document
+from embs.indexer.chunker import Chunk, ChunkSizing
+from embs.indexer.dedup import Deduplicator
+from embs.indexer.memory import MemoryBudget
+from embs.indexer.pipeline import backfill_space, index_documents
+
+
+def _fake_chunk_text(text, source_file):
+    return [
+        Chunk(text=line, source_file=source_file, chunk_index=i)
+        for i, line in enumerate(text.splitlines())
+    ]
+
+
+def _make_store():
+    store = MagicMock()
+    next_id = iter(range(1, 1000))
+    store.insert_batch.side_effect = lambda rows: [next(next_id) for _ in rows]
+    return store
+
+
+def _make_embedder():
+    embedder = MagicMock()
+    embedder.embed.side_effect = lambda texts: np.zeros((len(texts), 768), dtype=np.float32)
+    return embedder
+
+
+class TestIndexDocuments:
+    @patch("embs.indexer.pipeline.chunk_text", side_effect=_fake_chunk_text)
+    def test_streams_documents_into_store(self, _mock_chunk):
+        store = _make_store()
+        docs = [
+            Document(id="1", name="a.md", text="x\ny"),
+            Document(id="2", name="sub/b.md", text="z"),
+        ]
+
+        stats = index_documents(iter(docs), store, _make_embedder())
+
+        assert stats.documents == 2
+        assert stats.chunks == 3
+        store.delete_source.assert_any_call("a.md")
+        store.delete_source.assert_any_call("b.md")
+
+    @patch("embs.indexer.pipeline.chunk_text", side_effect=_fake_chunk_text)
+    def test_batches_embeddings(self, _mock_chunk):
+        store = _make_store()
+        embedder = _make_embedder()
+        docs = [Document(id=str(i), name=f"{i}.md", text="a\nb") for i in range(3)]
+
+        index_documents(docs, store, embedder, batch_size=4)
+
+        assert [len(c.args[0]) for c in embedder.embed.call_args_list] == [4, 2]
+
+    @patch("embs.indexer.pipeline.chunk_text", side_effect=_fake_chunk_text)
+    def test_mirror_writes_markdown(self, _mock_chunk, tmp_path):
+        store = _make_store()
+        docs = [Document(id="1", name="sub/a.md", text="本文")]
+
+        index_documents(docs, store, _make_embedder(), mirror_dir=tmp_path)
+
+        assert (tmp_path / "sub" / "a.md").read_text(encoding="utf-8") == "本文"
+
+    @patch("embs.indexer.pipeline.chunk_text", side_effect=_fake_chunk_text)
+    def test_propagates_fetch_error(self, _mock_chunk):
+        def failing():
+            yield Document(id="1", name="a.md", text="x")
+            raise RuntimeError("fetch failed")
+
+        store = _make_store()
+
+        with pytest.raises(RuntimeError, match="fetch failed"):
+            index_documents(failing(), store, _make_embedder())
+
+
+    @patch("embs.indexer.pipeline.chunk_text", side_effect=_fake_chunk_text)
+    def test_dedup_within_and_across_batches(self, _mock_chunk):
+        store = _make_store()
+        common = "共通の注意書き: 作業前に必ず関係者へ連絡すること。"
+        docs = [
+            Document(id="1", name="a.md", text=f"{common}\n本文A\n{common}"),
+            Document(id="2", name="b.md", text=f"本文B\n{common}"),
+        ]
+
+        stats = index_documents(
+            docs, store, _make_embedder(), batch_size=3, deduplicator=Deduplicator()
+        )
+
+        assert (stats.chunks, stats.duplicates) == (3, 2)
+        recorded = [row for c in store.add_duplicates.call_args_list for row in c.args[0]]
+        assert recorded == [(1, "a.md", 2), (1, "b.md", 1)]
+
+    @patch("embs.indexer.pipeline.chunk_text", side_effect=_fake_chunk_text)
+    def test_memory_pressure_shrinks_batches(self, _mock_chunk):
+        store = _make_store()
+        embedder = _make_embedder()
+        docs = [Document(id="1", name="a.md", text="\n".join("abcdefgh"))]
+        memory = MemoryBudget(1000, batch_size=4, queue_size=4)
+
+        with patch("embs.indexer.memory.current_rss", return_value=950):
+            stats = index_documents(docs, store, embedder, batch_size=4, memory=memory)
+
+        assert stats.chunks == 8
+        sizes = [len(c.args[0]) for c in embedder.embed.call_args_list]
+        assert sizes[0] == 1
+        assert sum(sizes) == 8
+        assert memory.batch_size == 1
+        assert set(memory.high_water) >= {"fetch", "chunk", "embed", "store"}
+
+
+    @patch("embs.indexer.pipeline.chunk_text", side_effect=_fake_chunk_text)
+    def test_resizes_chunks(self, _mock_chunk):
+        embedder = _make_embedder()
+        docs = [Document(id="1", name="a.md", text="x\ny\nz")]
+
+        stats = index_documents(
+            docs, _make_store(), embedder, sizing=ChunkSizing(target_tokens=16)
+        )
+
+        assert stats.chunks == 1
+        embedder.embed.assert_called_once_with(["x\ny\nz"])
+
+
+class TestBackfillSpace:
+    def test_fills_in_batches_until_done(self):
+        store = MagicMock()
+        store.missing_in_space.side_effect = [
+            [(1, "a"), (2, "b")],
+            [(3, "c")],
+            [],
+        ]
+        store.insert_space_vectors.side_effect = lambda name, rows: len(list(rows))
+        embedder = _make_embedder()
+
+        done = backfill_space(store, "small", embedder, batch_size=2)
+
+        assert done == 3
+        assert store.insert_space_vectors.call_count == 2
+        # 2回目以降は前のバッチの最後のidから続けて探す
+        assert [c.kwargs["after"] for c in store.missing_in_space.call_args_list] == [0, 2, 3]
+
+    def test_respects_limit(self):
+        store = MagicMock()
+        store.missing_in_space.return_value = [(1, "a")]
+        store.insert_space_vectors.side_effect = lambda name, rows: len(list(rows))
+
+        done = backfill_space(store, "small", _make_embedder(), batch_size=5, limit=1)
+
+        assert done == 1
+        store.missing_in_space.assert_called_once_with("small", 1, after=0)
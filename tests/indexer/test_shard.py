@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from embs.indexer.shard import merge_stores, parse_shard, shard_of
+from embs.indexer.store import VectorStore
+
+
+def _vec(seed: int, dim: int = 8) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def _shard_db(path, files, *, model="test-model", dim=8, backend=None):
+    store = VectorStore(path, backend=backend)
+    store.create_tables(model_name=model, dim=dim)
+    rows = [(name, i, f"{name}-{i}") for name, n in files for i in range(n)]
+    ids = store.insert_batch(
+        (name, i, text, _vec(len(name) * 100 + i + dim, dim)) for name, i, text in rows
+    )
+    return store, ids
+
+
+class TestParseShard:
+    def test_valid(self):
+        assert parse_shard("0/4") == (0, 4)
+        assert parse_shard(" 3 / 4 ") == (3, 4)
+
+    @pytest.mark.parametrize("text", ["4/4", "1", "a/b", "0/0", "-1/2"])
+    def test_invalid(self, text):
+        with pytest.raises(ValueError):
+            parse_shard(text)
+
+
+class TestShardOf:
+    def test_partition_is_deterministic_and_complete(self):
+        names = [f"doc-{i}.md" for i in range(200)]
+        shards = [shard_of(n, 4) for n in names]
+
+        assert shards == [shard_of(n, 4) for n in names]
+        assert set(shards) == {0, 1, 2, 3}
+
+    def test_same_source_file_same_shard(self):
+        # インデックスのsource_fileはファイル名部分なので、ディレクトリが違っても同じシャード
+        assert shard_of("a/x.md", 7) == shard_of("b/x.md", 7) == shard_of("x.md", 7)
+
+
+class TestMergeStores:
+    def test_merge_remaps_ids_and_copies_vectors(self, tmp_path):
+        a, _ = _shard_db(tmp_path / "a.db", [("a.md", 3)])
+        b, _ = _shard_db(tmp_path / "b.db", [("b.md", 2)])
+        a_rows = next(a.iter_rows())
+        b_rows = next(b.iter_rows())
+        a.close()
+        b.close()
+
+        stats = merge_stores([tmp_path / "a.db", tmp_path / "b.db"], tmp_path / "out.db")
+
+        assert (stats.shards, stats.chunks) == (2, 5)
+        merged = VectorStore(tmp_path / "out.db")
+        rows = next(merged.iter_rows())
+        assert rows.ids.tolist() == [1, 2, 3, 4, 5]
+        assert rows.texts == a_rows.texts + b_rows.texts
+        np.testing.assert_array_equal(
+            rows.embeddings, np.vstack([a_rows.embeddings, b_rows.embeddings])
+        )
+        assert merged.get_model_name() == "test-model"
+        hit = merged.search(b_rows.embeddings[1], top_k=1)[0]
+        assert (hit["source_file"], hit["chunk_index"]) == ("b.md", 1)
+        merged.close()
+
+    def test_remaps_duplicates_and_spaces(self, tmp_path):
+        a, _ = _shard_db(tmp_path / "a.db", [("a.md", 2)])
+        a.add_space("small", model_name="small-model", dim=4)
+        a.close()
+        b, b_ids = _shard_db(tmp_path / "b.db", [("b.md", 2)])
+        b.add_space("small", model_name="small-model", dim=4)
+        b.add_duplicates([(b_ids[1], "c.md", 0)])
+        b.insert_space_vectors("small", [(b_ids[0], _vec(1, 4))])
+        b.close()
+
+        stats = merge_stores([tmp_path / "a.db", tmp_path / "b.db"], tmp_path / "out.db")
+
+        assert (stats.duplicates, stats.space_vectors) == (1, 1)
+        merged = VectorStore(tmp_path / "out.db")
+        assert merged.get_duplicates([4]) == {4: [("c.md", 0)]}
+        assert list(merged.get_space_vectors("small", np.array([1, 2, 3, 4]))) == [3]
+        merged.close()
+
+    def test_dedup_across_shards(self, tmp_path):
+        from embs.indexer.dedup import Deduplicator
+
+        text = "同じ内容の段落が別々のシャードに入った場合の本文です。" * 3
+        a = VectorStore(tmp_path / "a.db")
+        a.create_tables(model_name="test-model", dim=8)
+        a.add_space("small", model_name="small-model", dim=4)
+        a.insert_batch([("a.md", 0, text, _vec(1)), ("a.md", 1, "a only", _vec(2))])
+        a.close()
+        b = VectorStore(tmp_path / "b.db")
+        b.create_tables(model_name="test-model", dim=8)
+        b.add_space("small", model_name="small-model", dim=4)
+        (b_id,) = b.insert_batch([("b.md", 3, text, _vec(3))])
+        b.add_duplicates([(b_id, "c.md", 0)])
+        b.insert_space_vectors("small", [(b_id, _vec(4, 4))])
+        b.close()
+        shards = [tmp_path / "a.db", tmp_path / "b.db"]
+
+        plain = merge_stores(shards, tmp_path / "plain.db")
+        stats = merge_stores(shards, tmp_path / "out.db", deduplicator=Deduplicator())
+
+        assert (plain.chunks, plain.deduplicated) == (3, 0)
+        assert (stats.chunks, stats.deduplicated, stats.duplicates) == (2, 1, 2)
+        merged = VectorStore(tmp_path / "out.db")
+        # b.mdのチャンクとその重複は、先に結合したa.mdのチャンクにまとめられる
+        assert merged.get_duplicates([1]) == {1: [("b.md", 3), ("c.md", 0)]}
+        assert merged.get_space_vectors("small", np.array([1, 2])) == {}
+        merged.close()
+
+    def test_numpy_backend(self, tmp_path):
+        for name in ("a", "b"):
+            store, _ = _shard_db(tmp_path / f"{name}.db", [(f"{name}.md", 2)], backend="numpy")
+            store.close()
+
+        merge_stores([tmp_path / "a.db", tmp_path / "b.db"], tmp_path / "out.db")
+
+        merged = VectorStore(tmp_path / "out.db")
+        assert merged.backend == "numpy"
+        assert len(next(merged.iter_rows()).ids) == 4
+        merged.close()
+
+    def test_model_mismatch(self, tmp_path):
+        _shard_db(tmp_path / "a.db", [("a.md", 1)])[0].close()
+        _shard_db(tmp_path / "b.db", [("b.md", 1)], model="other-model")[0].close()
+
+        with pytest.raises(ValueError, match="model_name"):
+            merge_stores([tmp_path / "a.db", tmp_path / "b.db"], tmp_path / "out.db")
+
+    def test_dim_mismatch(self, tmp_path):
+        _shard_db(tmp_path / "a.db", [("a.md", 1)])[0].close()
+        _shard_db(tmp_path / "b.db", [("b.md", 1)], dim=4)[0].close()
+
+        with pytest.raises(ValueError, match="embedding_dim"):
+            merge_stores([tmp_path / "a.db", tmp_path / "b.db"], tmp_path / "out.db")
+
+    def test_overlapping_sources(self, tmp_path):
+        _shard_db(tmp_path / "a.db", [("a.md", 1)])[0].close()
+        _shard_db(tmp_path / "b.db", [("a.md", 1)])[0].close()
+
+        with pytest.raises(ValueError, match="a.md"):
+            merge_stores([tmp_path / "a.db", tmp_path / "b.db"], tmp_path / "out.db")
+
+    def test_existing_output(self, tmp_path):
+        _shard_db(tmp_path / "a.db", [("a.md", 1)])[0].close()
+        (tmp_path / "out.db").touch()
+
+        with pytest.raises(FileExistsError):
+            merge_stores([tmp_path / "a.db"], tmp_path / "out.db")
+
+    def test_missing_shard(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            merge_stores([tmp_path / "missing.db"], tmp_path / "out.db")
+        assert not (tmp_path / "missing.db").exists()
+
+    def test_rebuilds_ann(self, tmp_path):
+        pytest.importorskip("hnswlib")
+        store, _ = _shard_db(tmp_path / "a.db", [("a.md", 3)])
+        store.build_ann()
+        store.close()
+        _shard_db(tmp_path / "b.db", [("b.md", 3)])[0].close()
+
+        merge_stores([tmp_path / "a.db", tmp_path / "b.db"], tmp_path / "out.db")
+
+        merged = VectorStore(tmp_path / "out.db")
+        assert merged.get_metadata()["ann_index"] == "hnsw"
+        assert len(merged.search(_vec(0), top_k=6)) == 6
+        merged.close()
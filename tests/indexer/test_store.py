@@ -5,7 +5,13 @@ import struct
 import numpy as np
 import pytest
 
-from embs.indexer.store import EMBEDDING_DIM, VectorStore, _serialize_f32
+from embs.indexer.store import (
+    EMBEDDING_DIM,
+    VectorStore,
+    _serialize_f32,
+    staging_path,
+    swap_in,
+)
 
 
 class TestSerializeF32:
@@ -136,6 +142,23 @@ class TestVectorStore:
 
         store.close()
 
+    def test_search_method(self, tmp_path, sample_embedding):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path)
+        store.create_tables(model_name="test-model")
+        store.insert(
+            source_file="doc.md",
+            chunk_index=0,
+            text="テスト文書",
+            embedding=sample_embedding,
+        )
+
+        results = store.search(sample_embedding, top_k=5)
+
+        assert len(results) == 1
+        assert results[0]["source_file"] == "doc.md"
+        store.close()
+
     def test_insert_stores_chunk_data(self, tmp_path, sample_embedding):
         db_path = tmp_path / "test.db"
         store = VectorStore(db_path)
@@ -155,6 +178,41 @@ class TestVectorStore:
         assert row == ("doc.md", 0, "テスト文書")
         store.close()
 
+    def test_insert_many(self, tmp_path, sample_embedding):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path)
+        store.create_tables(model_name="test-model")
+
+        count = store.insert_many(
+            [
+                ("doc.md", 0, "一", sample_embedding),
+                ("doc.md", 1, "二", sample_embedding),
+            ]
+        )
+
+        assert count == 2
+        cur = store.conn.cursor()
+        assert cur.execute("SELECT COUNT(*) FROM vec_chunks").fetchone()[0] == 2
+        store.close()
+
+    def test_delete_source(self, tmp_path, sample_embedding):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path)
+        store.create_tables(model_name="test-model")
+        store.insert_many(
+            [
+                ("a.md", 0, "a", sample_embedding),
+                ("b.md", 0, "b", sample_embedding),
+            ]
+        )
+
+        assert store.delete_source("a.md") == 1
+
+        cur = store.conn.cursor()
+        assert cur.execute("SELECT source_file FROM chunks").fetchall() == [("b.md",)]
+        assert cur.execute("SELECT COUNT(*) FROM vec_chunks").fetchone()[0] == 1
+        store.close()
+
     def test_close(self, tmp_path):
         db_path = tmp_path / "test.db"
         store = VectorStore(db_path)
@@ -165,3 +223,599 @@ class TestVectorStore:
 
     def test_embedding_dim_is_768(self):
         assert EMBEDDING_DIM == 768
+
+
+class TestVectorStoreNumpyBackend:
+    def test_backend_recorded_in_metadata(self, tmp_path):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path, backend="numpy")
+        store.create_tables(model_name="test-model")
+        store.close()
+
+        reopened = VectorStore(db_path)
+        assert reopened.backend == "numpy"
+        reopened.close()
+
+    def test_insert_and_search(self, tmp_path, sample_embedding):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path, backend="numpy")
+        store.create_tables(model_name="test-model")
+        store.insert(
+            source_file="doc.md",
+            chunk_index=0,
+            text="テスト文書",
+            embedding=sample_embedding,
+        )
+        store.close()
+
+        store = VectorStore(db_path)
+        results = store.search(sample_embedding, top_k=5)
+
+        assert len(results) == 1
+        assert results[0]["source_file"] == "doc.md"
+        assert results[0]["text"] == "テスト文書"
+        assert results[0]["distance"] == pytest.approx(0.0, abs=1e-3)
+        # ベクトルはvec_chunksではなく.npyに保存される
+        assert store.conn.execute("SELECT COUNT(*) FROM vec_chunks").fetchone()[0] == 0
+        store.close()
+
+    def test_search_respects_top_k(self, tmp_path):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path, backend="numpy")
+        store.create_tables(model_name="test-model")
+
+        rng = np.random.default_rng(42)
+        rows = []
+        for i in range(10):
+            vec = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+            rows.append((f"doc{i}.md", 0, f"text {i}", vec / np.linalg.norm(vec)))
+        store.insert_many(rows)
+
+        assert len(store.search(rows[0][3], top_k=3)) == 3
+        assert store.search(rows[0][3], top_k=3)[0]["source_file"] == "doc0.md"
+        store.close()
+
+    def test_delete_source(self, tmp_path, sample_embedding):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path, backend="numpy")
+        store.create_tables(model_name="test-model")
+        store.insert_many(
+            [
+                ("a.md", 0, "a", sample_embedding),
+                ("b.md", 0, "b", sample_embedding),
+            ]
+        )
+
+        store.delete_source("a.md")
+
+        results = store.search(sample_embedding, top_k=5)
+        assert [r["source_file"] for r in results] == ["b.md"]
+        store.close()
+
+    def test_invalid_backend(self, tmp_path):
+        with pytest.raises(ValueError):
+            VectorStore(tmp_path / "test.db", backend="faiss")
+
+
+class TestVectorStoreTransaction:
+    @pytest.mark.parametrize("backend", ["sqlite-vec", "numpy"])
+    def test_commits_once_at_end(self, tmp_path, sample_embedding, backend):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path, backend=backend)
+        store.create_tables(model_name="test-model")
+        store.insert("a.md", 0, "old", sample_embedding)
+
+        with store.transaction():
+            store.delete_source("a.md")
+            store.insert("a.md", 0, "new", sample_embedding)
+            reader = VectorStore(db_path)
+            assert [r["text"] for r in reader.search(sample_embedding, top_k=5)] == ["old"]
+            reader.close()
+
+        reader = VectorStore(db_path)
+        assert [r["text"] for r in reader.search(sample_embedding, top_k=5)] == ["new"]
+        reader.close()
+        store.close()
+
+    @pytest.mark.parametrize("backend", ["sqlite-vec", "numpy"])
+    def test_rolls_back_on_error(self, tmp_path, sample_embedding, backend):
+        store = VectorStore(tmp_path / "test.db", backend=backend)
+        store.create_tables(model_name="test-model")
+        store.insert("a.md", 0, "old", sample_embedding)
+
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.delete_source("a.md")
+                store.insert("b.md", 0, "new", sample_embedding)
+                raise RuntimeError("boom")
+
+        assert [r["text"] for r in store.search(sample_embedding, top_k=5)] == ["old"]
+        store.close()
+
+
+class TestVectorStoreAnn:
+    @pytest.fixture(autouse=True)
+    def _require_hnswlib(self):
+        pytest.importorskip("hnswlib")
+
+    def _populate(self, store, n=20):
+        rng = np.random.default_rng(0)
+        rows = []
+        for i in range(n):
+            vec = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+            rows.append((f"doc{i}.md", 0, f"text {i}", vec / np.linalg.norm(vec)))
+        store.insert_many(rows)
+        return rows
+
+    @pytest.mark.parametrize("backend", ["sqlite-vec", "numpy"])
+    def test_build_ann_and_search(self, tmp_path, backend):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path, backend=backend)
+        store.create_tables(model_name="test-model")
+        rows = self._populate(store)
+
+        assert store.build_ann() == 20
+        store.close()
+
+        store = VectorStore(db_path)
+        approx = store.search(rows[5][3], top_k=3, ef_search=32)
+        exact = store.search(rows[5][3], top_k=3, exact=True)
+
+        assert approx[0]["source_file"] == "doc5.md"
+        assert [r["id"] for r in approx] == [r["id"] for r in exact]
+        store.close()
+
+    def test_ann_kept_in_sync(self, tmp_path, sample_embedding):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path)
+        store.create_tables(model_name="test-model")
+        self._populate(store)
+        store.build_ann()
+
+        store.insert(
+            source_file="new.md", chunk_index=0, text="new", embedding=sample_embedding
+        )
+        assert store.search(sample_embedding, top_k=1)[0]["source_file"] == "new.md"
+
+        store.delete_source("new.md")
+        assert store.search(sample_embedding, top_k=1)[0]["source_file"] != "new.md"
+        store.close()
+
+    def test_transaction_rollback_keeps_ann(self, tmp_path, sample_embedding):
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="test-model")
+        self._populate(store)
+        store.insert("a.md", 0, "a", sample_embedding)
+        store.build_ann()
+
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.delete_source("a.md")
+                raise RuntimeError("boom")
+
+        assert store.search(sample_embedding, top_k=1)[0]["source_file"] == "a.md"
+        store.close()
+
+    def test_build_ann_empty_raises(self, tmp_path):
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="test-model")
+
+        with pytest.raises(ValueError):
+            store.build_ann()
+        store.close()
+
+
+class TestVectorStorePragmas:
+    def test_wal_mode(self, tmp_path):
+        store = VectorStore(tmp_path / "test.db")
+
+        assert store.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        # NORMAL = 1
+        assert store.conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        store.close()
+
+    def test_reader_not_blocked_by_open_write(self, tmp_path, sample_embedding):
+        db_path = tmp_path / "test.db"
+        writer = VectorStore(db_path)
+        writer.create_tables(model_name="test-model")
+        writer.insert("a.md", 0, "a", sample_embedding)
+
+        writer.conn.execute("BEGIN IMMEDIATE")
+        writer.conn.execute(
+            "INSERT INTO chunks (source_file, chunk_index, text) VALUES ('b.md', 0, 'b')"
+        )
+        reader = VectorStore(db_path)
+        assert len(reader.search(sample_embedding, top_k=5)) == 1
+
+        writer.conn.rollback()
+        reader.close()
+        writer.close()
+
+
+class TestSwapIn:
+    def _build(self, path, text, embedding):
+        store = VectorStore(path)
+        store.create_tables(model_name="test-model")
+        store.insert("doc.md", 0, text, embedding)
+        store.close()
+
+    def test_swap_replaces_regular_file(self, tmp_path, sample_embedding):
+        db_path = tmp_path / "index.db"
+        self._build(db_path, "old", sample_embedding)
+
+        staged = staging_path(db_path)
+        self._build(staged, "new", sample_embedding)
+        swap_in(db_path, staged)
+
+        assert db_path.is_symlink()
+        store = VectorStore(db_path)
+        assert store.search(sample_embedding, top_k=1)[0]["text"] == "new"
+        store.close()
+
+    def test_open_reader_keeps_old_version(self, tmp_path, sample_embedding):
+        db_path = tmp_path / "index.db"
+        first = staging_path(db_path)
+        self._build(first, "v1", sample_embedding)
+        swap_in(db_path, first)
+
+        reader = VectorStore(db_path)
+        second = staging_path(db_path)
+        self._build(second, "v2", sample_embedding)
+        swap_in(db_path, second)
+
+        assert reader.search(sample_embedding, top_k=1)[0]["text"] == "v1"
+        fresh = VectorStore(db_path)
+        assert fresh.search(sample_embedding, top_k=1)[0]["text"] == "v2"
+        fresh.close()
+        reader.close()
+
+    def test_previous_version_kept_until_next_swap(self, tmp_path, sample_embedding):
+        pytest.importorskip("hnswlib")
+        db_path = tmp_path / "index.db"
+        versions = []
+        for text in ("v1", "v2"):
+            versions.append(staging_path(db_path))
+            self._build(versions[-1], text, sample_embedding)
+            store = VectorStore(versions[-1])
+            store.build_ann()
+            store.close()
+            swap_in(db_path, versions[-1])
+
+        # 直前の版を開いているプロセスは、付随ファイルを後から開き直しても読める
+        assert versions[0].exists()
+        assert versions[0].with_name(versions[0].name + ".hnsw").exists()
+        reader = VectorStore(versions[0])
+        assert reader.search(sample_embedding, top_k=1)[0]["text"] == "v1"
+        reader.close()
+
+        versions.append(staging_path(db_path))
+        self._build(versions[-1], "v3", sample_embedding)
+        swap_in(db_path, versions[-1])
+
+        assert not versions[0].exists()
+        assert not versions[0].with_name(versions[0].name + ".hnsw").exists()
+        assert versions[1].exists()
+        store = VectorStore(db_path)
+        assert store.search(sample_embedding, top_k=1)[0]["text"] == "v3"
+        store.close()
+
+    def test_sidecars_of_replaced_regular_file_removed_on_next_swap(
+        self, tmp_path, sample_embedding
+    ):
+        db_path = tmp_path / "index.db"
+        store = VectorStore(db_path, backend="numpy")
+        store.create_tables(model_name="test-model")
+        store.insert("doc.md", 0, "old", sample_embedding)
+        store.close()
+        sidecar = db_path.with_name(db_path.name + ".vectors.log")
+        assert sidecar.exists()
+
+        staged = staging_path(db_path)
+        self._build(staged, "v1", sample_embedding)
+        swap_in(db_path, staged)
+        assert sidecar.exists()
+
+        staged = staging_path(db_path)
+        self._build(staged, "v2", sample_embedding)
+        swap_in(db_path, staged)
+        assert not sidecar.exists()
+
+    def test_swap_moves_numpy_sidecars(self, tmp_path, sample_embedding):
+        db_path = tmp_path / "index.db"
+        staged = staging_path(db_path)
+        store = VectorStore(staged, backend="numpy")
+        store.create_tables(model_name="test-model")
+        store.insert("doc.md", 0, "numpy", sample_embedding)
+        store.close()
+
+        swap_in(db_path, staged)
+
+        store = VectorStore(db_path)
+        assert store.backend == "numpy"
+        assert store.search(sample_embedding, top_k=1)[0]["text"] == "numpy"
+        store.close()
+
+
+class TestVectorStoreCompression:
+    @pytest.fixture(autouse=True)
+    def _require_zstandard(self):
+        pytest.importorskip("zstandard")
+
+    def _populate(self, store):
+        rng = np.random.default_rng(0)
+        rows = []
+        for i in range(200):
+            vec = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+            text = f"文書{i}: デプロイ手順とエラーハンドリングの方針について説明します。"
+            rows.append((f"doc{i}.md", 0, text, vec / np.linalg.norm(vec)))
+        store.insert_many(rows)
+        return rows
+
+    @pytest.mark.parametrize("backend", ["sqlite-vec", "numpy"])
+    def test_compress_and_search(self, tmp_path, backend):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path, backend=backend)
+        store.create_tables(model_name="test-model")
+        rows = self._populate(store)
+
+        before, after = store.compress_texts(dict_size=4096)
+        store.close()
+
+        assert after < before
+        store = VectorStore(db_path)
+        stored = store.conn.execute("SELECT text FROM chunks LIMIT 1").fetchone()[0]
+        assert isinstance(stored, bytes)
+        assert store.search(rows[3][3], top_k=1)[0]["text"] == rows[3][2]
+        store.close()
+
+    def test_insert_after_compression(self, tmp_path, sample_embedding):
+        db_path = tmp_path / "test.db"
+        store = VectorStore(db_path)
+        store.create_tables(model_name="test-model")
+        self._populate(store)
+        store.compress_texts(dict_size=4096)
+
+        store.insert("new.md", 0, "新しいチャンク", sample_embedding)
+
+        stored = store.conn.execute(
+            "SELECT text FROM chunks WHERE source_file = 'new.md'"
+        ).fetchone()[0]
+        assert isinstance(stored, bytes)
+        assert store.search(sample_embedding, top_k=1)[0]["text"] == "新しいチャンク"
+        store.close()
+
+
+class TestVectorStoreSpaces:
+    def _store_with_chunks(self, tmp_path, sample_embedding, n=3):
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="primary-model")
+        store.insert_many(
+            [(f"doc{i}.md", 0, f"text {i}", sample_embedding) for i in range(n)]
+        )
+        return store
+
+    def test_create_tables_records_dim(self, tmp_path):
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="small-model", dim=4)
+
+        store.insert("doc.md", 0, "text", np.ones(4, dtype=np.float32) / 2)
+
+        assert store._get_metadata("embedding_dim") == "4"
+        assert len(store.search(np.ones(4, dtype=np.float32) / 2, top_k=1)) == 1
+        store.close()
+
+    def test_add_space_and_progress(self, tmp_path, sample_embedding):
+        store = self._store_with_chunks(tmp_path, sample_embedding)
+
+        store.add_space("small", model_name="small-model", dim=4)
+
+        info = store.get_space("small")
+        assert info["model_name"] == "small-model"
+        assert info["dim"] == 4
+        assert (info["filled"], info["total"]) == (0, 3)
+        assert [s["name"] for s in store.list_spaces()] == ["small"]
+        store.close()
+
+    def test_add_space_conflicting_model_raises(self, tmp_path, sample_embedding):
+        store = self._store_with_chunks(tmp_path, sample_embedding)
+        store.add_space("small", model_name="small-model", dim=4)
+
+        store.add_space("small", model_name="small-model", dim=4)
+        with pytest.raises(ValueError):
+            store.add_space("small", model_name="other-model", dim=4)
+        store.close()
+
+    def test_invalid_space_name(self, tmp_path, sample_embedding):
+        store = self._store_with_chunks(tmp_path, sample_embedding)
+
+        with pytest.raises(ValueError):
+            store.add_space("bad-name; DROP", model_name="m", dim=4)
+        store.close()
+
+    def test_fill_and_search_space(self, tmp_path, sample_embedding):
+        store = self._store_with_chunks(tmp_path, sample_embedding)
+        store.add_space("small", model_name="small-model", dim=4)
+
+        missing = store.missing_in_space("small", limit=10)
+        assert [text for _, text in missing] == ["text 0", "text 1", "text 2"]
+
+        vectors = np.eye(4, dtype=np.float32)
+        store.insert_space_vectors(
+            "small", [(rowid, vectors[i]) for i, (rowid, _) in enumerate(missing)]
+        )
+
+        assert store.missing_in_space("small", limit=10) == []
+        results = store.search(vectors[1], top_k=1, space="small")
+        assert results[0]["text"] == "text 1"
+        store.close()
+
+    def test_missing_in_space_after_cursor(self, tmp_path, sample_embedding):
+        store = self._store_with_chunks(tmp_path, sample_embedding)
+        store.add_space("small", model_name="small-model", dim=4)
+        first, second, third = store.missing_in_space("small", limit=10)
+
+        store.insert_space_vectors("small", [(third[0], np.ones(4, dtype=np.float32))])
+
+        assert store.missing_in_space("small", limit=10, after=first[0]) == [second]
+        store.close()
+
+    def test_inserted_chunks_leave_space_incomplete(self, tmp_path, sample_embedding):
+        # index・sync・watchでの追加は空間のベクトルを作らず、backfillまで未完成になる
+        store = self._store_with_chunks(tmp_path, sample_embedding)
+        store.add_space("small", model_name="small-model", dim=4)
+        missing = store.missing_in_space("small", limit=10)
+        store.insert_space_vectors(
+            "small", [(rowid, np.ones(4, dtype=np.float32)) for rowid, _ in missing]
+        )
+
+        new_id = store.insert("new.md", 0, "new", sample_embedding)
+
+        info = store.get_space("small")
+        assert (info["filled"], info["total"]) == (3, 4)
+        assert store.missing_in_space("small", limit=10) == [(new_id, "new")]
+        store.close()
+
+    def test_delete_source_removes_space_vectors(self, tmp_path, sample_embedding):
+        store = self._store_with_chunks(tmp_path, sample_embedding)
+        store.add_space("small", model_name="small-model", dim=4)
+        missing = store.missing_in_space("small", limit=10)
+        store.insert_space_vectors(
+            "small", [(rowid, np.ones(4, dtype=np.float32)) for rowid, _ in missing]
+        )
+
+        store.delete_source("doc0.md")
+
+        info = store.get_space("small")
+        assert (info["filled"], info["total"]) == (2, 2)
+        store.close()
+
+    def test_search_unknown_space_raises(self, tmp_path, sample_embedding):
+        store = self._store_with_chunks(tmp_path, sample_embedding)
+
+        with pytest.raises(ValueError):
+            store.search(sample_embedding, top_k=1, space="missing")
+        store.close()
+
+
+class TestVectorStoreDuplicates:
+    def test_search_attaches_duplicates(self, tmp_path, sample_embedding):
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="test-model")
+        rowid = store.insert("a.md", 0, "共通の注意書き", sample_embedding)
+        store.add_duplicates([(rowid, "b.md", 2), (rowid, "c.md", 1)])
+
+        results = store.search(sample_embedding, top_k=1)
+
+        assert results[0]["duplicates"] == [("b.md", 2), ("c.md", 1)]
+        assert store.get_duplicates([rowid, rowid + 1]) == {rowid: [("b.md", 2), ("c.md", 1)]}
+        store.close()
+
+    def test_no_duplicates_key_without_duplicates(self, tmp_path, sample_embedding):
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="test-model")
+        store.insert("a.md", 0, "text", sample_embedding)
+
+        assert "duplicates" not in store.search(sample_embedding, top_k=1)[0]
+        store.close()
+
+    def test_delete_source_promotes_duplicate(self, tmp_path, sample_embedding):
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="test-model")
+        rowid = store.insert("a.md", 0, "共通の注意書き", sample_embedding)
+        store.add_duplicates([(rowid, "b.md", 2), (rowid, "c.md", 1)])
+
+        store.delete_source("a.md")
+
+        result = store.search(sample_embedding, top_k=1)[0]
+        assert (result["source_file"], result["chunk_index"]) == ("b.md", 2)
+        assert result["duplicates"] == [("c.md", 1)]
+        store.close()
+
+    def test_delete_source_removes_its_duplicates(self, tmp_path, sample_embedding):
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="test-model")
+        rowid = store.insert("a.md", 0, "共通の注意書き", sample_embedding)
+        store.add_duplicates([(rowid, "b.md", 2)])
+
+        store.delete_source("b.md")
+
+        assert store.get_duplicates([rowid]) == {}
+        store.close()
+
+
+class TestVectorStoreContext:
+    def _store(self, tmp_path, sample_embedding, n=5):
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="test-model")
+        ids = [store.insert("a.md", i, f"a{i}", sample_embedding) for i in range(n)]
+        store.insert("b.md", 0, "b0", sample_embedding)
+        return store, ids
+
+    def test_window(self, tmp_path, sample_embedding):
+        store, ids = self._store(tmp_path, sample_embedding)
+
+        context = store.get_context([ids[2]], window=1)
+
+        assert [c["text"] for c in context[ids[2]]] == ["a1", "a2", "a3"]
+        assert [c["id"] for c in context[ids[2]]] == ids[1:4]
+        store.close()
+
+    def test_clipped_at_document_edges(self, tmp_path, sample_embedding):
+        store, ids = self._store(tmp_path, sample_embedding)
+
+        context = store.get_context([ids[0], ids[4]], window=2)
+
+        assert [c["chunk_index"] for c in context[ids[0]]] == [0, 1, 2]
+        assert [c["chunk_index"] for c in context[ids[4]]] == [2, 3, 4]
+        store.close()
+
+    def test_one_query_for_result_set(self, tmp_path, sample_embedding):
+        store, ids = self._store(tmp_path, sample_embedding)
+        statements = []
+        store.conn.set_trace_callback(statements.append)
+
+        context = store.get_context(ids[:3], window=1)
+
+        assert sorted(context) == sorted(ids[:3])
+        assert len([s for s in statements if "FROM chunks" in s]) == 1
+        store.close()
+
+    def test_fills_deduplicated_positions(self, tmp_path, sample_embedding):
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="test-model")
+        shared = store.insert("b.md", 0, "共通の注意書き", sample_embedding)
+        first = store.insert("a.md", 0, "a0", sample_embedding)
+        store.insert("a.md", 2, "a2", sample_embedding)
+        store.add_duplicates([(shared, "a.md", 1)])
+
+        context = store.get_context([first], window=2)
+
+        assert [c["text"] for c in context[first]] == ["a0", "共通の注意書き", "a2"]
+        store.close()
+
+    def test_uses_covering_index(self, tmp_path, sample_embedding):
+        store, ids = self._store(tmp_path, sample_embedding)
+
+        plan = store.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM chunks WHERE source_file = ? "
+            "AND chunk_index BETWEEN ? AND ?",
+            ("a.md", 0, 2),
+        ).fetchall()
+
+        assert any("COVERING INDEX idx_chunks_source" in row[-1] for row in plan)
+        store.close()
+
+    def test_compressed_text(self, tmp_path, sample_embedding):
+        pytest.importorskip("zstandard")
+        store, ids = self._store(tmp_path, sample_embedding)
+        store.compress_texts()
+
+        context = store.get_context([ids[1]], window=1)
+
+        assert [c["text"] for c in context[ids[1]]] == ["a0", "a1", "a2"]
+        store.close()
+
+    def test_empty(self, tmp_path, sample_embedding):
+        store, _ = self._store(tmp_path, sample_embedding)
+        assert store.get_context([]) == {}
+        store.close()
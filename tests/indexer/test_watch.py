@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+from embs.benchmarks.stubs import StubEmbedder
+from embs.indexer.chunker import Chunk
+from embs.indexer.store import VectorStore
+from embs.indexer.watch import (
+    RESCAN,
+    IncrementalIndexer,
+    InotifyWatcher,
+    PollingWatcher,
+    collect_changes,
+)
+
+
+def _fake_chunk_text(text, source_file):
+    return [
+        Chunk(text=part, source_file=source_file, chunk_index=i)
+        for i, part in enumerate(p for p in text.split("\n\n") if p)
+    ]
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+class TestPollingWatcher:
+    def test_detects_create_modify_delete(self, tmp_path):
+        _write(tmp_path / "a.md", "a")
+        _write(tmp_path / "b.md", "b")
+        watcher = PollingWatcher(tmp_path, interval=0)
+
+        assert watcher.poll(0) == set()
+
+        _write(tmp_path / "a.md", "changed")
+        _write(tmp_path / "sub" / "c.md", "c")
+        (tmp_path / "b.md").unlink()
+        _write(tmp_path / "note.txt", "ignored")
+
+        assert watcher.poll(0) == {"a.md", "sub/c.md", "b.md"}
+        assert watcher.poll(0) == set()
+
+    def test_waits_for_interval(self, tmp_path):
+        watcher = PollingWatcher(tmp_path, interval=60)
+        _write(tmp_path / "a.md", "a")
+
+        assert watcher.poll(0.01) == set()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotifyはLinuxのみ")
+class TestInotifyWatcher:
+    def test_detects_file_events(self, tmp_path):
+        _write(tmp_path / "sub" / "a.md", "a")
+        watcher = InotifyWatcher(tmp_path)
+        try:
+            _write(tmp_path / "sub" / "a.md", "changed")
+            _write(tmp_path / "b.md", "b")
+            _write(tmp_path / "note.txt", "ignored")
+            assert collect_changes(watcher, 0.05, timeout=2) == {"sub/a.md", "b.md"}
+
+            (tmp_path / "b.md").unlink()
+            assert collect_changes(watcher, 0.05, timeout=2) == {"b.md"}
+        finally:
+            watcher.close()
+
+    def test_new_directory_is_watched(self, tmp_path):
+        watcher = InotifyWatcher(tmp_path)
+        try:
+            (tmp_path / "new").mkdir()
+            changes = collect_changes(watcher, 0.05, timeout=0.5)
+            _write(tmp_path / "new" / "c.md", "c")
+            changes |= collect_changes(watcher, 0.05, timeout=2)
+            assert changes == {"new/c.md"}
+        finally:
+            watcher.close()
+
+    def test_directory_moved_out_requests_rescan(self, tmp_path):
+        _write(tmp_path / "docs" / "old" / "a.md", "a")
+        watcher = InotifyWatcher(tmp_path / "docs")
+        try:
+            os.rename(tmp_path / "docs" / "old", tmp_path / "elsewhere")
+            assert RESCAN in collect_changes(watcher, 0.05, timeout=2)
+        finally:
+            watcher.close()
+
+
+class _ScriptedWatcher:
+    interval = 0.0
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+
+    def poll(self, timeout=None):
+        return self.batches.pop(0) if self.batches else set()
+
+
+class TestCollectChanges:
+    def test_coalesces_burst_until_quiet(self):
+        watcher = _ScriptedWatcher([{"a.md"}, {"b.md"}, {"a.md"}, set(), {"c.md"}])
+
+        assert collect_changes(watcher, 0.01) == {"a.md", "b.md"}
+        assert collect_changes(watcher, 0.01) == {"c.md"}
+
+    def test_timeout_without_changes(self):
+        assert collect_changes(_ScriptedWatcher([]), 0.01, timeout=0.05) == set()
+
+    def test_max_delay_under_constant_changes(self):
+        class Busy:
+            interval = 0.0
+
+            def poll(self, timeout=None):
+                time.sleep(0.001)
+                return {"a.md"}
+
+        start = time.monotonic()
+        assert collect_changes(Busy(), 0.01) == {"a.md"}
+        assert time.monotonic() - start < 1.0
+
+
+@patch("embs.indexer.pipeline.chunk_text", side_effect=_fake_chunk_text)
+class TestIncrementalIndexer:
+    def _setup(self, tmp_path):
+        docs = tmp_path / "docs"
+        _write(docs / "a.md", "a1\n\na2")
+        _write(docs / "b.md", "b1")
+        store = VectorStore(tmp_path / "index.db")
+        embedder = StubEmbedder()
+        store.create_tables(model_name=embedder.model_name, dim=embedder.dim)
+        indexer = IncrementalIndexer(docs, store, embedder)
+        indexer.apply({"a.md", "b.md"})
+        return docs, store, indexer
+
+    def _texts(self, store):
+        return {
+            (s, t)
+            for batch in store.iter_rows()
+            for s, t in zip(batch.source_files, batch.texts)
+        }
+
+    def test_only_changed_file_is_reembedded(self, _, tmp_path):
+        docs, store, indexer = self._setup(tmp_path)
+        b_ids = [r[0] for r in store.conn.execute("SELECT id FROM chunks WHERE source_file='b.md'")]
+
+        _write(docs / "a.md", "a1\n\nnew")
+        stats = indexer.apply({"a.md"})
+
+        assert (stats.updated, stats.chunks, stats.deleted) == (1, 2, 0)
+        assert self._texts(store) == {("a.md", "a1"), ("a.md", "new"), ("b.md", "b1")}
+        assert [r[0] for r in store.conn.execute("SELECT id FROM chunks WHERE source_file='b.md'")] == b_ids
+        store.close()
+
+    def test_unchanged_content_is_skipped(self, _, tmp_path):
+        docs, store, indexer = self._setup(tmp_path)
+        (docs / "a.md").touch()
+
+        stats = indexer.apply({"a.md"})
+
+        assert (stats.updated, stats.unchanged) == (0, 1)
+        store.close()
+
+    def test_deleted_file_is_removed(self, _, tmp_path):
+        docs, store, indexer = self._setup(tmp_path)
+        (docs / "a.md").unlink()
+
+        stats = indexer.apply({"a.md"})
+
+        assert stats.deleted == 1
+        assert self._texts(store) == {("b.md", "b1")}
+        store.close()
+
+    def test_rescan_removes_missing_sources(self, _, tmp_path):
+        docs, store, indexer = self._setup(tmp_path)
+        (docs / "b.md").unlink()
+
+        stats = indexer.apply({RESCAN})
+
+        assert stats.deleted == 1
+        assert store.list_sources() == ["a.md"]
+        store.close()
+
+    def test_same_file_name_in_other_directory_is_kept(self, _, tmp_path):
+        docs, store, indexer = self._setup(tmp_path)
+        _write(docs / "sub" / "b.md", "sub-b")
+        indexer.apply({"sub/b.md"})
+
+        (docs / "b.md").unlink()
+        indexer.apply({"b.md"})
+
+        assert self._texts(store) == {("a.md", "a1"), ("a.md", "a2"), ("b.md", "sub-b")}
+        store.close()
+
+    def test_stats_only_changed_paths(self, _, tmp_path):
+        docs, store, indexer = self._setup(tmp_path)
+        _write(docs / "a.md", "a1\n\nnew")
+
+        with patch("embs.indexer.watch._scan", side_effect=AssertionError("full scan")):
+            stats = indexer.apply({"a.md"})
+
+        assert stats.updated == 1
+        store.close()
+
+    def test_replacement_is_atomic_for_readers(self, _, tmp_path):
+        docs, store, indexer = self._setup(tmp_path)
+        _write(docs / "a.md", "a1\n\nnew")
+        seen = []
+
+        def embed(texts):
+            # 新しいチャンクを埋め込んでいる間、別の接続からは古い内容が見える
+            reader = VectorStore(tmp_path / "index.db")
+            seen.append({t for b in reader.iter_rows() for t in b.texts})
+            reader.close()
+            return StubEmbedder().embed(texts)
+
+        with patch.object(indexer.embedder, "embed", side_effect=embed):
+            indexer.apply({"a.md"})
+
+        assert seen == [{"a1", "a2", "b1"}]
+        assert self._texts(store) == {("a.md", "a1"), ("a.md", "new"), ("b.md", "b1")}
+        store.close()
+
+    def test_failure_keeps_previous_chunks(self, _, tmp_path):
+        docs, store, indexer = self._setup(tmp_path)
+        _write(docs / "a.md", "a1\n\nnew")
+
+        with patch.object(indexer.embedder, "embed", side_effect=RuntimeError("boom")):
+            with pytest.raises(RuntimeError):
+                indexer.apply({"a.md"})
+
+        assert self._texts(store) == {("a.md", "a1"), ("a.md", "a2"), ("b.md", "b1")}
+        # 反映に失敗した内容は、次の変更で改めて反映する
+        assert indexer.apply({"a.md"}).updated == 1
+        store.close()
+
+    def test_dedup(self, _, tmp_path):
+        from embs.indexer.dedup import Deduplicator
+
+        docs, store, _indexer = self._setup(tmp_path)
+        indexer = IncrementalIndexer(
+            docs, store, StubEmbedder(), deduplicator=Deduplicator()
+        )
+        _write(docs / "c.md", "b1\n\nc1")
+
+        stats = indexer.apply({"c.md"})
+
+        assert stats.chunks == 1
+        (b1_id,) = [r[0] for r in store.conn.execute("SELECT id FROM chunks WHERE text='b1'")]
+        assert store.get_duplicates([b1_id]) == {b1_id: [("c.md", 0)]}
+
+        # 代表のb.mdを消すと、重複はc.mdの位置に繰り上がる
+        (docs / "b.md").unlink()
+        indexer.apply({"b.md"})
+        assert self._texts(store) == {("a.md", "a1"), ("a.md", "a2"), ("c.md", "b1"), ("c.md", "c1")}
+
+        # 削除したチャンクは重複の代表に使わない
+        (docs / "c.md").unlink()
+        indexer.apply({"c.md"})
+        _write(docs / "d.md", "c1")
+        assert indexer.apply({"d.md"}).chunks == 1
+        assert self._texts(store) == {("a.md", "a1"), ("a.md", "a2"), ("d.md", "c1")}
+        store.close()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from embs import metrics
+from embs.indexer.store import VectorStore
+from embs.searcher.cache import QueryCache
+from embs.searcher.query import search
+
+PARAMS = {"top_k": 5}
+RESULTS = [{"id": 1, "source_file": "a.md", "rerank_score": np.float32(0.5)}]
+
+
+def _vec(*values: float) -> np.ndarray:
+    return np.array(values, dtype=np.float32)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestQueryCache:
+    def test_similar_query_hits(self):
+        cache = QueryCache(threshold=0.9)
+        cache.store("q", _vec(1, 0, 0), RESULTS, version="v1", params=PARAMS)
+
+        hits = metrics.CACHE_REQUESTS.value(cache="query", result="hit")
+        assert cache.lookup(_vec(0.99, 0.1, 0), version="v1", params=PARAMS) == [
+            {"id": 1, "source_file": "a.md", "rerank_score": 0.5}
+        ]
+        assert metrics.CACHE_REQUESTS.value(cache="query", result="hit") == hits + 1
+        assert cache.lookup(_vec(0, 1, 0), version="v1", params=PARAMS) is None
+
+    def test_version_and_params_must_match(self):
+        cache = QueryCache()
+        cache.store("q", _vec(1, 0), RESULTS, version="v1", params=PARAMS)
+
+        assert cache.lookup(_vec(1, 0), version="v2", params=PARAMS) is None
+        assert cache.lookup(_vec(1, 0), version="v1", params={"top_k": 10}) is None
+        # 新しい版で保存すると古い版のエントリは消える
+        cache.store("q", _vec(0, 1), RESULTS, version="v2", params=PARAMS)
+        assert len(cache) == 1
+
+    def test_ttl_expires_entries(self):
+        clock = Clock()
+        cache = QueryCache(ttl=60, clock=clock)
+        cache.store("q", _vec(1, 0), RESULTS, version="v1", params=PARAMS)
+
+        clock.now += 61
+        assert cache.lookup(_vec(1, 0), version="v1", params=PARAMS) is None
+
+    def test_evicts_least_recently_used(self):
+        clock = Clock()
+        cache = QueryCache(max_entries=2, clock=clock)
+        for i, vec in enumerate([_vec(1, 0, 0), _vec(0, 1, 0)]):
+            clock.now += 1
+            cache.store(f"q{i}", vec, [{"id": i}], version="v1", params=PARAMS)
+        clock.now += 1
+        assert cache.lookup(_vec(1, 0, 0), version="v1", params=PARAMS) == [{"id": 0}]
+
+        clock.now += 1
+        cache.store("q2", _vec(0, 0, 1), [{"id": 2}], version="v1", params=PARAMS)
+
+        assert len(cache) == 2
+        assert cache.lookup(_vec(0, 1, 0), version="v1", params=PARAMS) is None
+        assert cache.lookup(_vec(1, 0, 0), version="v1", params=PARAMS) == [{"id": 0}]
+
+    def test_persists_next_to_index(self, tmp_path):
+        db = tmp_path / "index.db"
+        cache = QueryCache.for_index(db)
+        cache.store("q", _vec(1, 0), RESULTS, version="v1", params=PARAMS)
+        cache.close()
+
+        assert (tmp_path / "index.db.qcache").exists()
+        reopened = QueryCache.for_index(db)
+        assert reopened.lookup(_vec(1, 0), version="v1", params=PARAMS) is not None
+        reopened.close()
+
+    def test_rejects_invalid_threshold(self):
+        with pytest.raises(ValueError):
+            QueryCache(threshold=0)
+
+
+class TestIndexVersion:
+    def test_changes_on_write_only(self, tmp_path):
+        store = VectorStore(tmp_path / "v.db")
+        store.create_tables(model_name="m", dim=4)
+        store.insert("a.md", 0, "text", np.ones(4, dtype=np.float32))
+        version = store.get_index_version()
+        assert version is not None
+
+        store.search(np.ones(4, dtype=np.float32), top_k=1)
+        assert store.get_index_version() == version
+
+        store.delete_source("a.md")
+        assert store.get_index_version() != version
+        store.close()
+
+
+class TestSearchWithCache:
+    @patch("embs.searcher.query.Reranker")
+    @patch("embs.searcher.query.Embedder")
+    @patch("embs.searcher.query.VectorStore")
+    def test_hit_skips_vector_search_and_rerank(
+        self, mock_store_cls, mock_embedder_cls, mock_reranker_cls
+    ):
+        mock_store = mock_store_cls.return_value
+        mock_store.get_model_name.return_value = None
+        mock_store.get_index_version.return_value = "v1"
+        mock_store.search.return_value = [{"id": 1, "text": "t"}]
+        embeddings = iter([_vec(1, 0, 0), _vec(0.98, 0.05, 0)])
+        mock_embedder_cls.return_value.embed.side_effect = lambda texts: [next(embeddings)]
+        mock_reranker_cls.return_value.rerank.return_value = [
+            {"id": 1, "text": "t", "rerank_score": 0.9}
+        ]
+        cache = QueryCache(threshold=0.95)
+
+        first = search("東京の天気", "dummy.db", cache=cache)
+        second = search("東京の天気は", "dummy.db", cache=cache)
+
+        assert second == first
+        mock_store.search.assert_called_once()
+        mock_reranker_cls.return_value.rerank.assert_called_once()
+        mock_reranker_cls.assert_called_once()
@@ -3,8 +3,20 @@ from __future__ import annotations
 from unittest.mock import MagicMock, patch
 
 import numpy as np
+import pytest
 
-from embs.searcher.query import search
+from embs import metrics
+from embs.indexer.ann import HnswIndex
+from embs.indexer.store import VectorStore, staging_path, swap_in
+from embs.searcher.reranker import Reranker
+from embs.searcher.query import _MODELS, release_models, search, search_progressive
+
+
+@pytest.fixture(autouse=True)
+def _fresh_models():
+    release_models()
+    yield
+    release_models()
 
 
 class TestSearch:
@@ -32,17 +44,41 @@ class TestSearch:
         ]
         mock_reranker_cls.return_value = mock_reranker
 
+        queries = metrics.QUERIES.value()
         result = search("test query", "dummy.db", top_k=5)
 
+        assert metrics.QUERIES.value() == queries + 1
         # パイプラインの各ステップが呼ばれたことを確認
         mock_embedder.embed.assert_called_once_with(["test query"])
         mock_store.search.assert_called_once()
         mock_reranker.rerank.assert_called_once()
+        # DBは検索をまたいで開いたままにし、手放すときに閉じる
+        mock_store.close.assert_not_called()
+        release_models()
         mock_store.close.assert_called_once()
 
         assert len(result) == 1
         assert result[0]["rerank_score"] == 0.9
 
+    @patch("embs.searcher.query.Reranker")
+    @patch("embs.searcher.query.Embedder")
+    @patch("embs.searcher.query.VectorStore")
+    def test_search_attaches_context(self, mock_store_cls, mock_embedder_cls, mock_reranker_cls):
+        mock_store = mock_store_cls.return_value
+        mock_store.get_model_name.return_value = None
+        mock_store.get_context.return_value = {1: [{"id": 1, "chunk_index": 0, "text": "t"}]}
+        mock_embedder_cls.return_value.embed.return_value = np.zeros((1, 768), dtype=np.float32)
+        mock_reranker_cls.return_value.rerank.return_value = [
+            {"id": 1, "source_file": "a.md", "chunk_index": 0, "text": "t", "rerank_score": 0.9},
+            {"id": 2, "source_file": "b.md", "chunk_index": 0, "text": "u", "rerank_score": 0.8},
+        ]
+
+        result = search("q", "dummy.db", context=2)
+
+        mock_store.get_context.assert_called_once_with([1, 2], window=2)
+        assert result[0]["context"] == [{"id": 1, "chunk_index": 0, "text": "t"}]
+        assert result[1]["context"] == []
+
     @patch("embs.searcher.query.Reranker")
     @patch("embs.searcher.query.Embedder")
     @patch("embs.searcher.query.VectorStore")
@@ -116,3 +152,236 @@ class TestSearch:
         mock_store.search.assert_called_once()
         _, kwargs = mock_store.search.call_args
         assert kwargs["top_k"] == 50
+
+    @patch("embs.searcher.query.Reranker")
+    @patch("embs.searcher.query.Embedder")
+    @patch("embs.searcher.query.VectorStore")
+    def test_search_candidate_space(
+        self, mock_store_cls, mock_embedder_cls, mock_reranker_cls
+    ):
+        mock_store = MagicMock()
+        mock_store.get_space.return_value = {
+            "name": "small",
+            "model_name": "small/model",
+            "dim": 384,
+            "filled": 10,
+            "total": 10,
+        }
+        mock_store.search.return_value = [
+            {"id": 1, "distance": 0.1, "source_file": "a.md", "chunk_index": 0, "text": "t"},
+        ]
+        mock_store_cls.return_value = mock_store
+
+        mock_embedder_cls.return_value.embed.return_value = np.zeros((1, 384), dtype=np.float32)
+        mock_reranker_cls.return_value.rerank.return_value = []
+
+        search("query", "dummy.db", candidate_space="small")
+
+        mock_embedder_cls.assert_called_once_with(model_name="small/model", model_dir=None)
+        _, kwargs = mock_store.search.call_args
+        assert kwargs["space"] == "small"
+
+    @patch("embs.searcher.query.Reranker")
+    @patch("embs.searcher.query.Embedder")
+    @patch("embs.searcher.query.VectorStore")
+    def test_search_incomplete_space_falls_back(
+        self, mock_store_cls, mock_embedder_cls, mock_reranker_cls, capsys
+    ):
+        mock_store = MagicMock()
+        mock_store.get_model_name.return_value = None
+        mock_store.get_space.return_value = {
+            "name": "small",
+            "model_name": "small/model",
+            "dim": 384,
+            "filled": 3,
+            "total": 10,
+        }
+        mock_store.search.return_value = []
+        mock_store_cls.return_value = mock_store
+
+        mock_embedder_cls.return_value.embed.return_value = np.zeros((1, 768), dtype=np.float32)
+        mock_reranker_cls.return_value.rerank.return_value = []
+
+        search("query", "dummy.db", candidate_space="small")
+
+        mock_embedder_cls.assert_called_once_with(model_dir=None)
+        _, kwargs = mock_store.search.call_args
+        assert "space" not in kwargs
+        assert "未完成" in capsys.readouterr().err
+
+
+def _candidates(n: int) -> list[dict]:
+    return [
+        {"id": i, "distance": i / 10, "source_file": f"{i}.md", "chunk_index": 0, "text": f"t{i}"}
+        for i in range(1, n + 1)
+    ]
+
+
+def _score_by_id(query, candidates, top_k=5):
+    # idが大きいほど関連が高いとみなす（ベクトル検索とは逆順）
+    for c in candidates:
+        c["rerank_score"] = float(c["id"])
+    return sorted(candidates, key=lambda c: c["rerank_score"], reverse=True)[:top_k]
+
+
+class TestSearchProgressive:
+    @patch("embs.searcher.query.Reranker")
+    @patch("embs.searcher.query.Embedder")
+    @patch("embs.searcher.query.VectorStore")
+    def test_vector_results_before_reranker_loads(
+        self, mock_store_cls, mock_embedder_cls, mock_reranker_cls
+    ):
+        mock_store = mock_store_cls.return_value
+        mock_store.get_model_name.return_value = None
+        mock_store.search.return_value = _candidates(4)
+        mock_embedder_cls.return_value.embed.return_value = np.zeros((1, 8), dtype=np.float32)
+        mock_reranker_cls.return_value.rerank.side_effect = _score_by_id
+
+        updates = search_progressive("q", "dummy.db", top_k=2)
+        first = next(updates)
+
+        assert first.stage == "vector"
+        assert [r["id"] for r in first.results] == [1, 2]
+        mock_reranker_cls.assert_not_called()
+
+        rest = list(updates)
+        assert [u.stage for u in rest] == ["reranked"]
+        assert rest[0].final
+        assert [r["id"] for r in rest[0].results] == [4, 3]
+        # 先に返した結果はリランキングで書き換えられない
+        assert "rerank_score" not in first.results[0]
+
+    @patch("embs.searcher.query.Reranker")
+    @patch("embs.searcher.query.Embedder")
+    @patch("embs.searcher.query.VectorStore")
+    def test_rerank_step_emits_partial_rankings(
+        self, mock_store_cls, mock_embedder_cls, mock_reranker_cls
+    ):
+        mock_store = mock_store_cls.return_value
+        mock_store.get_model_name.return_value = None
+        mock_store.search.return_value = _candidates(5)
+        mock_embedder_cls.return_value.embed.return_value = np.zeros((1, 8), dtype=np.float32)
+        rerank = mock_reranker_cls.return_value.rerank
+        rerank.side_effect = _score_by_id
+
+        updates = list(search_progressive("q", "dummy.db", top_k=2, rerank_step=2))
+
+        assert [u.stage for u in updates] == ["vector", "partial", "partial", "reranked"]
+        assert [r["id"] for r in updates[1].results] == [2, 1]
+        assert [r["id"] for r in updates[2].results] == [4, 3]
+        assert [r["id"] for r in updates[3].results] == [5, 4]
+        # 各候補は1回だけ推論する
+        assert [len(call.args[1]) for call in rerank.call_args_list] == [2, 2, 1]
+
+    @patch("embs.searcher.query.Reranker")
+    @patch("embs.searcher.query.Embedder")
+    @patch("embs.searcher.query.VectorStore")
+    def test_query_seconds_observed_when_abandoned_or_failed(
+        self, mock_store_cls, mock_embedder_cls, mock_reranker_cls
+    ):
+        mock_store = mock_store_cls.return_value
+        mock_store.get_model_name.return_value = None
+        mock_store.search.return_value = _candidates(4)
+        mock_embedder_cls.return_value.embed.return_value = np.zeros((1, 8), dtype=np.float32)
+        mock_reranker_cls.return_value.rerank.side_effect = RuntimeError("reranker failed")
+        observed = metrics.QUERY_SECONDS.count()
+
+        updates = search_progressive("q", "dummy.db", top_k=2)
+        next(updates)
+        updates.close()
+        assert metrics.QUERY_SECONDS.count() == observed + 1
+
+        with pytest.raises(RuntimeError):
+            list(search_progressive("q", "dummy.db", top_k=2))
+        assert metrics.QUERY_SECONDS.count() == observed + 2
+
+    def test_rejects_invalid_rerank_step(self):
+        with pytest.raises(ValueError):
+            next(search_progressive("q", "dummy.db", rerank_step=0))
+
+
+class FakeCrossEncoder:
+    def __init__(self, *args, **kwargs):
+        self.pairs: list[tuple[str, str]] = []
+
+    def predict(self, pairs, batch_size=32):
+        self.pairs.extend(pairs)
+        return [float(len(text)) for _, text in pairs]
+
+
+class TestSharedModels:
+    @patch("embs.searcher.reranker.CrossEncoder", FakeCrossEncoder)
+    @patch("embs.searcher.query.Embedder")
+    @patch("embs.searcher.query.VectorStore")
+    def test_repeated_query_reuses_models_and_scores(self, mock_store_cls, mock_embedder_cls):
+        mock_store = mock_store_cls.return_value
+        mock_store.get_model_name.return_value = None
+        mock_store.search.side_effect = lambda *a, **k: _candidates(3)
+        mock_embedder_cls.return_value.embed.return_value = np.zeros((1, 8), dtype=np.float32)
+
+        first = search("q", "dummy.db", top_k=2)
+        second = search("q", "dummy.db", top_k=2)
+
+        assert [r["id"] for r in second] == [r["id"] for r in first]
+        mock_embedder_cls.assert_called_once()
+        mock_store_cls.assert_called_once()
+        (reranker,) = [m for m in _MODELS.values() if isinstance(m, Reranker)]
+        # 2回目は全候補のスコアがキャッシュにあり、推論しない
+        assert len(reranker.model.pairs) == 3
+
+
+class TestSharedStore:
+    @pytest.fixture
+    def index(self, tmp_path):
+        pytest.importorskip("hnswlib")
+        rng = np.random.default_rng(0)
+        vecs = rng.standard_normal((200, 8)).astype(np.float32)
+        vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+        db_path = tmp_path / "index.db"
+        store = VectorStore(db_path)
+        store.create_tables(model_name="test-model", dim=8)
+        store.insert_many([(f"{i}.md", 0, f"t{i}", v) for i, v in enumerate(vecs)])
+        store.build_ann()
+        store.close()
+        return db_path, vecs
+
+    def _search(self, db_path, vec):
+        with patch("embs.searcher.query.Embedder") as embedder_cls, patch(
+            "embs.searcher.query.Reranker"
+        ) as reranker_cls:
+            embedder_cls.return_value.embed.return_value = vec[None, :]
+            reranker_cls.return_value.rerank.side_effect = lambda q, c, top_k: c[:top_k]
+            return search("q", db_path, top_k=1)
+
+    def test_repeated_search_loads_ann_once(self, index):
+        db_path, vecs = index
+
+        with patch("embs.indexer.store.HnswIndex", wraps=HnswIndex) as hnsw_cls:
+            for i in range(5):
+                assert self._search(db_path, vecs[i])[0]["source_file"] == f"{i}.md"
+
+        # HNSWインデックスを読み込むのは最初の検索だけ
+        hnsw_cls.assert_called_once()
+
+    def test_sees_writes_from_other_process(self, index):
+        db_path, vecs = index
+        self._search(db_path, vecs[0])
+
+        writer = VectorStore(db_path)
+        writer.delete_source("0.md")
+        writer.close()
+
+        assert self._search(db_path, vecs[0])[0]["source_file"] != "0.md"
+
+    def test_reopens_after_swap(self, index, tmp_path):
+        db_path, vecs = index
+        staged = staging_path(db_path)
+        store = VectorStore(staged)
+        store.create_tables(model_name="test-model", dim=8)
+        store.insert("new.md", 0, "new", vecs[0])
+        store.close()
+        self._search(db_path, vecs[0])
+
+        swap_in(db_path, staged)
+
+        assert self._search(db_path, vecs[0])[0]["source_file"] == "new.md"
@@ -4,7 +4,8 @@ from unittest.mock import MagicMock, patch
 
 import numpy as np
 
-from embs.searcher.reranker import Reranker
+from embs import metrics
+from embs.searcher.reranker import MODEL_NAME, Reranker
 
 
 class TestReranker:
@@ -54,3 +55,77 @@ class TestReranker:
         assert result[0]["rerank_score"] == 0.9
         assert result[1]["rerank_score"] == 0.5
         assert result[2]["rerank_score"] == 0.1
+
+
+class TestRerankerBatching:
+    def _make_reranker(self, **kwargs):
+        with patch("embs.searcher.reranker.CrossEncoder") as mock_cls:
+            # ペアごとに本文の長さをスコアとして返す
+            mock_cls.return_value.predict.side_effect = lambda pairs, batch_size: np.array(
+                [float(len(text)) for _, text in pairs]
+            )
+            reranker = Reranker(**kwargs)
+        return reranker, mock_cls
+
+    def _candidates(self, texts):
+        return [
+            {"id": i, "source_file": "a.md", "chunk_index": i, "text": t}
+            for i, t in enumerate(texts, 1)
+        ]
+
+    def test_model_options(self):
+        _, mock_cls = self._make_reranker(max_length=256)
+
+        mock_cls.assert_called_once_with(MODEL_NAME, max_length=256)
+
+    def test_pairs_sorted_by_length(self):
+        reranker, _ = self._make_reranker(batch_size=2)
+
+        result = reranker.rerank("q", self._candidates(["ccc", "a", "bb"]), top_k=3)
+
+        pairs = reranker.model.predict.call_args.args[0]
+        assert [text for _, text in pairs] == ["a", "bb", "ccc"]
+        assert reranker.model.predict.call_args.kwargs == {"batch_size": 2}
+        # スコアは元の候補に正しく戻る
+        assert [(r["text"], r["rerank_score"]) for r in result] == [
+            ("ccc", 3.0),
+            ("bb", 2.0),
+            ("a", 1.0),
+        ]
+
+    def test_cache_skips_scored_pairs(self):
+        reranker, _ = self._make_reranker()
+        hits = metrics.CACHE_REQUESTS.value(cache="rerank", result="hit")
+
+        reranker.rerank("q", self._candidates(["a", "bb"]), top_k=2)
+        result = reranker.rerank("q", self._candidates(["a", "bb", "ccc"]), top_k=3)
+
+        assert reranker.model.predict.call_count == 2
+        assert [text for _, text in reranker.model.predict.call_args.args[0]] == ["ccc"]
+        assert [r["rerank_score"] for r in result] == [3.0, 2.0, 1.0]
+        assert metrics.CACHE_REQUESTS.value(cache="rerank", result="hit") == hits + 2
+
+    def test_cache_is_per_query_and_text(self):
+        reranker, _ = self._make_reranker()
+
+        reranker.rerank("q1", self._candidates(["a"]), top_k=1)
+        reranker.rerank("q2", self._candidates(["a"]), top_k=1)
+        reranker.rerank("q1", self._candidates(["changed"]), top_k=1)
+
+        assert reranker.model.predict.call_count == 3
+
+    def test_cache_is_bounded(self):
+        reranker, _ = self._make_reranker(cache_size=2)
+
+        reranker.rerank("q", self._candidates(["a", "bb", "ccc"]), top_k=3)
+
+        assert len(reranker._cache) == 2
+
+    def test_cache_disabled(self):
+        reranker, _ = self._make_reranker(cache_size=0)
+
+        reranker.rerank("q", self._candidates(["a"]), top_k=1)
+        reranker.rerank("q", self._candidates(["a"]), top_k=1)
+
+        assert reranker.model.predict.call_count == 2
+        assert len(reranker._cache) == 0
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import pytest
+
+# 軽い経路で読み込んではいけないパッケージ（それぞれ数秒かかる）
+HEAVY = ("torch", "transformers", "sentence_transformers", "docling", "atlassian")
+# 軽い経路のimport時間の上限（秒）。重いパッケージを読み込むと10秒前後かかる
+BUDGET = 1.0
+
+
+def _importtime(code: str) -> tuple[float, list[str]]:
+    """python -X importtime でcodeを実行し、import時間の合計と読み込んだモジュールを返す"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    total = 0
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # 字下げのない行が最上位のimport。その累積時間を足す
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+        modules.append(name.strip())
+    return total / 1e6, modules
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import embs.cli",
+        "from embs.cli import app; app(['search', '--help'])",
+        "from embs.cli import app; app(['search', 'q', '--db', '/nonexistent/index.db'])",
+        "from embs.cli import app; app(['index', '/nonexistent/docs'])",
+        "from embs.indexer import VectorStore",
+        "from embs.fetchers import MarkdownFetcher",
+        "import embs.searcher",
+    ],
+)
+def test_lightweight_paths_stay_within_budget(code):
+    seconds, modules = _importtime(code)
+
+    heavy = sorted({m for m in modules if m.split(".")[0] in HEAVY})
+    assert heavy == [], f"{code}: {heavy[:5]}"
+    assert seconds < BUDGET, f"{code}: {seconds:.2f}s"
+
+
+def test_lazy_attributes_resolve():
+    import embs.fetchers
+    import embs.indexer
+    from embs.fetchers.markdown import MarkdownFetcher
+    from embs.indexer.store import VectorStore
+
+    assert embs.indexer.VectorStore is VectorStore
+    assert embs.fetchers.MarkdownFetcher is MarkdownFetcher
+    assert "Embedder" in dir(embs.indexer)
+    with pytest.raises(AttributeError):
+        embs.indexer.NoSuchName
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import urllib.request
+
+import numpy as np
+import pytest
+
+from embs import metrics
+from embs.indexer.store import VectorStore
+
+
+class TestRegistry:
+    def test_counter_and_gauge(self):
+        registry = metrics.Registry()
+        requests = registry.counter("t_requests_total", "リクエスト数", ("result",))
+        load = registry.gauge("t_load_seconds", "読み込み時間")
+
+        requests.inc(result="hit")
+        requests.inc(2, result="miss")
+        load.set(1.5)
+
+        text = registry.render()
+        assert "# TYPE t_requests_total counter" in text
+        assert 't_requests_total{result="hit"} 1' in text
+        assert 't_requests_total{result="miss"} 2' in text
+        assert "t_load_seconds 1.5" in text
+
+    def test_metric_base_is_abstract(self):
+        with pytest.raises(TypeError):
+            metrics._Metric("t_base", "基底クラス")
+
+    def test_histogram_is_cumulative(self):
+        registry = metrics.Registry()
+        latency = registry.histogram("t_seconds", "所要時間", ("stage",), buckets=(0.1, 1.0))
+
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value, stage="embed")
+
+        text = registry.render()
+        assert 't_seconds_bucket{stage="embed",le="0.1"} 1' in text
+        assert 't_seconds_bucket{stage="embed",le="1"} 2' in text
+        assert 't_seconds_bucket{stage="embed",le="+Inf"} 3' in text
+        assert 't_seconds_count{stage="embed"} 3' in text
+        assert latency.count(stage="embed") == 3
+
+    def test_label_values_are_escaped(self):
+        registry = metrics.Registry()
+        registry.counter("t_total", "x", ("model",)).inc(model='a"b\\c')
+
+        assert 't_total{model="a\\"b\\\\c"} 1' in registry.render()
+
+    def test_wrong_labels_raise(self):
+        counter = metrics.Registry().counter("t_total", "x", ("stage",))
+
+        with pytest.raises(ValueError):
+            counter.inc(model="m")
+
+    def test_register_returns_existing(self):
+        registry = metrics.Registry()
+        counter = registry.counter("t_total", "x")
+
+        assert registry.counter("t_total", "x") is counter
+        with pytest.raises(ValueError):
+            registry.gauge("t_total", "x")
+
+
+class TestExposition:
+    def test_http_server(self):
+        registry = metrics.Registry()
+        registry.counter("t_total", "x").inc()
+        server = metrics.start_http_server(0, registry=registry)
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/metrics"
+            with urllib.request.urlopen(url, timeout=5) as response:
+                body = response.read().decode("utf-8")
+                content_type = response.headers["Content-Type"]
+        finally:
+            server.shutdown()
+
+        assert "t_total 1" in body
+        assert content_type.startswith("text/plain")
+
+    def test_dump_to_file(self, tmp_path):
+        registry = metrics.Registry()
+        registry.counter("t_total", "x").inc()
+
+        metrics.dump(tmp_path / "metrics.prom", registry)
+
+        assert "t_total 1" in (tmp_path / "metrics.prom").read_text(encoding="utf-8")
+
+
+class TestWiring:
+    def test_store_search_records_stage(self, tmp_path, sample_embedding):
+        store = VectorStore(tmp_path / "test.db")
+        store.create_tables(model_name="test-model")
+        store.insert("a.md", 0, "text", sample_embedding)
+        before = metrics.STAGE_SECONDS.count(stage="vector_search")
+        items = metrics.STAGE_ITEMS.value(stage="vector_search")
+
+        store.search(sample_embedding, top_k=1)
+
+        assert metrics.STAGE_SECONDS.count(stage="vector_search") == before + 1
+        assert metrics.STAGE_ITEMS.value(stage="vector_search") == items + 1
+        store.close()
+
+    def test_record_cache(self):
+        before = metrics.CACHE_REQUESTS.value(cache="test", result="hit")
+
+        metrics.record_cache("test", hit=True)
+
+        assert metrics.CACHE_REQUESTS.value(cache="test", result="hit") == before + 1
+
+    def test_model_load(self):
+        with metrics.model_load("test/model"):
+            pass
+
+        assert metrics.MODEL_LOADS.value(model="test/model") >= 1
+        assert np.isfinite(metrics.MODEL_LOAD_SECONDS.value(model="test/model"))
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from embs import models
+from embs.models import MANIFEST_NAME
+
+
+def _make_snapshot(root: Path, model: str = "org/model") -> Path:
+    path = models.snapshot_path(model, root)
+    (path / "1_Pooling").mkdir(parents=True)
+    (path / "config.json").write_text("{}")
+    (path / "1_Pooling" / "config.json").write_text('{"pooling": "mean"}')
+    models.write_manifest(path, model, "abc123")
+    return path
+
+
+class TestModelDir:
+    def test_none_by_default(self):
+        assert models.model_dir() is None
+
+    def test_explicit_wins(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("EMBS_MODEL_DIR", "/from/env")
+        assert models.model_dir(tmp_path) == tmp_path
+
+    def test_env(self, monkeypatch):
+        monkeypatch.setenv("EMBS_MODEL_DIR", "/from/env")
+        assert models.model_dir() == Path("/from/env")
+
+    def test_config_file(self, monkeypatch, tmp_path):
+        config = tmp_path / "config.json"
+        config.write_text(json.dumps({"model_dir": "/from/config"}))
+        monkeypatch.setenv("EMBS_CONFIG", str(config))
+        assert models.model_dir() == Path("/from/config")
+
+
+class TestResolveModel:
+    def test_hub_when_not_configured(self):
+        assert models.resolve_model("org/model") == ("org/model", False)
+
+    def test_local_snapshot(self, tmp_path):
+        path = _make_snapshot(tmp_path)
+        assert models.resolve_model("org/model", tmp_path) == (str(path), True)
+
+    def test_missing_snapshot_does_not_fall_back(self, tmp_path):
+        with pytest.raises(FileNotFoundError, match="embs models pull"):
+            models.resolve_model("org/other", tmp_path)
+
+
+class TestManifest:
+    def test_write_manifest(self, tmp_path):
+        path = _make_snapshot(tmp_path)
+        manifest = json.loads((path / MANIFEST_NAME).read_text())
+
+        assert manifest["model"] == "org/model"
+        assert manifest["revision"] == "abc123"
+        assert sorted(manifest["files"]) == ["1_Pooling/config.json", "config.json"]
+
+    def test_verify_ok(self, tmp_path):
+        _make_snapshot(tmp_path)
+        assert models.verify("org/model", tmp_path) == []
+
+    def test_verify_detects_changes(self, tmp_path):
+        path = _make_snapshot(tmp_path)
+        (path / "config.json").write_text('{"changed": true}')
+        (path / "1_Pooling" / "config.json").unlink()
+
+        problems = models.verify("org/model", tmp_path)
+
+        assert len(problems) == 2
+        assert any("config.json" in p and "変更" in p for p in problems)
+        assert any("1_Pooling/config.json" in p for p in problems)
+
+    def test_verify_missing_snapshot(self, tmp_path):
+        assert models.verify("org/model", tmp_path)
+
+
+class TestPull:
+    def test_pull_pins_revision_and_writes_manifest(self, tmp_path):
+        def fake_download(repo_id, revision, local_dir):
+            local_dir = Path(local_dir)
+            (local_dir / ".cache").mkdir(parents=True)
+            (local_dir / ".cache" / "meta").write_text("x")
+            (local_dir / "model.safetensors").write_bytes(b"weights")
+            return str(local_dir)
+
+        api = MagicMock()
+        api.return_value.model_info.return_value.sha = "deadbeef"
+        with (
+            patch("huggingface_hub.HfApi", api),
+            patch("huggingface_hub.snapshot_download", side_effect=fake_download) as download,
+        ):
+            path = models.pull("org/model", tmp_path)
+
+        assert path == tmp_path / "org--model"
+        assert download.call_args.kwargs["revision"] == "deadbeef"
+        assert not (path / ".cache").exists()
+        assert models.verify("org/model", tmp_path) == []
+        manifest = json.loads((path / MANIFEST_NAME).read_text())
+        assert list(manifest["files"]) == ["model.safetensors"]
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from embs import profiling
+
+
+@pytest.fixture
+def profiler():
+    profiler = profiling.enable()
+    yield profiler
+    profiling.disable()
+
+
+class TestSpan:
+    def test_disabled_span_is_noop(self):
+        profiling.disable()
+
+        with profiling.span("embed", items=3) as s:
+            s.add(tokens=10)
+
+        assert not s
+
+    def test_records_duration_and_counters(self, profiler):
+        with profiling.span("embed", items=2) as s:
+            pass
+        s.add(tokens=7)
+
+        [record] = profiler.records
+        assert record.name == "embed"
+        assert record.duration >= 0
+        assert record.counters == {"items": 2, "tokens": 7}
+
+    def test_disable_returns_profiler(self, profiler):
+        assert profiling.disable() is profiler
+        with profiling.span("embed"):
+            pass
+
+        assert profiler.records == []
+
+
+class TestProfiler:
+    def test_summary_aggregates_by_name(self, profiler):
+        for n in (1, 2, 3):
+            with profiling.span("store.insert", items=n):
+                pass
+        with profiling.span("embed"):
+            pass
+
+        rows = {row["name"]: row for row in profiler.summary()}
+
+        assert rows["store.insert"]["calls"] == 3
+        assert rows["store.insert"]["counters"] == {"items": 6}
+        assert rows["embed"]["calls"] == 1
+        assert "store.insert" in profiler.format_summary()
+
+    def test_chrome_trace(self, profiler):
+        with profiling.span("rerank", items=5):
+            pass
+
+        trace = json.loads(json.dumps(profiler.chrome_trace()))
+
+        [event] = trace["traceEvents"]
+        assert event["name"] == "rerank"
+        assert event["ph"] == "X"
+        assert event["args"] == {"items": 5}